@@ -1,16 +1,16 @@
 from modules.envs import ParkEnv
+from modules.array_env import ArrayParkEnv
 from modules.strategy import TaskStrategy
 from modules.visualization import ChargingVisualizer, StartupScreen
 from modules.qlearning_agent import QLearningAgent
-import pickle
-import os
+from modules.qtable_io import find_q_table
 import sys
 import pygame
 from pygame.locals import QUIT, KEYDOWN, K_ESCAPE, K_SPACE, MOUSEBUTTONDOWN, K_RETURN
 
 
-def create_environment(map_size, time_step=1.0):
-    """根据地图大小创建环境"""
+def create_environment(map_size, time_step=1.0, backend='object'):
+    """根据地图大小创建环境，backend='array' 时使用结构数组后端 ArrayParkEnv"""
     config = {
         'small': {
             'park_size': (100, 100),
@@ -42,7 +42,8 @@ def create_environment(map_size, time_step=1.0):
     
     settings = config.get(map_size, config['small'])
     
-    env = ParkEnv(
+    env_class = ArrayParkEnv if backend == 'array' else ParkEnv
+    env = env_class(
         park_size=settings['park_size'],
         n_robots=settings['n_robots'],
         n_vehicles=settings['n_vehicles'],
@@ -79,12 +80,11 @@ def main():
     # 创建 agent
     agent = QLearningAgent(env)
     # 动态选择 Q 表文件名
-    q_table_path = f"config/q_table/{current_map_size}_most_q_table.pkl"
-    if os.path.exists(q_table_path):
-        with open(q_table_path, "rb") as f:
-            agent.q_table = pickle.load(f)
+    q_table_path = find_q_table(f"config/q_table/{current_map_size}_most_q_table")
+    if q_table_path is not None:
+        agent.load_q_table(q_table_path)
     else:
-        print(f"Q表文件不存在: {q_table_path}")
+        print(f"Q表文件不存在: config/q_table/{current_map_size}_most_q_table.qtab")
         agent.q_table = None  # 或者给出提示
     strategy = TaskStrategy(env, time_step=current_time_step, map_size=current_map_size, agent=agent)
     visualizer = ChargingVisualizer(env, cell_size=cell_size)
@@ -99,9 +99,8 @@ class BatteryStation:
 
     def __charging(self,battery:Battery,time_step):
         """
-        私有方法: 给电池充电, 充电功率参考充电曲线
+        私有方法: 给电池充电, 按充电曲线精确积分
         battery: Battery 对象
         time_step: 步长（秒）
         """
-        charging_power  = battery.get_charging_power()
-        battery.charge_kwh(charging_power * time_step)
\ No newline at end of file
+        battery.charge_seconds(time_step)
\ No newline at end of file
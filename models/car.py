@@ -1,6 +1,7 @@
 import numpy as np
 import random
 from models.battery import Battery
+from models.clock import SimClock
 
 """
 车辆模块 (Car Module)
@@ -8,16 +9,24 @@ from models.battery import Battery
 本模块实现了园区内车辆对象的核心功能，用于描述车辆的基本属性、停车行为、电池状态及充电需求。
 
 主要功能：
-- 随机生成车辆的停车位置、离开时间、电池参数
+- 随机生成车辆的停车位置、离开时间、电池参数，也可由调用方显式给出（如预生成的到达序列）
 - 管理车辆的电池对象及充电需求
 - 跟踪车辆的充电状态、等待时间和离开状态
+- 以绝对时间戳（到达时刻、离开截止时刻）保存时间信息，departure_time、time、waittime、battery_gap 为按需计算的派生属性
 - 支持车辆状态的更新与变更
 
 设计说明：
 车辆对象用于模拟园区内真实车辆的充电行为，结合电池对象，动态反映车辆的电量缺口、充电完成与失败等状态，便于调度系统进行任务分配和性能评估。
+长时间仿真中已完成、已失败的车辆会一直保留在环境中，Car 使用 __slots__ 预先声明全部字段（包括 Q-learning 奖励统计用的 counted），
+不再为每辆车创建实例 __dict__，也不能再动态添加未声明的属性。
+车辆与环境共享同一个 SimClock，不再需要每个时间步逐车递减离开倒计时、累加等待时间：
+离开倒计时为 deadline - 当前时间，等待时间在状态离开/进入 needcharge 时按时钟的记账时刻结算。
+车辆离场（completed / failed）时记录离场时刻，此后派生属性保持离场时的取值。
 
 用法示例：
     car = Car(id=1, park_size=(100, 100))
+    car = Car.from_record(2, record, clock=env.clock)  # record 为 modules.arrivals 生成的到达记录
+    car.departure_time   # 距离开截止还剩的秒数
 
 创建/维护者: 姚炜博
 最后修改: 2025-05-23
@@ -25,22 +34,98 @@ from models.battery import Battery
 """
 
 class Car:
-    def __init__(self, id, park_size):
+    __slots__ = ('id', 'parking_spot', 'battery', 'required_soc', 'arrival_soc', 'counted', 'clock', 'arrival_time',
+                 'deadline', 'departed_at', '_state', '_waited', '_wait_since', '_own_clock')
+
+    def __init__(self, id, park_size, departure_time=None, parking_spot=None, voltage=None, capacity=None, soc=None, required_soc=None,
+                 clock=None):
+        """
+        未给出的参数从全局随机数中抽取，抽取顺序与只传 id、park_size 时相同
+        clock: 环境共享的 SimClock；None 时车辆使用自己的时钟，由 update() 推进
+        """
         self.id = id  # 车辆编号
-        self.departure_time = int(np.clip(np.random.normal(60, 10), 40, 100)) * 60  # 离开时间
-        self.parking_spot = (random.randint(0, park_size[0]), random.randint(0, park_size[1]))  # 停车位置 (x, y)
+        if departure_time is None:
+            departure_time = int(np.clip(np.random.normal(60, 10), 40, 100)) * 60
+        if parking_spot is None:
+            parking_spot = (random.randint(0, park_size[0]), random.randint(0, park_size[1]))
+        self.parking_spot = parking_spot  # 停车位置 (x, y)
         self.battery = Battery(
-            voltage=np.random.choice([400, 800]), # 电池架构：400V或800V
-            capacity=np.clip(np.random.normal(90, 10), 65, 115), # 电池容量：65-115kWh，正态分布
-            soc=np.clip(np.random.normal(15, 10), 0, 64), # 到达电量：0-64%，正态分布，中心点15
+            voltage=np.random.choice([400, 800]) if voltage is None else voltage, # 电池架构：400V或800V
+            capacity=np.clip(np.random.normal(90, 10), 65, 115) if capacity is None else capacity, # 电池容量：65-115kWh，正态分布
+            soc=np.clip(np.random.normal(15, 10), 0, 64) if soc is None else soc, # 到达电量：0-64%，正态分布，中心点15
             state='nonfull' 
         )
-        self.state = 'needcharge' # 'charging', 'completed', 'needcharge', 'failed'
-        self.required_soc = np.clip(np.random.normal(80, 10), 65, 100) # 离开所需电量：70-100%，正态分布
-        self.battery_gap = (self.required_soc - self.battery.soc) * self.battery.capacity / 100 # 所需电量
-        self.time = 0 # 当前时间
-        self.waittime = 0 # 等待时间
-        
+        if required_soc is None:
+            required_soc = np.clip(np.random.normal(80, 10), 65, 100)
+        self.required_soc = required_soc # 离开所需电量：70-100%，正态分布
+        self.arrival_soc = self.battery.soc # 到达电量
+        self.counted = 0 # 离场后是否已计入 Q-learning 奖励
+        self._own_clock = clock is None
+        self.clock = SimClock() if clock is None else clock
+        self.arrival_time = self.clock.mark # 到达时刻
+        self.deadline = self.arrival_time + departure_time # 离开截止时刻
+        self.departed_at = None # 离场（completed / failed）时刻
+        self._state = 'needcharge' # 'charging', 'completed', 'needcharge', 'failed'
+        self._waited = 0 # 已结算的等待时间
+        self._wait_since = self.arrival_time # 本次开始等待的时刻
+
+    @classmethod
+    def from_record(cls, id, record, clock=None):
+        """
+        由到达记录（modules.arrivals.ARRIVAL_DTYPE）创建车辆，不消耗全局随机数
+        """
+        return cls(id, park_size=None, departure_time=int(record['departure_time']),
+                   parking_spot=(int(record['x']), int(record['y'])), voltage=int(record['voltage']),
+                   capacity=float(record['capacity']), soc=float(record['soc']),
+                   required_soc=float(record['required_soc']), clock=clock)
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        """状态变化时按时钟的记账时刻结算等待时间，进入 completed / failed 时记录离场时刻"""
+        old = self._state
+        if old == state:
+            return
+        if old == 'needcharge':
+            self._waited += self.clock.mark - self._wait_since
+        elif state == 'needcharge':
+            self._wait_since = self.clock.mark
+        if state in ('completed', 'failed') and self.departed_at is None:
+            self.departed_at = self.clock.time
+        self._state = state
+
+    def _now(self):
+        return self.clock.time if self.departed_at is None else self.departed_at
+
+    @property
+    def departure_time(self):
+        """距离开截止时刻的剩余时间（秒），离场后保持离场时的取值"""
+        return self.deadline - self._now()
+
+    @departure_time.setter
+    def departure_time(self, value):
+        self.deadline = self._now() + value
+
+    @property
+    def time(self):
+        """到达后经过的时间（秒）"""
+        return self._now() - self.arrival_time
+
+    @property
+    def waittime(self):
+        """处于 needcharge 状态的累计时间（秒）"""
+        if self._state == 'needcharge':
+            return self._waited + self.clock.time - self._wait_since
+        return self._waited
+
+    @property
+    def battery_gap(self):
+        """到达时距离开所需电量的缺口（kWh）"""
+        return (self.required_soc - self.arrival_soc) * self.battery.capacity / 100
+
     def set_state(self, state):
         """
         设置车辆状态
@@ -49,23 +134,31 @@ class Car:
         assert state in ['charging', 'completed', 'needcharge', 'failed'], "Invalid state"
         self.state = state
 
+    def is_expired(self):
+        """离开截止时刻是否已到（允许时钟累加的浮点误差）"""
+        now = self.clock.time
+        return self.deadline <= now + 1e-9 * max(1.0, abs(now))
+
+    def refresh(self):
+        """
+        按当前时钟检查仍在场的车辆：截止时刻已到则 failed，电量达到所需电量则 completed（优先于 failed）
+        return: str, 检查后的状态
+        """
+        if self._state in ('needcharge', 'charging'):
+            if self.is_expired():
+                self.state = 'failed'
+            if self.battery.soc >= self.required_soc:
+                self.state = 'completed'
+        return self._state
+
     def update(self, step_time=0.1):
         """
-        更新逻辑：
-        1. 更新当前时间
-        2. 更新离开时间
-        3. 如果离开时间小于等于0，设置状态为failed
-        4. 如果状态为needcharge，累计等待时间
-        5. 检查电池是否充满，若是，设置状态为completed
+        单独使用车辆（未共享环境时钟）时推进自身时钟 step_time 秒并检查状态；
+        共享环境时钟时时间由环境推进，只检查状态
         step_time: float, 时间步长（秒）
         """
-        self.time += step_time
-        self.departure_time -= step_time
-        if (self.departure_time <= 0):
-            self.set_state('failed')
-        if self.state == 'needcharge':
-            self.waittime += step_time
-        if self.battery.soc >= self.required_soc:
-            self.set_state('completed')
-
-
+        if self._own_clock:
+            self.clock.advance(step_time)
+        self.refresh()
+        if self._own_clock:
+            self.clock.settle()
@@ -0,0 +1,49 @@
+"""
+仿真时钟模块 (Simulation Clock Module)
+======================================
+本模块实现环境与车辆共享的仿真时钟，车辆据此由绝对时间戳推导离开倒计时、在场时间与等待时间。
+
+主要功能：
+- time：当前仿真时间（秒）
+- mark：状态变化的记账时刻（秒）。环境推进一步的过程中为该步的起点，推进结束后等于 time
+
+设计说明：
+原实现在每个时间步结束时为每辆车累加等待时间，状态在步内发生变化时，整步都按变化后的状态计入。
+推进过程中把 mark 保持在步的起点，车辆在状态变化时以 mark 结算等待时间，得到的结果与逐步累加完全一致；
+步与步之间（如调度策略分配任务时）mark 等于当前时间。
+
+用法示例：
+    clock = SimClock()
+    clock.advance(1.0)   # mark 停在步起点
+    ...                  # 推进机器人与车辆
+    clock.settle()       # 步结束，mark = time
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+
+class SimClock:
+    __slots__ = ('time', 'mark')
+
+    def __init__(self, time=0):
+        self.time = time  # 当前仿真时间（秒）
+        self.mark = time  # 状态变化的记账时刻（秒）
+
+    def advance(self, time_step):
+        """开始推进一步：mark 停在步起点，time 前进 time_step"""
+        self.advance_to(self.time + time_step)
+
+    def advance_to(self, time):
+        """开始推进一步：mark 停在步起点，time 前进到 time"""
+        self.mark = self.time
+        self.time = time
+
+    def settle(self):
+        """结束当前步，mark 追上 time"""
+        self.mark = self.time
+
+    def reset(self, time):
+        self.time = time
+        self.mark = time
@@ -1,5 +1,6 @@
 from models.battery import Battery
 from models.car import Car
+from models.clock import SimClock
 
 """
 机器人模块 (Robot Module)
@@ -12,9 +13,15 @@ from models.car import Car
 - 管理机器人携带的电池对象
 - 与车辆对象的任务分配与充电协作
 - 能耗与换电流程模拟
+- 解析式行驶：出发时一次算出方向、距离与到达时刻，位置与行驶耗电在被读取时按时钟插值
 
 设计说明：
 机器人对象用于模拟园区内自动充电机器人的实际运行过程，支持多种状态切换（如前往车辆、放电、回库、换电等），并与车辆、电池对象紧密协作，实现智能调度与能量管理。
+Robot 使用 __slots__ 声明全部字段，update 中频繁的属性读写不再经过实例 __dict__。
+机器人与环境共享 SimClock。每段行程（前往车辆、回库）在出发时记录起点、单位方向、距离和出发时刻，
+行驶途中的 update 只比较已行驶距离与"剩余不足 1 米"的到达条件，不再逐步开方和放电；
+x、y 和 battery 在被读取时才把位置和行驶耗电补算到当前时刻，结果与逐步移动一致。
+放电时回站所需电量阈值只取决于停车点到机器人库的距离，在到达车辆时计算一次并缓存。
 
 用法示例：
     robot = Robot(id=1, home_x=0, home_y=0)
@@ -28,7 +35,10 @@ from models.car import Car
 """
 
 class Robot:
-    def __init__(self, id, home_x=0, home_y=0, speed=10, swap_time=120, target: Car = None):
+    __slots__ = ('id', 'home_x', 'home_y', 'speed', 'swap_time', 'state', 'target', 'target_point', 'swap_timer',
+                 'min_soc', 'clock', '_x', '_y', '_battery', '_leg', '_moved', '_return_soc', '_own_clock')
+
+    def __init__(self, id, home_x=0, home_y=0, speed=10, swap_time=120, target: Car = None, clock=None):
         """
         param：
         id: 机器人编号
@@ -36,15 +46,21 @@ class Robot:
         speed: 移动速度 m/s
         swap_time: 换电时间（秒），默认2分钟
         battery: 初始携带的电池对象
+        clock: 环境共享的 SimClock；None 时机器人使用自己的时钟，由 update() 推进
         """
         self.id = id # 机器人编号
-        self.x = home_x  # 当前位置
-        self.y = home_y
+        self._own_clock = clock is None
+        self.clock = SimClock() if clock is None else clock
+        self._leg = None  # 当前行程 (起点x, 起点y, 单位方向x, 单位方向y, 距离, 出发时刻)
+        self._moved = 0.0  # 当前行程已补算（位置与耗电）的行驶距离
+        self._return_soc = None  # 放电时回站所需的电量阈值
+        self._x = home_x  # 当前位置
+        self._y = home_y
         self.home_x = home_x
         self.home_y = home_y
         self.speed = speed
         self.swap_time = swap_time
-        self.battery = Battery(
+        self._battery = Battery(
             voltage=800, # 电池架构：800V
             capacity=200, # 电池容量：200kWh
             soc=100, # 初始电量：100%
@@ -56,44 +72,117 @@ class Robot:
         self.swap_timer = 0  # 换电计时
         self.min_soc = 15 # self.cal_distance() * 100 / (5000 * self.battery.capacity)
 
+    @property
+    def x(self):
+        self._sync()
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._sync()
+        self._leg = None  # 直接设置位置会结束当前行程，下次 update 时从新位置重新出发
+        self._x = value
+
+    @property
+    def y(self):
+        self._sync()
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._sync()
+        self._leg = None
+        self._y = value
+
+    @property
+    def battery(self):
+        self._sync()
+        return self._battery
+
+    @battery.setter
+    def battery(self, battery):
+        self._sync()
+        self._battery = battery
+
+    def _start_leg(self, point):
+        """从当前位置出发前往 point，出发时刻为时钟的记账时刻（本步起点）"""
+        self._sync()
+        dx = point[0] - self._x
+        dy = point[1] - self._y
+        distance = (dx ** 2 + dy ** 2) ** 0.5
+        if distance > 0:
+            self._leg = (self._x, self._y, dx / distance, dy / distance, distance, self.clock.mark)
+        else:
+            self._leg = (self._x, self._y, 0.0, 0.0, 0.0, self.clock.mark)
+        self._moved = 0.0
+
+    def _sync(self, time=None):
+        """把当前行程的位置与行驶耗电补算到 time（默认当前时刻），每米消耗 1/5000 kWh"""
+        leg = self._leg
+        if leg is None:
+            return
+        moved = self.speed * ((self.clock.time if time is None else time) - leg[5])
+        if moved > leg[4]:
+            moved = leg[4]
+        if moved > self._moved:
+            self._battery.discharge_kwh((moved - self._moved) / 5000)
+            self._moved = moved
+            self._x = leg[0] + leg[2] * moved
+            self._y = leg[1] + leg[3] * moved
+
+    def _travel_to(self, point):
+        """确保存在前往 point 的行程，返回是否已到达（剩余距离小于 1 米，与 check_arrival 一致）"""
+        if self._leg is None:
+            self._start_leg(point)
+        leg = self._leg
+        return leg[4] - self.speed * (self.clock.time - leg[5]) < 1
+
+    def _finish_leg(self, point):
+        """结束行程并精确对齐到 point"""
+        self._sync()
+        self._leg = None
+        self._x, self._y = point
+
+    def _cancel_leg(self):
+        """行程中途取消：停在本步起点时的位置"""
+        self._sync(self.clock.mark)
+        self._leg = None
+
     def set_state(self, state):
         assert state in ['gocar', 'discharging', 'available', 'swapping', 'gohome','needswap'], "Invalid state"
         self.state = state
 
     def update(self, time_step):
         """按步长更新机器人状态"""
-        if self.target is not None:
-            if self.target.state == 'completed':
-                self.target = None
-                self.target_point = None
-                self.state = 'available'
-            if self.target and self.target.state == 'failed':
-                self.target = None
-                self.target_point = None
-                self.state = 'available'
-        if self.battery.soc <= self.cal_distance((self.home_x,self.home_y)) * 100 / (5000 * self.battery.capacity) and self.state == 'discharging':
+        if self._own_clock:
+            self.clock.advance(time_step)
+        target = self.target
+        if target is not None and target.state in ('completed', 'failed'):
+            self._cancel_leg()
+            self.target = target = None
+            self.target_point = None
+            self.state = 'available'
+        if self.state == 'discharging' and self._battery.soc <= self._return_threshold():
             self.state = 'gohome'
             self.target_point = (self.home_x,self.home_y)
-            self.target.state = 'needcharge'
-        elif self.battery.soc <= self.min_soc and self.state == 'available':
+            target.state = 'needcharge'
+        elif self.state == 'available' and self._battery.soc <= self.min_soc:
             self.state = 'gohome'
             self.target_point = (self.home_x,self.home_y)
 
-
         if self.state == 'gocar':
             assert self.target_point is not None, "目标点不能为空"
-            self.target_point = (self.target.parking_spot[0], self.target.parking_spot[1])
-            self.move_toward_target(self.target_point, time_step)
-            if self.check_arrival(self.target_point):
-                self.x, self.y = self.target.parking_spot  # 精确对齐
+            self.target_point = target.parking_spot
+            if self._travel_to(self.target_point):
+                self._finish_leg(target.parking_spot)  # 精确对齐
+                self._return_soc = None
                 self.state = 'discharging'
-                self.target.set_state('charging')
+                target.set_state('charging')
 
         elif self.state == 'discharging':
-            if self.target.state == 'charging':
-                charge_power = self.target.battery.get_charging_power()
-                self.battery.discharge_kwh(charge_power * time_step / 0.95) # 充电损耗
-                self.target.battery.charge_kwh(charge_power * time_step)
+            if target.state == 'charging':
+                charged_kwh = target.battery.charge_seconds(time_step) # 按充电曲线精确积分
+                self._battery.discharge_kwh(charged_kwh / 0.95) # 充电损耗
             else:
                 self.target = None
                 self.target_point = None
@@ -101,35 +190,26 @@ class Robot:
             
         elif self.state == 'gohome':
             self.target = None
-            self.target
-            self.move_toward_target(self.target_point, time_step)
-            if self.check_arrival((self.home_x,self.home_y)): 
-                self.x, self.y = self.home_x, self.home_y
+            if self._travel_to((self.home_x, self.home_y)):
+                self._finish_leg((self.home_x, self.home_y))
                 self.state = 'needswap'
                 self.target = None
                 self.target_point = None
-                self.battery.set_state('nonfull')
+                self._battery.set_state('nonfull')
         
         elif self.state == 'swapping':
             self.swap_timer += time_step
             if self.swap_timer >= self.swap_time:
                 self.state = 'available'
                 self.swap_timer = 0
+        if self._own_clock:
+            self.clock.settle()
 
-
-    def move_toward_target(self, targetpoint=None, time_step=0.1):
-        """按速度和步长向目标移动，并消耗电量"""
-        dx = targetpoint[0] - self.x
-        dy = targetpoint[1] - self.y
-        distance = (dx ** 2 + dy ** 2) ** 0.5
-        move_dist = min(self.speed * time_step, distance)
-        if distance > 0:
-            self.x += dx / distance * move_dist
-            self.y += dy / distance * move_dist
-            # 假设每千米消耗0.2度电
-            if self.battery:
-                self.battery.discharge_kwh(move_dist  / 5000)
-    
+    def _return_threshold(self):
+        """放电时回站所需电量（%），停车点固定，到达车辆后只计算一次"""
+        if self._return_soc is None:
+            self._return_soc = self.cal_distance((self.home_x, self.home_y)) * 100 / (5000 * self._battery.capacity)
+        return self._return_soc
 
     def cal_distance(self,target_point):
         dx = target_point[0] - self.x
@@ -144,8 +224,55 @@ class Robot:
             return True
         return False
 
+    def eta(self):
+        """
+        当前行程的到达时刻（秒，走完全程），不在行程中时返回 None
+        """
+        if self.state == 'gocar':
+            point = self.target.parking_spot
+        elif self.state == 'gohome':
+            point = (self.home_x, self.home_y)
+        else:
+            return None
+        if self._leg is None:
+            self._start_leg(point)
+        return self._leg[5] + self._leg[4] / self.speed
+
+    def next_event_delay(self):
+        """
+        当前任务下距离下一次状态变化的时间，供事件驱动模式安排事件
+        return: float, 秒；0 表示下一次 update 即发生状态变化；None 表示空闲等待分配，无待发生事件
+        """
+        if self.state == 'needswap':
+            return 0
+        if self.target is not None and self.target.state in ('completed', 'failed'):
+            return 0
+        if self.state == 'available':
+            return 0 if self._battery.soc <= self.min_soc else None
+        if self.state in ('gocar', 'gohome'):
+            return max(0, self.eta() - self.clock.time)
+        if self.state == 'swapping':
+            return max(0, self.swap_time - self.swap_timer)
+        if self.state == 'discharging':
+            if self.target.state != 'charging':
+                return 0
+            # 车辆达到所需电量，或机器人电量降到回站阈值，取较早者
+            # 充电功率随 SOC 单调不增，按当前功率线性估计的时间是精确时间的下界，
+            # 用它兜底可避免极小的剩余电量差在浮点下算出 0 秒而原地空转
+            car_battery = self.target.battery
+            power = car_battery.get_charging_power()
+            needed_kwh = (self.target.required_soc - car_battery.soc) * car_battery.capacity / 100
+            car_time = max(car_battery.get_charging_time(self.target.required_soc), needed_kwh / power)
+            # 机器人回站前还能放出的电量，折算为车辆电池可以达到的 SOC
+            deliverable_kwh = (self._battery.soc - self._return_threshold()) * self._battery.capacity / 100 * 0.95
+            robot_time = max(car_battery.get_charging_time(car_battery.soc + deliverable_kwh / car_battery.capacity * 100),
+                             deliverable_kwh / power)
+            return max(0, min(car_time, robot_time))
+        return None
+
     def assign_task(self, target_vehicle):
         """分配服务车辆任务"""
         self.target = target_vehicle
         self.target_point = (target_vehicle.parking_spot[0], target_vehicle.parking_spot[1])
         self.state = 'gocar'
+        self._start_leg(self.target_point)
@@ -0,0 +1,710 @@
+import numpy as np
+from models.battery import (charging_power_array, charging_segment_array, charging_time, soc_after_charging,
+                            soc_in_segment_array)
+from modules.vehicle_registry import VehicleRegistry
+from modules.spatial_index import SpatialIndex
+from modules.arrivals import make_arrivals, make_rng
+
+"""
+数组化园区环境模块 (ArrayParkEnv Module)
+========================================
+本模块提供 ParkEnv 的结构数组（Struct-of-Arrays）后端：机器人、车辆、电池站电池的数值状态
+分别保存在连续的 NumPy 数组中，每个时间步用向量化内核整体推进，避免逐对象调用 update()。
+
+主要功能：
+- RobotArrays / CarArrays / BatteryArrays：按字段组织的结构数组，最后一维为对象下标
+- step_park：融合内核，每个时间步一次遍历完成机器人移动、回库、换电计时、放电与车辆倒计时、状态转移；
+  车辆与电池站电池的充电合并为一次按充电曲线的解析积分，充电功率每步只计算一次
+- charge_segment：每个 SOC 槽位缓存当前充电分段的常数，未跨越分段时只需一次指数运算，跨越时逐元素回退到分段积分
+- RobotView / CarView / BatteryView：数组槽位的代理对象，对外保持与 Robot、Car、Battery 相同的属性
+- ArrayParkEnv：与 ParkEnv 相同的构造参数与 update()/get_status() 接口，TaskStrategy、ChargingVisualizer 可直接使用
+
+设计说明：
+车辆使用固定数量（max_vehicles）的槽位存储，车辆离场后其代理对象会把数据拷贝到自身（detach），
+槽位随即可被新车复用，因此 completed/failed 列表中的车辆仍可正常读取。机器人通过槽位下标引用目标车辆，
+目标车辆离场时由 released 标记在下一步释放机器人，时序与 Robot.update 中的检查一致。
+内核函数只依赖数组的最后一维，前置维度可用于多环境批量推进。
+单步的车辆与机器人数量只有数十个，NumPy 每次调用的固定开销远大于实际计算量，因此内核以减少数组操作次数为目标：
+各阶段用 np.count_nonzero 判断是否需要执行，机器人到达车辆时即算好回库所需 SOC，
+下一辆车的到达时刻未到时跳过车辆生成；TaskStrategy 的 nearest、q_table 等策略直接读取数组，不经过代理对象。
+
+用法示例：
+    env = ArrayParkEnv(park_size=(500, 500), n_robots=40, n_vehicles=100, n_batteries=24, time_step=1.0, generate_vehicles_probability=0.029167)
+    strategy = TaskStrategy(env, time_step=1.0, map_size='large')
+    strategy.update(strategy='nearest')
+    status = env.get_status()
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+ROBOT_STATES = ('available', 'gocar', 'discharging', 'gohome', 'needswap', 'swapping')
+CAR_STATES = ('needcharge', 'charging', 'completed', 'failed')
+R_AVAILABLE, R_GOCAR, R_DISCHARGING, R_GOHOME, R_NEEDSWAP, R_SWAPPING = range(len(ROBOT_STATES))
+C_NEEDCHARGE, C_CHARGING, C_COMPLETED, C_FAILED = range(len(CAR_STATES))
+
+
+class RobotArrays:
+    """
+    机器人结构数组
+    shape: 数组形状，最后一维为机器人编号
+    slot_base: 每个机器人所在环境在扁平车辆数组中的起始下标（单环境时为 0）
+    """
+    def __init__(self, shape, home_x, home_y, slot_base=0, speed=10, swap_time=120, min_soc=15):
+        self.x = np.full(shape, home_x, dtype=float)
+        self.y = np.full(shape, home_y, dtype=float)
+        self.home_x = np.full(shape, home_x, dtype=float)
+        self.home_y = np.full(shape, home_y, dtype=float)
+        self.speed = np.full(shape, speed, dtype=float)
+        self.swap_time = np.full(shape, swap_time, dtype=float)
+        self.swap_timer = np.zeros(shape)
+        self.min_soc = np.full(shape, min_soc, dtype=float)
+        self.state = np.full(shape, R_AVAILABLE, dtype=np.int8)
+        self.target = np.full(shape, -1, dtype=np.int64)  # 目标车辆槽位，-1 表示无目标
+        self.released = np.zeros(shape, dtype=bool)  # 目标车辆已离场，下一步恢复空闲
+        self.queued = np.zeros(shape, dtype=bool)  # 是否已加入换电队列
+        self.slot_base = np.broadcast_to(slot_base, shape)
+        # 机器人携带的电池：800V、200kWh、满电
+        self.soc = np.full(shape, 100, dtype=float)
+        self.capacity = np.full(shape, 200, dtype=float)
+        self.voltage = np.full(shape, 800, dtype=np.int64)
+        self.battery_full = np.ones(shape, dtype=bool)
+        self.return_soc = np.zeros(shape)  # 放电中回站所需的电量，到达车辆时计算
+
+
+class CarArrays:
+    """
+    车辆槽位结构数组
+    shape: 数组形状，最后一维为车辆槽位
+    """
+    def __init__(self, shape):
+        self.active = np.zeros(shape, dtype=bool)  # 槽位是否有在场车辆
+        self.id = np.zeros(shape, dtype=np.int64)
+        self.x = np.zeros(shape)
+        self.y = np.zeros(shape)
+        self.departure_time = np.zeros(shape)
+        self.time = np.zeros(shape)
+        self.waittime = np.zeros(shape)
+        self.state = np.full(shape, C_NEEDCHARGE, dtype=np.int8)
+        self.listed = np.full(shape, C_NEEDCHARGE, dtype=np.int8)  # 车辆当前所在的列表
+        self.required_soc = np.zeros(shape)
+        self.battery_gap = np.zeros(shape)
+        self.soc = np.zeros(shape)
+        self.capacity = np.zeros(shape)
+        self.voltage = np.zeros(shape, dtype=np.int64)
+        self.battery_full = np.zeros(shape, dtype=bool)
+        self.charge_segment = np.zeros((6,) + tuple(shape))  # 当前充电分段的常数，生成车辆时计算
+        # 车辆最近一次进入当前状态桶的序号：同一状态的车辆按序号排列即为 ParkEnv 状态桶内的顺序（VecParkEnv 使用）
+        self.bucket_seq = np.zeros(shape, dtype=np.int64)
+        self.bucket_clock = 0
+
+    def enter_bucket(self, index):
+        """
+        按给出的先后顺序为进入新状态桶的车辆编号，与 ParkEnv 中车辆追加到状态桶末尾的顺序对应
+        index: 扁平槽位下标数组
+        """
+        self.bucket_seq.reshape(-1)[index] = self.bucket_clock + np.arange(len(index))
+        self.bucket_clock += len(index)
+
+
+class BatteryArrays:
+    """
+    电池站电池结构数组
+    shape: 数组形状，最后一维为电池编号
+    """
+    def __init__(self, shape, capacity=200, soc=100, voltage=800):
+        self.soc = np.full(shape, soc, dtype=float)
+        self.capacity = np.full(shape, capacity, dtype=float)
+        self.voltage = np.full(shape, voltage, dtype=np.int64)
+        self.battery_full = self.soc == 100
+        self.charge_segment = charging_segment_array(self.soc, self.voltage, self.capacity)  # 当前充电分段的常数
+
+
+def step_park(robots, cars, batteries, time_step, swap=None):
+    """
+    一个时间步的融合内核：按 Robot.update、Car.update、BatteryStation.update 的顺序推进机器人、车辆与电池站，
+    各阶段共用一次计算的状态掩码，没有对象处于某一阶段时跳过该阶段；
+    机器人给车充电与电池站给未满电池充电合并为一次充电曲线积分
+    （本步有待换电的机器人时，换电会改变电池站的电池，电池站充电在换电之后单独积分）
+    robots: RobotArrays
+    cars: CarArrays，与 robots.slot_base 对应的车辆槽位数组
+    batteries: BatteryArrays，电池站电池
+    time_step: 步长（秒）
+    swap: 无参可调用对象，在车辆推进之后、电池站充电之前为待换电的机器人换电；None 表示不换电
+    return: np.ndarray[bool]，本步完成或失败、需要离场的车辆槽位
+    """
+    state = robots.state
+    swap_pending = False
+    target = robots.slot_base + robots.target  # 目标在扁平车辆数组中的下标，只在有目标的机器人上使用
+    car_state = cars.state.reshape(-1)
+
+    # 目标车辆已完成或失败：释放机器人
+    if np.count_nonzero(robots.released):
+        state[robots.released] = R_AVAILABLE
+        robots.released[:] = False
+
+    # 放电中电量仅够回站：回库，车辆重新等待；空闲且低电量：回库
+    discharging = state == R_DISCHARGING
+    if np.count_nonzero(discharging):
+        go_back = discharging & (robots.soc <= robots.return_soc)
+        if np.count_nonzero(go_back):
+            # 同一步重新等待的车辆按原充电桶内的顺序追加到待充电桶末尾
+            requeue = target[go_back]
+            requeue = requeue[np.argsort(cars.bucket_seq.reshape(-1)[requeue], kind='stable')]
+            car_state[requeue] = C_NEEDCHARGE
+            cars.enter_bucket(requeue)
+            state[go_back] = R_GOHOME
+            discharging &= ~go_back
+    state[(state == R_AVAILABLE) & (robots.soc <= robots.min_soc)] = R_GOHOME
+
+    gocar = state == R_GOCAR
+    gohome = state == R_GOHOME
+    robots.target[gohome] = -1
+
+    # 前往车辆与回库共用移动逻辑，每米消耗 1/5000 kWh
+    moving = gocar | gohome
+    if np.count_nonzero(moving):
+        target_x = np.where(gocar, cars.x.reshape(-1)[target], robots.home_x)
+        target_y = np.where(gocar, cars.y.reshape(-1)[target], robots.home_y)
+        dx = target_x - robots.x
+        dy = target_y - robots.y
+        distance = np.hypot(dx, dy)
+        move_dist = np.where(moving, np.minimum(robots.speed * time_step, distance), 0.0)
+        ratio = np.divide(move_dist, distance, out=np.zeros_like(distance), where=distance > 0)
+        robots.x += dx * ratio
+        robots.y += dy * ratio
+        robots.soc = np.maximum(0, robots.soc - move_dist / 5000 / robots.capacity * 100)
+
+        arrived = moving & (np.hypot(target_x - robots.x, target_y - robots.y) < 1)
+        if np.count_nonzero(arrived):
+            robots.x = np.where(arrived, target_x, robots.x)
+            robots.y = np.where(arrived, target_y, robots.y)
+            at_car = arrived & gocar
+            state[at_car] = R_DISCHARGING
+            car_state[target[at_car]] = C_CHARGING
+            # 放电期间机器人停在车旁，回站所需电量在到达时算一次
+            home_distance = np.hypot(robots.home_x[at_car] - robots.x[at_car], robots.home_y[at_car] - robots.y[at_car])
+            robots.return_soc[at_car] = home_distance * 100 / (5000 * robots.capacity[at_car])
+            at_home = arrived & gohome
+            state[at_home] = R_NEEDSWAP
+            robots.battery_full[at_home] = False
+            # update() 开头已把上一步的待换电机器人移入换电状态，本步待换电的只有刚回到站的机器人
+            swap_pending = swap is not None and batteries.soc.size and np.count_nonzero(at_home & robots.queued)
+
+    # 放电：目标车辆仍在充电的机器人给车充电，否则恢复空闲
+    charging = discharging & (car_state[target] == C_CHARGING)
+    idle = discharging ^ charging
+    if np.count_nonzero(idle):
+        state[idle] = R_AVAILABLE
+        robots.target[idle] = -1
+
+    # 换电计时
+    swapping = state == R_SWAPPING
+    if np.count_nonzero(swapping):
+        robots.swap_timer[swapping] += time_step
+        swapped = swapping & (robots.swap_timer >= robots.swap_time)
+        state[swapped] = R_AVAILABLE
+        robots.swap_timer[swapped] = 0
+
+    # 充电曲线积分：车辆在前，电池站未满的电池在后，拼接后只积分一次
+    car_slots = target[charging]
+    station = None if swap_pending else _nonfull(batteries)
+    parts = [(cars, car_slots)] if car_slots.size else []
+    if station is not None:
+        parts.append((batteries, station))
+    if parts:
+        charged = _charge(parts, time_step)
+        if car_slots.size:
+            # 机器人侧计入 5% 损耗
+            start, new_soc = charged[0]
+            charged_kwh = (new_soc - start) * cars.capacity.reshape(-1)[car_slots] / 100
+            robots.soc[charging] = np.maximum(0, robots.soc[charging] - charged_kwh / 0.95 / robots.capacity[charging] * 100)
+        if station is not None:
+            batteries.battery_full.reshape(-1)[station] = charged[-1][1] == 100
+
+    # 车辆：计时、超时失败、等待计时、充满完成；空槽位的计时在生成车辆时重置，无需屏蔽
+    active = cars.active
+    cars.time += time_step
+    cars.departure_time -= time_step
+    car_state = cars.state
+    failed = active & (cars.departure_time <= 0)
+    car_state[failed] = C_FAILED
+    np.add(cars.waittime, time_step, out=cars.waittime, where=car_state == C_NEEDCHARGE)
+    completed = active & (cars.soc >= cars.required_soc)
+    car_state[completed] = C_COMPLETED
+    leaving = failed | completed
+
+    # 电池站：换电后再为未满的电池充电
+    if swap_pending:
+        swap()
+        _charge_station(batteries, time_step)
+    return leaving
+
+
+def _nonfull(batteries):
+    """电池站未满电池的扁平下标，全部充满时返回 None"""
+    nonfull = ~batteries.battery_full.reshape(-1)
+    return nonfull.nonzero()[0] if np.count_nonzero(nonfull) else None
+
+
+def _charge(parts, time_step):
+    """
+    把若干组电池拼接后按缓存的分段常数一次积分并写回 SOC；跨越分段的元素逐分段重新计算，并更新其分段常数
+    parts: [(结构数组, 扁平下标)]，结构数组带有 soc / voltage / capacity / charge_segment 字段
+    return: 每组的 (充电前 SOC, 充电后 SOC)
+    """
+    if len(parts) == 1:
+        arrays, index = parts[0]
+        start, params = arrays.soc.reshape(-1)[index], arrays.charge_segment.reshape(6, -1)[:, index]
+    else:
+        start = np.concatenate([arrays.soc.reshape(-1)[index] for arrays, index in parts])
+        params = np.concatenate([arrays.charge_segment.reshape(6, -1)[:, index] for arrays, index in parts], axis=1)
+    new_soc, crossed = soc_in_segment_array(start, params, time_step)
+    crossed = crossed.nonzero()[0]
+    if crossed.size:
+        # 跨段的元素通常只有一两个，逐个用标量积分
+        voltage = np.concatenate([arrays.voltage.reshape(-1)[index] for arrays, index in parts])[crossed]
+        capacity = np.concatenate([arrays.capacity.reshape(-1)[index] for arrays, index in parts])[crossed]
+        new_soc[crossed] = [soc_after_charging(soc, time_step, v, c)
+                            for soc, v, c in zip(start[crossed].tolist(), voltage.tolist(), capacity.tolist())]
+        params[:, crossed] = charging_segment_array(new_soc[crossed], voltage, capacity)
+    result = []
+    offset = 0
+    for arrays, index in parts:
+        end = offset + len(index)
+        arrays.soc.reshape(-1)[index] = new_soc[offset:end]
+        if crossed.size:
+            arrays.charge_segment.reshape(6, -1)[:, index] = params[:, offset:end]
+        result.append((start[offset:end], new_soc[offset:end]))
+        offset = end
+    return result
+
+
+def _charge_station(batteries, time_step):
+    """只为电池站未满的电池按充电曲线积分"""
+    station = _nonfull(batteries)
+    if station is not None:
+        _, charged = _charge([(batteries, station)], time_step)[0]
+        batteries.battery_full.reshape(-1)[station] = charged == 100
+
+
+def refresh_charge_segment(arrays, index):
+    """SOC 被充电以外的方式改变后（生成车辆、换电、直接赋值），重新计算该槽位的充电分段常数"""
+    arrays.charge_segment[(slice(None),) + np.index_exp[index]] = charging_segment_array(
+        arrays.soc[index], arrays.voltage[index], arrays.capacity[index])
+
+
+def release_robots(robots, leaving):
+    """
+    目标车辆离场的机器人置 released 标记，下一步恢复空闲
+    robots: RobotArrays
+    leaving: np.ndarray[bool]，离场车辆槽位
+    """
+    hit = (robots.target >= 0) & leaving.reshape(-1)[robots.slot_base + np.maximum(robots.target, 0)]
+    robots.released |= hit
+    robots.target[hit] = -1
+
+
+def swap_battery(robots, robot_index, batteries, battery_index):
+    """
+    交换机器人与电池站指定槽位的电池数据，换下的电池标记为未满
+    robot_index / battery_index: 数组下标（整数或下标元组）
+    """
+    for field in ('soc', 'capacity', 'voltage', 'battery_full'):
+        robot_values = getattr(robots, field)
+        station_values = getattr(batteries, field)
+        robot_values[robot_index], station_values[battery_index] = station_values[battery_index], robot_values[robot_index]
+    batteries.battery_full[battery_index] = False
+    refresh_charge_segment(batteries, battery_index)
+    robots.state[robot_index] = R_SWAPPING
+
+
+class _SlotView:
+    """数组槽位代理基类：按字段名读写结构数组的某个槽位，detach 后改为读写自身保存的数据"""
+    __slots__ = ('_arrays', '_slot', '_frozen')
+    _fields = ()
+    _charge_cached = False  # 结构数组是否缓存充电分段常数（车辆与电池站电池）
+
+    def __init__(self, arrays, slot):
+        self._arrays = arrays
+        self._slot = slot
+        self._frozen = None
+
+    def _get(self, name):
+        if self._frozen is not None:
+            return self._frozen[name]
+        return getattr(self._arrays, name)[self._slot].item()
+
+    def _set(self, name, value):
+        if self._frozen is not None:
+            self._frozen[name] = value
+        else:
+            getattr(self._arrays, name)[self._slot] = value
+
+    def _set_soc(self, value):
+        self._set('soc', value)
+        if self._charge_cached and self._frozen is None:
+            refresh_charge_segment(self._arrays, self._slot)
+
+    def _detach(self):
+        """将槽位数据拷贝到代理自身，槽位随后可被复用"""
+        self._frozen = {name: self._get(name) for name in self._fields}
+        self._slot = None
+
+
+def _field(name):
+    return property(lambda self: self._get(name), lambda self, value: self._set(name, value))
+
+
+class BatteryView:
+    """
+    电池代理，接口与 Battery 相同
+    owner: 所属的数组槽位代理（机器人、车辆或电池站槽位）
+    """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    soc = property(lambda self: self._owner._get('soc'), lambda self, value: self._owner._set_soc(value))
+    capacity = property(lambda self: self._owner._get('capacity'))
+    voltage = property(lambda self: self._owner._get('voltage'))
+
+    @property
+    def state(self):
+        return 'full' if self._owner._get('battery_full') else 'nonfull'
+
+    def set_state(self, state):
+        assert state in ['full', 'nonfull'], "Invalid state"
+        self._owner._set('battery_full', state == 'full')
+
+    def charge_kwh(self, kwh):
+        self.soc = min(100, self.soc + (kwh / self.capacity) * 100)
+
+    def discharge_kwh(self, kwh):
+        self.soc = max(0, self.soc - (kwh / self.capacity) * 100)
+
+    def get_charging_power(self):
+        return float(charging_power_array(self.soc, self.voltage))
+
+    def get_charging_time(self, soc_to, soc_from=None):
+        soc = self.soc if soc_from is None else soc_from
+        return charging_time(soc, soc_to, self.voltage, self.capacity)
+
+    def get_soc_after(self, seconds, soc_from=None):
+        soc = self.soc if soc_from is None else soc_from
+        return soc_after_charging(soc, seconds, self.voltage, self.capacity)
+
+    def charge_seconds(self, seconds):
+        soc = self.get_soc_after(seconds)
+        kwh = (soc - self.soc) * self.capacity / 100
+        self.soc = soc
+        return kwh
+
+    def is_full(self):
+        return self.soc == 100
+
+    def is_empty(self):
+        return self.soc <= 0
+
+    def get_soc(self):
+        return self.soc
+
+
+class _BatterySlot(_SlotView):
+    """电池站电池槽位"""
+    __slots__ = ()
+    _charge_cached = True
+    _fields = ('soc', 'capacity', 'voltage', 'battery_full')
+
+
+class RobotView(_SlotView):
+    """机器人代理，属性与 Robot 相同，状态推进由 ArrayParkEnv 统一完成"""
+    __slots__ = ('_env', 'id', 'battery')
+    _fields = ('x', 'y', 'home_x', 'home_y', 'speed', 'swap_time', 'swap_timer', 'min_soc')
+
+    def __init__(self, env, index):
+        super().__init__(env.robot_arrays, index)
+        self._env = env
+        self.id = index + 1
+        self.battery = BatteryView(self)
+
+    x = _field('x')
+    y = _field('y')
+    home_x = _field('home_x')
+    home_y = _field('home_y')
+    speed = _field('speed')
+    swap_time = _field('swap_time')
+    swap_timer = _field('swap_timer')
+    min_soc = _field('min_soc')
+
+    @property
+    def state(self):
+        return ROBOT_STATES[self._arrays.state[self._slot]]
+
+    @state.setter
+    def state(self, state):
+        self._set('state', ROBOT_STATES.index(state))
+
+    def set_state(self, state):
+        assert state in ['gocar', 'discharging', 'available', 'swapping', 'gohome', 'needswap'], "Invalid state"
+        self.state = state
+
+    @property
+    def target(self):
+        slot = self._get('target')
+        return self._env._car_views[slot] if slot >= 0 else None
+
+    @property
+    def target_point(self):
+        state = self.state
+        if state == 'gohome':
+            return (self.home_x, self.home_y)
+        target = self.target
+        return target.parking_spot if target is not None else None
+
+    def cal_distance(self, target_point):
+        return ((target_point[0] - self.x) ** 2 + (target_point[1] - self.y) ** 2) ** 0.5
+
+    def check_arrival(self, target_point):
+        return self.cal_distance(target_point) < 1
+
+    def assign_task(self, target_vehicle):
+        """分配服务车辆任务"""
+        self._set('target', target_vehicle._slot)
+        self._set('released', False)
+        self.state = 'gocar'
+
+
+class CarView(_SlotView):
+    """车辆代理，属性与 Car 相同，离场后 detach 保留最终数据"""
+    __slots__ = ('id', 'battery', 'counted')
+    _charge_cached = True
+    _fields = ('x', 'y', 'departure_time', 'time', 'waittime', 'state', 'required_soc', 'battery_gap',
+               'soc', 'capacity', 'voltage', 'battery_full')
+
+    def __init__(self, env, slot):
+        super().__init__(env.car_arrays, slot)
+        self.id = int(env.car_arrays.id[slot])
+        self.battery = BatteryView(self)
+        self.counted = 0  # 与 Car.counted 相同
+
+    departure_time = _field('departure_time')
+    time = _field('time')
+    waittime = _field('waittime')
+    required_soc = _field('required_soc')
+    battery_gap = _field('battery_gap')
+
+    @property
+    def parking_spot(self):
+        return (self._get('x'), self._get('y'))
+
+    @property
+    def state(self):
+        return CAR_STATES[self._get('state')]
+
+    @state.setter
+    def state(self, state):
+        self._set('state', CAR_STATES.index(state))
+
+    def set_state(self, state):
+        assert state in ['charging', 'completed', 'needcharge', 'failed'], "Invalid state"
+        self.state = state
+
+
+class ArrayBatteryStation:
+    """
+    数组化电池站，接口与 BatteryStation 相同
+    env: 所属 ArrayParkEnv
+    """
+    def __init__(self, env, n_batteries, location):
+        self._env = env
+        self.location = location
+        self.battery_arrays = BatteryArrays((n_batteries,), capacity=200, soc=100, voltage=800)
+        self.batteries = [BatteryView(_BatterySlot(self.battery_arrays, i)) for i in range(n_batteries)]
+        self._queue = []  # 换电队列中的机器人下标，按入队顺序
+
+    @property
+    def robotsqueue(self):
+        return [self._env.robots[i] for i in self._queue]
+
+    def enqueue(self, robot_indices):
+        """机器人首次需要换电时加入换电队列"""
+        self._queue.extend(int(i) for i in robot_indices)
+
+    def get_status(self):
+        return self.battery_arrays.soc.tolist()
+
+    def get_maxsoc(self):
+        if not len(self.batteries):
+            return None
+        return float(self.battery_arrays.soc.max())
+
+    def swap(self):
+        """给队列中等待换电的机器人换电，由 step_park 在电池站充电之前调用"""
+        robots = self._env.robot_arrays
+        batteries = self.battery_arrays
+        for i in self._queue:
+            if robots.state[i] != R_NEEDSWAP:
+                continue
+            best = int(batteries.soc.argmax())
+            if batteries.soc[best] > robots.soc[i] and batteries.soc[best] > 50:
+                swap_battery(robots, i, batteries, best)
+
+    def update(self, time_step):
+        """按时间步长换电并为未满的电池充电；ArrayParkEnv.update 中这两步由 step_park 完成"""
+        if len(self.batteries):
+            self.swap()
+        _charge_station(self.battery_arrays, time_step)
+
+
+class ArrayParkEnv:
+    """
+    园区自动充电机器人调度环境（结构数组后端）
+    参数与 ParkEnv 相同，相同种子下到达序列与 ParkEnv 一致
+    """
+    def __init__(self, park_size, n_robots, n_vehicles, n_batteries, time_step, generate_vehicles_probability, seed=None, workload=None):
+        self.park_size = park_size  # 场地大小
+        self.n_robots = n_robots  # 最大机器人数量
+        self.n_batteries = n_batteries
+        self.max_vehicles = n_vehicles  # 最大同时在场车辆
+        self.n_vehicles = 0  # 在场车辆计数器
+        self.generate_vehicles_probability = generate_vehicles_probability * time_step  # 车辆生成概率
+        self.rng = make_rng(seed)
+        self.arrivals = make_arrivals(self.rng, park_size, self.generate_vehicles_probability, time_step, workload)
+        self._next_arrival = -np.inf  # 下一次到达的时刻，取出到期车辆后更新
+        self.vehicles_index = 1
+        self.vehicles = VehicleRegistry()  # 与 ParkEnv 相同，四个列表属性指向其中的状态桶
+        self.needcharge_vehicles = self.vehicles.needcharge
+        self.charging_vehicles = self.vehicles.charging
+        self.completed_vehicles = self.vehicles.completed
+        self.failed_vehicles = self.vehicles.failed
+        self.spatial = SpatialIndex(park_size, self.vehicles)  # 与 ParkEnv 相同的空间索引
+        self.dispatch_dirty = True  # 与 ParkEnv 相同的调度脏标记
+        self.vehicles.listeners.append(self._on_vehicle)
+        self.time = 0  # 当前仿真时间（秒）
+        self.time_step = time_step  # 时间步长（秒）
+        self.recorder = None  # 运行记录器，见 attach_recorder
+
+        # 结构数组：机器人从园区中心出发，车辆按 max_vehicles 预分配槽位
+        self.robot_arrays = RobotArrays((n_robots,), home_x=park_size[0] / 2, home_y=park_size[1] / 2)
+        self.car_arrays = CarArrays((n_vehicles,))
+        self._car_views = [None] * n_vehicles
+
+        self.battery_station = ArrayBatteryStation(self, n_batteries, location=(park_size[0] / 2, park_size[1] / 2))
+        self.robots = [RobotView(self, i) for i in range(n_robots)]
+
+    def _on_vehicle(self, car, old_state, new_state):
+        if new_state == 'needcharge':
+            self.dispatch_dirty = True
+
+    def random_generate_vehicles(self, probability=0.001):
+        """按到达序列生成到期的车辆，下一次到达还在半个步长之后时直接返回；probability 仅为兼容 ParkEnv 的接口"""
+        if self._next_arrival - self.time > self.time_step / 2:
+            return
+        for record in self.arrivals.pop_due(self.time):
+            if self.n_vehicles < self.max_vehicles:
+                slot = int(np.flatnonzero(~self.car_arrays.active)[0])
+                self._spawn_vehicle(slot, record)
+        self._next_arrival = self.arrivals.peek_time()
+
+    def _spawn_vehicle(self, slot, record):
+        """在空槽位按到达记录生成新车"""
+        cars = self.car_arrays
+        for field in ('departure_time', 'x', 'y', 'voltage', 'capacity', 'soc', 'required_soc'):
+            getattr(cars, field)[slot] = record[field]
+        cars.battery_gap[slot] = (cars.required_soc[slot] - cars.soc[slot]) * cars.capacity[slot] / 100
+        cars.battery_full[slot] = False
+        refresh_charge_segment(cars, slot)
+        cars.time[slot] = 0
+        cars.waittime[slot] = 0
+        cars.state[slot] = C_NEEDCHARGE
+        cars.listed[slot] = C_NEEDCHARGE
+        cars.enter_bucket([slot])
+        cars.id[slot] = self.vehicles_index
+        cars.active[slot] = True
+
+        car = CarView(self, slot)
+        self._car_views[slot] = car
+        self.vehicles.add(car, 'needcharge')
+        self.vehicles_index += 1
+        self.n_vehicles += 1
+
+    def update(self, time_step):
+        """
+        主程序逻辑：与 ParkEnv.update 相同的顺序推进机器人、车辆与电池站
+        """
+        self.time += self.time_step
+        # 随机生成车辆
+        self.random_generate_vehicles(self.generate_vehicles_probability)
+
+        # 需要换电的机器人进入换电队列
+        robots = self.robot_arrays
+        needswap = robots.state == R_NEEDSWAP
+        if np.count_nonzero(needswap):
+            self.battery_station.enqueue(np.flatnonzero(needswap & ~robots.queued))
+            robots.queued |= needswap
+            robots.state[needswap] = R_SWAPPING
+
+        # 机器人、车辆与电池站在一个融合内核中推进
+        idle = robots.state == R_AVAILABLE
+        leaving = step_park(robots, self.car_arrays, self.battery_station.battery_arrays, time_step,
+                            swap=self.battery_station.swap)
+        if np.count_nonzero((robots.state == R_AVAILABLE) > idle):
+            self.dispatch_dirty = True
+        self._sync_vehicle_lists(leaving)
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def attach_recorder(self, recorder):
+        """挂接运行记录器（modules.recorder.SimulationRecorder），此后每次 update 结束时记录一帧"""
+        self.recorder = recorder
+        recorder.bind(self)
+        return recorder
+
+    def _sync_vehicle_lists(self, leaving):
+        """
+        状态发生变化的车辆在登记表的状态桶间转移，只在本步有状态转移时才处理
+        先转移原待充电桶中的车辆、再转移原充电桶中的车辆，桶内顺序与 ParkEnv 一致
+        leaving: np.ndarray[bool]，本步完成或失败的槽位
+        """
+        cars = self.car_arrays
+        changed = cars.state != cars.listed  # 空槽位的 listed 在离场时已与 state 同步
+        if not np.count_nonzero(changed):
+            return
+        # 调度策略可能已把车辆转入充电桶，以登记表中实际所在的桶为准
+        registry = self.vehicles
+        moved = []
+        for slot in np.flatnonzero(changed):
+            car = self._car_views[slot]
+            bucket = registry.state_of(car)
+            if bucket != CAR_STATES[cars.state[slot]]:
+                moved.append((bucket != 'needcharge', registry.buckets[bucket].position(car), car))
+        for _, _, car in sorted(moved, key=lambda item: item[:2]):
+            registry.transition(car, car.state)
+
+        if leaving.any():
+            release_robots(self.robot_arrays, leaving)
+            for slot in np.flatnonzero(leaving):
+                self._car_views[slot]._detach()
+                self._car_views[slot] = None
+            cars.active[leaving] = False
+            self.n_vehicles -= int(leaving.sum())
+        cars.listed[:] = cars.state
+
+    def get_status(self):
+        """
+        返回当前环境状态
+        """
+        robots = self.robot_arrays
+        return {
+            "time": self.time,
+            "robots": list(zip(robots.x.tolist(), robots.y.tolist(),
+                               [ROBOT_STATES[s] for s in robots.state], robots.soc.tolist())),
+            "completed_vehicles_num": len(self.completed_vehicles),
+            "failed_vehicles_num": len(self.failed_vehicles),
+            "needcharge_vehicles_num": len(self.needcharge_vehicles),
+            "charging_vehicles_num": len(self.charging_vehicles),
+            "battery_station": self.battery_station.get_status()
+        }
@@ -0,0 +1,243 @@
+import numpy as np
+
+"""
+车辆到达序列模块 (Arrival Trace Module)
+=======================================
+本模块为园区环境预先生成车辆到达序列：到达时刻、停车位置、电池架构、电池容量、到达电量与离开所需电量，
+全部由环境自带的 np.random.Generator 按块向量化抽取。
+
+主要功能：
+- make_rng：由种子创建 np.random.Generator；未给种子时从全局 np.random 派生，保持 np.random.seed 的可复现性
+- ArrivalTrace：按块生成到达序列，pop_due(time) 取出到期的到达记录，peek_time() 查看下一次到达时刻
+- 到达记录为 NumPy 结构数组（ARRIVAL_DTYPE），可直接用于创建 Car 或写入数组化环境的车辆槽位
+- WorkloadTrace：以内存映射方式回放外部到达记录文件（.npy），接口与 ArrivalTrace 相同，按块惰性读取
+- write_workload：把到达记录按时间排序后写成 WorkloadTrace 可读取的 .npy 文件
+- make_arrivals：环境构造时按是否给出 workload 选择到达来源
+
+设计说明：
+每个时间步的到达仍是概率为 p 的伯努利试验，与 ParkEnv.random_generate_vehicles 的模型相同，
+但一次抽取一整块时间步，车辆参数也一次性按块生成，抽样成本几乎可以忽略。
+到达序列只取决于种子，与调度策略无关：园区已满时到期的记录直接丢弃，后续车辆不受影响，
+因此不同策略在相同种子下面对完全相同的车辆（公共随机数），多线程、多进程运行也可复现。
+回放真实到达日志时，文件通过 np.load(mmap_mode='r') 映射，每次只把 chunk_size 条记录拷入内存，
+数十万辆车的多日日志也不会整体载入；序列化（快照、跨进程）时只保存文件路径与读取位置。
+
+用法示例：
+    trace = ArrivalTrace(make_rng(0), park_size=(100, 100), probability=0.003056, time_step=1.0)
+    for record in trace.pop_due(env.time):
+        car = Car.from_record(env.vehicles_index, record)
+    # 回放到达日志
+    write_workload('workload.npy', records)
+    env = ParkEnv(park_size=(500, 500), n_robots=40, n_vehicles=100, n_batteries=24, time_step=1.0, generate_vehicles_probability=0, workload='workload.npy')
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+ARRIVAL_DTYPE = np.dtype([
+    ('time', 'f8'),            # 到达时刻（秒）
+    ('departure_time', 'i8'),  # 离开倒计时（秒）
+    ('x', 'i8'), ('y', 'i8'),  # 停车位置
+    ('voltage', 'i8'),
+    ('capacity', 'f8'),
+    ('soc', 'f8'),
+    ('required_soc', 'f8'),
+])
+
+# 浮点时钟逐步累加会有微小误差，判断到期时允许的相对误差
+_TIME_TOLERANCE = 1e-9
+
+
+def make_rng(seed=None):
+    """
+    创建环境自带的随机数生成器
+    seed: int、SeedSequence 或 Generator；None 时从全局 np.random 派生种子
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 31 - 1)
+    return np.random.default_rng(seed)
+
+
+def sample_vehicles(rng, park_size, n):
+    """
+    向量化抽取 n 辆车的参数，分布与 Car 的随机生成一致
+    return: ARRIVAL_DTYPE 结构数组（time 字段为 0）
+    """
+    records = np.zeros(n, dtype=ARRIVAL_DTYPE)
+    records['departure_time'] = np.clip(rng.normal(60, 10, n), 40, 100).astype(int) * 60  # 离开时间 40~100min
+    records['x'] = rng.integers(0, park_size[0] + 1, n)
+    records['y'] = rng.integers(0, park_size[1] + 1, n)
+    records['voltage'] = rng.choice([400, 800], n)
+    records['capacity'] = np.clip(rng.normal(90, 10, n), 65, 115)
+    records['soc'] = np.clip(rng.normal(15, 10, n), 0, 64)
+    records['required_soc'] = np.clip(rng.normal(80, 10, n), 65, 100)
+    return records
+
+
+class ArrivalTrace:
+    """
+    预生成的车辆到达序列
+    rng: np.random.Generator
+    probability: 每个时间步的到达概率（已乘以步长）
+    time_step: 时间步长（秒），第 k 步的到达时刻为 k * time_step
+    block_steps: 每次生成的时间步数
+    start_time: 序列的起始时刻（秒），只生成此后的到达
+    """
+    def __init__(self, rng, park_size, probability, time_step, block_steps=28800, start_time=0):
+        self.rng = rng
+        self.park_size = park_size
+        self.probability = probability
+        self.time_step = time_step
+        self.block_steps = block_steps
+        self._records = np.zeros(0, dtype=ARRIVAL_DTYPE)
+        self._cursor = 0
+        self._generated_steps = int(round(start_time / time_step))
+
+    def _extend(self):
+        """再生成一块时间步的到达记录"""
+        steps = np.flatnonzero(self.rng.random(self.block_steps) < self.probability) + self._generated_steps + 1
+        records = sample_vehicles(self.rng, self.park_size, len(steps))
+        records['time'] = steps * self.time_step
+        self._records = np.concatenate([self._records[self._cursor:], records])
+        self._cursor = 0
+        self._generated_steps += self.block_steps
+
+    def _ensure(self, time):
+        """保证已生成的序列覆盖到 time，且至少还有一条未取出的记录"""
+        if self.probability <= 0:
+            return
+        while self._generated_steps * self.time_step < time or self._cursor >= len(self._records):
+            self._extend()
+
+    def peek_time(self):
+        """
+        下一次到达的时刻（秒），不会到达时返回 inf
+        """
+        self._ensure(0)
+        if self._cursor >= len(self._records):
+            return float('inf')
+        return float(self._records['time'][self._cursor])
+
+    def pop_due(self, time):
+        """
+        取出到达时刻不晚于 time 的全部记录
+        return: ARRIVAL_DTYPE 结构数组，按到达时刻排序
+        """
+        self._ensure(time)
+        limit = time + _TIME_TOLERANCE * max(1.0, abs(time))
+        end = self._cursor + int(np.searchsorted(self._records['time'][self._cursor:], limit, side='right'))
+        due = self._records[self._cursor:end]
+        self._cursor = end
+        return due
+
+
+def make_arrivals(rng, park_size, probability, time_step, workload=None):
+    """
+    环境使用的到达来源：给出 workload 时回放到达记录文件，否则按概率预生成到达序列
+    workload: None、.npy 文件路径或 WorkloadTrace 对象
+    """
+    if workload is None:
+        return ArrivalTrace(rng, park_size, probability, time_step)
+    if isinstance(workload, WorkloadTrace):
+        return workload
+    return WorkloadTrace(workload)
+
+
+def write_workload(path, records):
+    """
+    把到达记录写成 .npy 文件，供 WorkloadTrace 回放
+    records: 含 ARRIVAL_DTYPE 全部字段的结构数组，time 为相对仿真开始的到达时刻（秒）
+    """
+    records = np.asarray(records)
+    missing = set(ARRIVAL_DTYPE.names) - set(records.dtype.names or ())
+    if missing:
+        raise ValueError(f"到达记录缺少字段: {sorted(missing)}")
+    workload = np.zeros(len(records), dtype=ARRIVAL_DTYPE)
+    for name in ARRIVAL_DTYPE.names:
+        workload[name] = records[name]
+    workload = workload[np.argsort(workload['time'], kind='stable')]
+    np.save(path, workload)
+
+
+class WorkloadTrace:
+    """
+    以内存映射方式回放外部到达记录文件，接口与 ArrivalTrace 相同
+    path: write_workload 写出的 .npy 文件（按 time 升序，字段至少包含 ARRIVAL_DTYPE）
+    time_origin: 文件中对应仿真 0 时刻的时间戳，记录的到达时刻为 time - time_origin
+    chunk_size: 每次从文件拷入内存的记录条数
+    """
+    def __init__(self, path, time_origin=0, chunk_size=4096):
+        self.path = path
+        self.time_origin = time_origin
+        self.chunk_size = chunk_size
+        self._cursor = 0  # 下一条未取出记录在文件中的位置
+        self._open()
+
+    def _open(self):
+        self._file = np.load(self.path, mmap_mode='r')
+        missing = set(ARRIVAL_DTYPE.names) - set(self._file.dtype.names or ())
+        if missing:
+            raise ValueError(f"{self.path} 缺少字段: {sorted(missing)}")
+        self._chunk = np.zeros(0, dtype=ARRIVAL_DTYPE)
+        self._chunk_start = self._cursor
+
+    def __getstate__(self):
+        # 内存映射不随对象序列化，只保存路径与读取位置
+        return {'path': self.path, 'time_origin': self.time_origin, 'chunk_size': self.chunk_size, '_cursor': self._cursor}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self._file)
+
+    def _load_chunk(self):
+        """把从当前位置开始的一块记录拷入内存"""
+        end = min(len(self._file), self._cursor + self.chunk_size)
+        chunk = np.zeros(end - self._cursor, dtype=ARRIVAL_DTYPE)
+        window = self._file[self._cursor:end]
+        for name in ARRIVAL_DTYPE.names:
+            chunk[name] = window[name]
+        chunk['time'] -= self.time_origin
+        self._chunk = chunk
+        self._chunk_start = self._cursor
+
+    def _pending(self):
+        """内存中尚未取出的记录，块已取完时读取下一块"""
+        offset = self._cursor - self._chunk_start
+        if offset >= len(self._chunk) and self._cursor < len(self._file):
+            self._load_chunk()
+            offset = 0
+        return self._chunk[offset:]
+
+    def peek_time(self):
+        """
+        下一次到达的时刻（秒），记录已全部回放时返回 inf
+        """
+        pending = self._pending()
+        if not len(pending):
+            return float('inf')
+        return float(pending['time'][0])
+
+    def pop_due(self, time):
+        """
+        取出到达时刻不晚于 time 的全部记录，可能跨越多个块
+        return: ARRIVAL_DTYPE 结构数组，按到达时刻排序
+        """
+        limit = time + _TIME_TOLERANCE * max(1.0, abs(time))
+        parts = []
+        while True:
+            pending = self._pending()
+            count = int(np.searchsorted(pending['time'], limit, side='right'))
+            if count:
+                parts.append(pending[:count])
+                self._cursor += count
+            if count < len(pending) or not len(pending):
+                break
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=ARRIVAL_DTYPE)
@@ -1,9 +1,16 @@
-import random
+import heapq
+import itertools
+import math
+import pickle
 import numpy as np
 from models.car import Car
+from models.clock import SimClock
 from models.robot import Robot
 from models.battery import Battery
 from models.battery_station import BatteryStation
+from modules.vehicle_registry import VehicleRegistry, VEHICLE_STATES
+from modules.spatial_index import SpatialIndex
+from modules.arrivals import ArrivalTrace, WorkloadTrace, make_arrivals, make_rng
 
 """
 园区充电调度环境模块 (ParkEnv Module)
@@ -12,44 +19,115 @@ from models.battery_station import BatteryStation
 
 主要功能：
 - 初始化园区环境，包括机器人、电池站、车辆等对象的创建与管理
-- 支持车辆的随机生成与状态转移（待充电、充电中、完成、失败等）
+- 支持车辆的随机生成与状态转移（待充电、充电中、完成、失败等），车辆登记表以 O(1) 完成状态转移
+- 车辆、机器人与环境共享 SimClock，机器人行驶按出发时算出的行程解析推进，离开截止时刻保存在小根堆中，每步只处理到期的车辆和机器人正在服务的车辆
+- 每个环境自带按种子初始化的 np.random.Generator，车辆到达序列按块预先生成，相同种子下不同策略面对相同的车辆
+- 回放模式：传入 workload 到达记录文件（内存映射、惰性读取）代替按概率生成车辆
 - 管理机器人与车辆的任务分配、状态更新与交互
+- spatial：待充电车辆与空闲机器人的网格空间索引，随车辆到达、离开增量维护，供调度策略做近邻查询
+- dispatch_dirty：调度脏标记，车辆进入待充电桶或机器人变为空闲时置位，调度策略据此跳过无事可做的时间步
 - 电池站的充电与换电流程模拟
 - 提供环境状态的查询接口，便于与调度策略、强化学习等模块集成
+- 事件驱动模式：以优先队列维护下一事件（车辆到达/离开、机器人到达目标、充电完成、电量阈值、换电完成），时钟直接跳到下一事件
+- 运行记录：attach_recorder() 挂接 SimulationRecorder，每步结束时把状态写入分块二进制日志，可离线回放
+- 快照与恢复：snapshot() 把机器人、车辆、电池站电池和车辆到达序列打包为紧凑的字节串，restore() 据此快速重建环境，可跨进程传递
 
 设计说明：
 本模块采用面向对象设计，所有实体对象（机器人、车辆、电池站）均为独立类，环境负责统一调度和状态管理。支持灵活扩展不同规模和复杂度的仿真场景，便于与可视化、策略、智能体等模块协同工作。
+调度策略每次运行后，空闲机器人与待充电车辆至少有一方为空，只有车辆进入待充电桶（新到达、机器人中途回站）
+或机器人变为空闲时才可能产生新的分配；dispatch_dirty 由登记表回调和机器人推进时的状态比较置位，由调度策略清除。
+车辆的状态只会因三种原因改变：离开截止时刻到达、机器人到达/放电/回库、调度策略分配任务（由策略自行转移）。
+因此每步只需检查截止时刻堆中到期的车辆、本步机器人的目标车辆和新到达的车辆，不再逐车调用 Car.update；
+多辆车同一步转移时先处理原待充电桶、再处理原充电桶，各桶内按原有顺序，与逐车遍历的结果一致。
 
 用法示例：
-    env = ParkEnv(park_size=(100, 100), n_robots=4, n_vehicles=10, n_batteries=3, time_step=1.0, generate_vehicles_probability=0.01)
+    env = ParkEnv(park_size=(100, 100), n_robots=4, n_vehicles=10, n_batteries=3, time_step=1.0, generate_vehicles_probability=0.01, seed=0)
     env.update(time_step=1.0)
     status = env.get_status()
+    # 事件驱动模式
+    env.advance_to_next_event(until=28800)
+    # 快照与恢复
+    buffer = env.snapshot()
+    env.restore(buffer)
+    env_copy = ParkEnv.from_snapshot(buffer)
 
 创建/维护者: 姚炜博
 最后修改: 2025-05-23
 版本: 1.0.0
 """
 
+# 事件驱动模式下非零事件间隔的下限（秒），避免浮点残差导致时钟无法前进
+EVENT_MIN_STEP = 1e-6
+
+# 快照中的结构数组格式，字段顺序即 restore 时的解包顺序
+ROBOT_STATES = ('available', 'gocar', 'discharging', 'gohome', 'needswap', 'swapping')
+_BATTERY_FIELDS = [('soc', 'f8'), ('capacity', 'f8'), ('voltage', 'i8'), ('full', '?')]
+_ROBOT_DTYPE = np.dtype([
+    ('id', 'i8'), ('x', 'f8'), ('y', 'f8'), ('home_x', 'f8'), ('home_y', 'f8'), ('speed', 'f8'),
+    ('swap_time', 'f8'), ('swap_timer', 'f8'), ('min_soc', 'f8'), ('state', 'i1'),
+    ('target', 'i8'),  # 目标车辆编号，0 表示无目标
+    ('has_point', '?'), ('point_x', 'f8'), ('point_y', 'f8'),
+] + _BATTERY_FIELDS)
+_CAR_DTYPE = np.dtype([
+    ('id', 'i8'), ('x', 'f8'), ('y', 'f8'), ('arrival_time', 'f8'), ('deadline', 'f8'),
+    ('departed_at', 'f8'),  # 离场时刻，NaN 表示仍在场
+    ('waited', 'f8'), ('wait_since', 'f8'),
+    ('state', 'i1'), ('bucket', 'i1'), ('required_soc', 'f8'), ('arrival_soc', 'f8'),
+    ('counted', 'i1'),  # Q-learning 奖励统计标记
+] + _BATTERY_FIELDS)
+_STATION_DTYPE = np.dtype(_BATTERY_FIELDS)
+
+
+def _battery_record(battery):
+    return (battery.soc, battery.capacity, battery.voltage, battery.state == 'full')
+
+
+def _battery_from_record(soc, capacity, voltage, full):
+    return Battery(capacity=capacity, soc=soc, voltage=voltage, state='full' if full else 'nonfull')
+
+
 class ParkEnv:
     """
     园区自动充电机器人调度环境
     """
-    def __init__(self, park_size, n_robots, n_vehicles, n_batteries, time_step, generate_vehicles_probability):
+    def __init__(self, park_size, n_robots, n_vehicles, n_batteries, time_step, generate_vehicles_probability, seed=None, workload=None):
+        """
+        seed: 环境随机数种子；None 时从全局 np.random 派生
+        workload: 到达记录文件路径或 WorkloadTrace；给出时回放其中的车辆到达，不再按 generate_vehicles_probability 生成
+        """
         self.park_size = park_size  # 场地大小
         self.n_robots = n_robots  # 最大机器人数量
         self.n_batteries = n_batteries
         self.max_vehicles = n_vehicles # 最大同时在场车辆
         self.n_vehicles = 0 # 在场车辆计数器
         self.generate_vehicles_probability = generate_vehicles_probability * time_step # 车辆生成概率
+        self.rng = make_rng(seed)  # 环境自带的随机数生成器
+        self.arrivals = make_arrivals(self.rng, park_size, self.generate_vehicles_probability, time_step, workload)  # 车辆到达序列
         # 初始化车辆
         self.vehicles_index = 1
-        self.needcharge_vehicles = []
-        self.charging_vehicles = []
-        self.completed_vehicles = []
-        self.failed_vehicles = []
+        self.vehicles = VehicleRegistry()  # 按车辆编号索引，四个列表属性指向其中的状态桶
+        self.needcharge_vehicles = self.vehicles.needcharge
+        self.charging_vehicles = self.vehicles.charging
+        self.completed_vehicles = self.vehicles.completed
+        self.failed_vehicles = self.vehicles.failed
+        self.spatial = SpatialIndex(park_size, self.vehicles)  # 待充电车辆与空闲机器人的空间索引
+        self.dispatch_dirty = True  # 上次调度后是否有车辆进入待充电桶或机器人变为空闲
+        self.vehicles.listeners.append(self._on_vehicle)
         self.robot_to_car = {}  # 机器人与车辆的映射关系
+        self.clock = SimClock()  # 与车辆共享的仿真时钟
         self.time = 0  # 当前仿真时间（秒）
+        self._deadlines = []  # (离开截止时刻, 车辆编号, 车辆) 的小根堆
+        self._pending_cars = []  # 新到达、下一步需要检查状态的车辆
         self.time_step = time_step  # 时间步长（秒）
+        self.recorder = None  # 运行记录器，见 attach_recorder
+        self.generation = 0  # restore 的次数；restore 重建车辆登记表，登记表版本号从 0 重新计数
+
+        # 事件驱动模式：(时间, 序号, 类型, 对象, 版本) 的小根堆，首次调用 advance_to_next_event 时初始化
+        self.events = []
+        self._events_ready = False
+        self._event_seq = itertools.count()
+        self._robot_event_versions = {}  # 机器人编号 -> 最新事件版本，旧版本事件出堆时丢弃
+        self._robot_event_keys = {}  # 机器人编号 -> 安排事件时的 (状态, 目标, 目标状态)
 
         # 初始化电池站
         self.battery_station = BatteryStation([
@@ -67,20 +145,41 @@ class ParkEnv:
                 home_x=park_size[0] / 2,  # 假设机器人从园区中心出发
                 home_y=park_size[1] / 2,
                 speed=10,
-                swap_time=120
+                swap_time=120,
+                clock=self.clock
             ) for i in range(n_robots)
         ]
 
 
     def random_generate_vehicles(self, probability=0.001):
-        if random.random() < probability and self.n_vehicles < self.max_vehicles:
-            # 离开时间（45~120min，高斯分布）
-            car = Car(id=self.vehicles_index, park_size=self.park_size)
-            self.needcharge_vehicles.append(car)
-            self.vehicles_index += 1
-            self.n_vehicles += 1
-        else:
-            pass
+        """
+        按到达序列生成到期的车辆，园区已满时该次到达作废
+        probability: 保留以兼容旧调用，到达概率已在构造到达序列时确定
+        """
+        for record in self.arrivals.pop_due(self.time):
+            if self.n_vehicles < self.max_vehicles:
+                self._spawn_vehicle(record)
+
+    @property
+    def time(self):
+        return self.clock.time
+
+    @time.setter
+    def time(self, value):
+        self.clock.reset(value)
+
+    def _on_vehicle(self, car, old_state, new_state):
+        if new_state == 'needcharge':
+            self.dispatch_dirty = True
+
+    def _spawn_vehicle(self, record):
+        car = Car.from_record(self.vehicles_index, record, clock=self.clock)
+        self.vehicles.add(car)
+        heapq.heappush(self._deadlines, (car.deadline, car.id, car))
+        self._pending_cars.append(car)
+        self.vehicles_index += 1
+        self.n_vehicles += 1
+        return car
 
 
     def update(self, time_step):
@@ -88,45 +187,316 @@ class ParkEnv:
         主程序逻辑：
 
         """
-        self.time += self.time_step
+        self.clock.advance(self.time_step)
         # 随机生成车辆
         self.random_generate_vehicles(self.generate_vehicles_probability)
+        self._step_objects(time_step)
+        self.clock.settle()
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def attach_recorder(self, recorder):
+        """
+        挂接运行记录器，此后每次 update / advance_to_next_event 结束时记录一帧
+        recorder: modules.recorder.SimulationRecorder，结束时调用 recorder.close() 写出剩余数据
+        """
+        self.recorder = recorder
+        recorder.bind(self)
+        return recorder
 
+    def _step_objects(self, time_step):
+        """
+        按步长推进机器人与电池站，并处理本步可能改变状态的车辆
+        time_step: 步长（秒）
+        """
+        # 新到达的车辆、机器人的目标车辆和截止时刻已到的车辆
+        candidates, self._pending_cars = self._pending_cars, []
         # 更新所有机器人
-        for robot in self.robots[:]:
+        for robot in self.robots:
             if robot.state == 'needswap':
                 self.battery_station.robotsqueue.append(robot)
                 robot.set_state('swapping')
+            if robot.target is not None:
+                candidates.append(robot.target)
+            idle = robot.state == 'available'
             robot.update(time_step)
+            if not idle and robot.state == 'available':
+                self.dispatch_dirty = True
+
+        deadlines, now = self._deadlines, self.time
+        limit = now + 1e-9 * max(1.0, abs(now))
+        while deadlines and deadlines[0][0] <= limit:
+            candidates.append(heapq.heappop(deadlines)[2])
+        if candidates:
+            self._settle_vehicles(candidates)
 
-        for car in self.needcharge_vehicles[:]:
-            car.update(self.time_step)
-            if car.state == 'charging':
-                self.charging_vehicles.append(car)
-                self.needcharge_vehicles.remove(car)
-            elif car.state == 'failed':
-                self.failed_vehicles.append(car)
-                self.needcharge_vehicles.remove(car)
-                self.n_vehicles -= 1
-        
-        for car in self.charging_vehicles[:]:
-            car.update(self.time_step)
-            if car.state == 'completed':
-                self.completed_vehicles.append(car)
-                self.charging_vehicles.remove(car)
-                self.n_vehicles -= 1
-            elif car.state == 'failed':
-                self.failed_vehicles.append(car)
-                self.charging_vehicles.remove(car)
-                self.n_vehicles -= 1
-            elif car.state == 'needcharge':
-                self.needcharge_vehicles.append(car)
-                self.charging_vehicles.remove(car)
-            
         # 电池站为所有电池充电
         self.battery_station.update(time_step)
+
+    def _settle_vehicles(self, cars):
+        """
+        检查候选车辆的截止时刻与电量，状态变化的车辆在登记表的状态桶间转移
+        先转移原待充电桶中的车辆、再转移原充电桶中的车辆，桶内保持原有顺序
+        """
+        registry = self.vehicles
+        moved, seen = [], set()
+        for car in cars:
+            if car.id in seen:
+                continue
+            seen.add(car.id)
+            bucket = registry.state_of(car)
+            if bucket not in ('needcharge', 'charging'):
+                continue
+            if car.refresh() != bucket:
+                moved.append((bucket != 'needcharge', registry.buckets[bucket].position(car), car))
+        for _, _, car in sorted(moved, key=lambda item: item[:2]):
+            registry.transition(car, car.state)
+            if car.state in ('completed', 'failed'):
+                self.n_vehicles -= 1
+
+    def advance_to_next_event(self, max_step=None, until=None):
+        """
+        事件驱动推进：时钟直接跳到下一个事件，并以该时长推进所有对象
+        调度策略只需在每次调用前（决策点）执行，空闲时段不再逐步迭代
+        max_step: 单次推进的最大时长（秒），None 表示不限制
+        until: 仿真结束时间（秒），推进不会越过该时间
+        return: float, 本次推进的时长（秒），可能为 0（同一时刻的连锁状态变化）
+        """
+        if not self._events_ready:
+            self._init_events()
+        # 决策点之后机器人可能被分配了新任务
+        self._reschedule_changed_robots()
+
+        next_time = self.next_event_time()
+        if max_step is not None:
+            next_time = min(next_time, self.time + max_step)
+        if until is not None:
+            next_time = min(next_time, until)
+        if math.isinf(next_time):
+            raise RuntimeError("没有待处理的事件，请设置 max_step 或 until")
+        time_step = max(0, next_time - self.time)
+        self.clock.advance_to(max(self.time, next_time))
+
+        arrivals = None
+        due_cars, due_robots = [], []
+        while self.events and self.events[0][0] <= self.time:
+            _, _, kind, obj, version = heapq.heappop(self.events)
+            if kind == 'arrival':
+                arrivals = self.arrivals.pop_due(self.time)
+            elif kind == 'departure':
+                due_cars.append(obj)
+            elif version == self._robot_event_versions[obj.id]:
+                due_robots.append(obj)
+
+        self._step_objects(time_step)
+        self.clock.settle()
+
+        # 到达的车辆在推进之后加入，离开倒计时从到达时刻开始
+        if arrivals is not None:
+            for record in arrivals:
+                if self.n_vehicles < self.max_vehicles:
+                    self._schedule_departure(self._spawn_vehicle(record))
+            self._schedule_arrival()
+        for car in due_cars:
+            if car.state in ('needcharge', 'charging'):
+                self._schedule_departure(car)
+        for robot in due_robots:
+            self._schedule_robot(robot)
+        self._reschedule_changed_robots()
+        if self.recorder is not None:
+            self.recorder.record(self)
+        return time_step
+
+    def next_event_time(self):
+        """
+        返回事件队列中最早的有效事件时间（秒），无事件时返回 inf
+        """
+        while self.events:
+            _, _, kind, obj, version = self.events[0]
+            if kind == 'robot' and version != self._robot_event_versions[obj.id]:
+                heapq.heappop(self.events)
+            elif kind == 'departure' and obj.state not in ('needcharge', 'charging'):
+                heapq.heappop(self.events)
+            else:
+                return self.events[0][0]
+        return math.inf
+
+    def _init_events(self):
+        self.events = []
+        self._events_ready = True
+        self._schedule_arrival()
+        for car in self.needcharge_vehicles + self.charging_vehicles:
+            self._schedule_departure(car)
+        for robot in self.robots:
+            self._schedule_robot(robot)
+
+    def _push_event(self, delay, kind, obj=None, version=0):
+        """在 delay 秒后安排事件，非零间隔不小于 EVENT_MIN_STEP"""
+        if delay > 0:
+            delay = max(delay, EVENT_MIN_STEP)
+        heapq.heappush(self.events, (self.time + delay, next(self._event_seq), kind, obj, version))
+
+    def _schedule_arrival(self):
+        """按到达序列安排下一次车辆到达"""
+        arrival_time = self.arrivals.peek_time()
+        if math.isinf(arrival_time):
+            return
+        self._push_event(max(0, arrival_time - self.time), 'arrival')
+
+    def _schedule_departure(self, car):
+        self._push_event(max(0, car.departure_time), 'departure', car)
+
+    def _robot_event_key(self, robot):
+        target = robot.target
+        return (robot.state, id(target), target.state if target is not None else None)
+
+    def _schedule_robot(self, robot):
+        """为机器人重新安排下一事件，旧事件通过版本号作废"""
+        version = self._robot_event_versions.get(robot.id, 0) + 1
+        self._robot_event_versions[robot.id] = version
+        self._robot_event_keys[robot.id] = self._robot_event_key(robot)
+        delay = robot.next_event_delay()
+        if delay is not None:
+            self._push_event(delay, 'robot', robot, version)
+
+    def _reschedule_changed_robots(self):
+        for robot in self.robots:
+            if self._robot_event_keys.get(robot.id) != self._robot_event_key(robot):
+                self._schedule_robot(robot)
     
 
+    def snapshot(self):
+        """
+        把环境状态打包为字节串：机器人、车辆、电池站电池保存为 NumPy 结构数组，
+        并附带环境的到达序列（含环境自带的随机数生成器）；random、np.random 的全局随机数状态不属于环境，不保存。
+        事件驱动模式的事件队列不保存，恢复后按需重新初始化
+        return: bytes
+        """
+        robot_index = {robot.id: i for i, robot in enumerate(self.robots)}
+        robots = np.array([
+            (r.id, r.x, r.y, r.home_x, r.home_y, r.speed, r.swap_time, r.swap_timer, r.min_soc,
+             ROBOT_STATES.index(r.state), r.target.id if r.target is not None else 0,
+             r.target_point is not None, *(r.target_point or (0, 0)), *_battery_record(r.battery))
+            for r in self.robots
+        ], dtype=_ROBOT_DTYPE)
+        cars = np.array([
+            (car.id, *car.parking_spot, car.arrival_time, car.deadline,
+             math.nan if car.departed_at is None else car.departed_at, car._waited, car._wait_since,
+             VEHICLE_STATES.index(car.state), bucket, car.required_soc, car.arrival_soc,
+             car.counted, *_battery_record(car.battery))
+            for bucket, state in enumerate(VEHICLE_STATES) for car in self.vehicles.buckets[state]
+        ], dtype=_CAR_DTYPE)
+        station = np.array([_battery_record(b) for b in self.battery_station.batteries], dtype=_STATION_DTYPE)
+        data = {
+            'config': (self.park_size, self.n_robots, self.n_batteries, self.max_vehicles,
+                       self.generate_vehicles_probability, self.time_step),
+            'counters': (self.time, self.n_vehicles, self.vehicles_index),
+            'robots': robots,
+            'cars': cars,
+            'station': station,
+            'station_location': self.battery_station.location,
+            'queue': np.array([robot_index[r.id] for r in self.battery_station.robotsqueue], dtype=np.int64),
+            'arrivals': self.arrivals,
+        }
+        return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, buffer, restore_rng=True):
+        """
+        从 snapshot() 的字节串原地重建环境
+        buffer: bytes
+        restore_rng: 是否恢复快照中的到达序列（含环境自带的随机数生成器），不影响 random、np.random 的全局状态；
+                     为 False 时用当前环境的随机数生成器
+                     （新建的环境则从全局 np.random 派生）从快照时刻起重新生成到达序列，
+                     回放到达记录文件的环境总是从快照时的读取位置继续
+        """
+        data = pickle.loads(buffer)
+        self.generation = getattr(self, 'generation', 0) + 1
+        (self.park_size, self.n_robots, self.n_batteries, self.max_vehicles,
+         self.generate_vehicles_probability, self.time_step) = data['config']
+        self.clock = SimClock()
+        self.time, self.n_vehicles, self.vehicles_index = data['counters']
+        self.robot_to_car = {}
+
+        self.vehicles = VehicleRegistry()
+        cars = {}
+        self._deadlines = []
+        self._pending_cars = []
+        for (car_id, x, y, arrival_time, deadline, departed_at, waited, wait_since, state, bucket, required_soc,
+             arrival_soc, counted, *battery) in data['cars'].tolist():
+            car = Car.__new__(Car)  # 跳过 __init__ 中的随机生成
+            car.id = car_id
+            car.parking_spot = (x, y)
+            car.battery = _battery_from_record(*battery)
+            car.required_soc = required_soc
+            car.arrival_soc = arrival_soc
+            car.counted = counted
+            car.clock = self.clock
+            car.arrival_time = arrival_time
+            car.deadline = deadline
+            car.departed_at = None if math.isnan(departed_at) else departed_at
+            car._state = VEHICLE_STATES[state]
+            car._waited = waited
+            car._wait_since = wait_since
+            car._own_clock = False
+            self.vehicles.add(car, VEHICLE_STATES[bucket])
+            if VEHICLE_STATES[bucket] in ('needcharge', 'charging'):
+                self._deadlines.append((deadline, car_id, car))
+            cars[car_id] = car
+        heapq.heapify(self._deadlines)
+        self.needcharge_vehicles = self.vehicles.needcharge
+        self.charging_vehicles = self.vehicles.charging
+        self.completed_vehicles = self.vehicles.completed
+        self.failed_vehicles = self.vehicles.failed
+        self.spatial = SpatialIndex(self.park_size, self.vehicles)
+        self.dispatch_dirty = True
+        self.vehicles.listeners.append(self._on_vehicle)
+        self.recorder = getattr(self, 'recorder', None)
+        if self.recorder is not None:
+            self.recorder.subscribe(self.vehicles)
+
+        self.robots = []
+        for (robot_id, x, y, home_x, home_y, speed, swap_time, swap_timer, min_soc, state, target,
+             has_point, point_x, point_y, *battery) in data['robots'].tolist():
+            robot = Robot(id=robot_id, home_x=home_x, home_y=home_y, speed=speed, swap_time=swap_time,
+                          target=cars[target] if target else None, clock=self.clock)
+            robot.x, robot.y = x, y
+            robot.swap_timer = swap_timer
+            robot.min_soc = min_soc
+            robot.state = ROBOT_STATES[state]
+            robot.target_point = (point_x, point_y) if has_point else None
+            robot.battery = _battery_from_record(*battery)
+            self.robots.append(robot)
+
+        self.battery_station = BatteryStation(
+            [_battery_from_record(*battery) for battery in data['station'].tolist()],
+            location=data['station_location'],
+            robotsqueue=[self.robots[i] for i in data['queue'].tolist()])
+
+        self.events = []
+        self._events_ready = False
+        self._event_seq = itertools.count()
+        self._robot_event_versions = {}
+        self._robot_event_keys = {}
+
+        rng = getattr(self, 'rng', None)
+        if restore_rng or isinstance(data['arrivals'], WorkloadTrace):
+            # 回放的到达记录与随机数无关，总是从快照位置继续
+            self.arrivals = data['arrivals']
+        else:
+            rng = rng or make_rng()
+            self.arrivals = ArrivalTrace(rng, self.park_size, self.generate_vehicles_probability, self.time_step,
+                                         start_time=self.time)
+        self.rng = getattr(self.arrivals, 'rng', None) or rng or make_rng()
+
+    @classmethod
+    def from_snapshot(cls, buffer, restore_rng=True):
+        """
+        由 snapshot() 的字节串创建新环境，可在其他进程中使用
+        """
+        env = cls.__new__(cls)
+        env.restore(buffer, restore_rng=restore_rng)
+        return env
+
     def get_status(self):
         """
         返回当前环境状态
@@ -0,0 +1,161 @@
+import multiprocessing
+import random
+import numpy as np
+from modules.qlearning_agent import QLearningAgent
+
+"""
+并行 Q 学习训练模块 (Parallel Q-learning Trainer Module)
+========================================================
+本模块用进程池并行运行 Q 学习的训练回合，并定期把各进程的 Q 表合并到共享内存中的主 Q 表。
+
+主要功能：
+- ParallelQTrainer：包装一个 QLearningAgent，训练结果写回 agent.q_table
+- 主 Q 表与各进程的 Q 表槽位放在 multiprocessing.RawArray 共享内存中，进程间不传递 Q 表副本
+- 每轮为每个进程分配 sync_interval 个连续回合；一轮结束后按“访问加权”合并各进程对主表的更新
+- 探索率按全局回合序号计算，与串行训练的衰减曲线一致，不随进程数变化
+- 每段回合使用 (seed, 起始回合序号) 派生的随机数种子，进程数和 sync_interval 相同时结果可复现
+
+设计说明：
+每轮开始时各进程从主表复制一份本地 Q 表，独立运行若干回合（即 QLearningAgent.train，逐步 TD 更新），
+结束后把本地表写入自己的共享槽位。主进程计算每个进程相对主表的增量，对每个 (状态, 动作) 格子
+取“改动过该格子的进程”的增量平均值加到主表上：只有一个进程访问过的格子完整保留其更新，
+多个进程都访问过的格子取平均，避免简单平均把稀疏访问的格子按进程数稀释。
+sync_interval 越大，进程间通信与合并越少，但各进程基于越旧的主表学习。
+环境通过 agent 的初始快照传给子进程（支持 snapshot() 的环境传字节串，否则传环境对象本身）。
+
+用法示例：
+    agent = QLearningAgent(env)
+    trainer = ParallelQTrainer(agent, n_workers=8, sync_interval=2, seed=0)
+    trainer.train(choice=1, episodes=100, max_steps=100000)
+    agent.save_q_table('q_table/large_most_q_table.qtab', map_size='large')
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+# 子进程的全局状态，由 _init_worker 在进程池启动时设置
+_worker = {}
+
+
+def _shared_view(raw, shape):
+    return np.frombuffer(raw, dtype=np.float64).reshape(shape)
+
+
+def _init_worker(static_env, env_class, agent_kwargs, master, slots, shape):
+    if isinstance(static_env, bytes):
+        env = env_class.from_snapshot(static_env, restore_rng=False)
+    else:
+        env = static_env
+    _worker['agent'] = QLearningAgent(env, **agent_kwargs)
+    _worker['master'] = _shared_view(master, shape)
+    _worker['slots'] = _shared_view(slots, (-1,) + shape)
+
+
+def _run_episodes(task):
+    """
+    子进程：从主表复制 Q 表，运行一段回合后写入自己的槽位
+    return: (槽位, 最后一回合的完成数, 失败数, 生成数)
+    """
+    slot, start, n_episodes, exploration_rate, choice, max_steps, seed = task
+    agent = _worker['agent']
+    sequence = np.random.SeedSequence([seed, start])
+    random.seed(int(sequence.generate_state(1)[0]))
+    np.random.seed(sequence.generate_state(1, dtype=np.uint32)[0])
+    agent.q_table = np.array(_worker['master'])
+    agent.exploration_rate = exploration_rate
+    agent.train(choice, episodes=n_episodes, max_steps=max_steps, log_interval=0)
+    _worker['slots'][slot] = agent.q_table
+    env = agent.env
+    return slot, len(env.completed_vehicles), len(env.failed_vehicles), env.vehicles_index
+
+
+class ParallelQTrainer:
+    """
+    多进程 Q 学习训练器
+    agent: QLearningAgent，训练从其当前 Q 表与探索率开始，结束后写回
+    n_workers: 进程数，默认 CPU 核数减一
+    sync_interval: 每个进程每轮运行的回合数，每轮结束合并一次
+    seed: 随机数种子，None 时随机
+    """
+    def __init__(self, agent, n_workers=None, sync_interval=1, seed=None):
+        if agent.sparse is not None:
+            # 稀疏 Q 表的行号由各进程各自分配，同一行在不同进程中对应不同状态，不能逐格合并
+            raise ValueError("ParallelQTrainer 不支持稀疏 Q 表（sparse_memory），请使用稠密 Q 表")
+        self.agent = agent
+        self.n_workers = n_workers or max(1, multiprocessing.cpu_count() - 1)
+        self.sync_interval = max(1, int(sync_interval))
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        self.rounds = 0  # 已完成的合并轮数
+
+    def exploration_at(self, episode, start_rate):
+        """第 episode 个回合（从 0 计）开始时的探索率，与串行训练逐回合衰减的结果相同"""
+        agent = self.agent
+        rate = start_rate
+        for _ in range(episode):
+            rate = max(agent.exploration_min, rate * agent.exploration_decay)
+        return rate
+
+    def _agent_kwargs(self):
+        agent = self.agent
+        return {
+            'learning_rate': agent.learning_rate,
+            'discount_factor': agent.discount_factor,
+            'exploration_decay': agent.exploration_decay,
+            'exploration_min': agent.exploration_min,
+            'replay_capacity': agent.replay.capacity if agent.replay is not None else None,
+            'replay_batch_size': agent.replay_batch_size,
+            'replay_interval': agent.replay_interval,
+        }
+
+    def train(self, choice, episodes=1000, max_steps=10000, log_interval=1):
+        """
+        并行训练
+        choice: 奖励函数，1 为 most，其余为 nearest（同 QLearningAgent.train）
+        episodes: 总回合数
+        log_interval: 每隔多少轮打印一次进度，0 表示不打印
+        return: 训练后的 Q 表（agent.q_table）
+        """
+        agent = self.agent
+        shape = agent.q_table.shape
+        size = shape[0] * shape[1]
+        master_raw = multiprocessing.RawArray('d', size)
+        slots_raw = multiprocessing.RawArray('d', size * self.n_workers)
+        master = _shared_view(master_raw, shape)
+        slots = _shared_view(slots_raw, (self.n_workers,) + shape)
+        master[:] = agent.q_table
+        start_rate = agent.exploration_rate
+
+        initargs = (agent.static_env, type(agent.env), self._agent_kwargs(), master_raw, slots_raw, shape)
+        with multiprocessing.Pool(processes=self.n_workers, initializer=_init_worker, initargs=initargs) as pool:
+            episode = 0
+            while episode < episodes:
+                tasks = []
+                for slot in range(self.n_workers):
+                    if episode >= episodes:
+                        break
+                    n_episodes = min(self.sync_interval, episodes - episode)
+                    tasks.append((slot, episode, n_episodes, self.exploration_at(episode, start_rate),
+                                  choice, max_steps, self.seed))
+                    episode += n_episodes
+                results = pool.map(_run_episodes, tasks)
+                self._merge(master, slots[:len(tasks)])
+                self.rounds += 1
+                if log_interval and self.rounds % log_interval == 0:
+                    completed = sum(r[1] for r in results)
+                    failed = sum(r[2] for r in results)
+                    generated = sum(r[3] for r in results)
+                    print(f"Round {self.rounds}, Episodes {episode}/{episodes}, "
+                          f"Exploration Rate: {self.exploration_at(episode, start_rate):.3f}, "
+                          f"Completed: {completed}, Failed: {failed}, Total Generated: {generated}")
+
+        agent.q_table = np.array(master)
+        agent.exploration_rate = self.exploration_at(episodes, start_rate)
+        return agent.q_table
+
+    @staticmethod
+    def _merge(master, tables):
+        """把各进程的 Q 表按访问加权合并到主表：每个格子加上改动过它的进程的增量平均值"""
+        deltas = tables - master
+        changed = np.count_nonzero(deltas, axis=0)
+        master += deltas.sum(axis=0) / np.maximum(changed, 1)
@@ -1,14 +1,26 @@
 import numpy as np
 import random
 import copy
+from modules.array_env import C_NEEDCHARGE, C_COMPLETED, R_AVAILABLE
+from modules import qtable_io
+from modules.replay_buffer import ReplayBuffer
+from modules.sparse_qtable import SparseQTable, pack_state
+from modules.vec_env import VecParkEnv
 
 class QLearningAgent:
     """
     强化学习调度助手，适用于园区自动充电机器人调度
+    replay_capacity: 经验回放缓冲区容量；None 时每步直接做一次标量 TD 更新（默认），
+                     给出时转移先写入缓冲区，每 replay_interval 步抽取 replay_batch_size 条做一次批量 TD 更新
+    sparse_memory: 稀疏 Q 表的内存上限（字节）；None 时使用 100 行的稠密 Q 表（默认），
+                   给出时按完整离散状态分配行，超出上限淘汰最久未访问的状态，见 modules/sparse_qtable.py
+    state_bins: 稀疏 Q 表的分桶宽度（机器人平均电量、车辆平均电量、平均电量缺口、平均剩余时间）
     """
-    def __init__(self, env, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0, exploration_decay=0.995, exploration_min=0.01):
+    def __init__(self, env, learning_rate=0.1, discount_factor=0.9, exploration_rate=1.0, exploration_decay=0.995, exploration_min=0.01,
+                 replay_capacity=None, replay_batch_size=32, replay_interval=1, sparse_memory=None, state_bins=(10, 10, 10, 1000)):
         self.env = env
-        self.static_env = copy.deepcopy(env)
+        # 初始环境快照：支持 snapshot() 的环境保存为字节串，否则退回深拷贝
+        self.static_env = env.snapshot() if hasattr(env, 'snapshot') else copy.deepcopy(env)
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
@@ -18,21 +30,70 @@ class QLearningAgent:
         # 状态空间和动作空间大小可根据实际环境调整
         self.state_size = 100  # 可根据状态离散化方式调整
         self.action_size = len(self.env.robots) * self.env.max_vehicles  # 机器人数量 * 最大车辆数
-        self.q_table = np.zeros((self.state_size, self.action_size))
+        self.state_bins = tuple(state_bins)
+        self.sparse = SparseQTable(self.action_size, memory_limit=sparse_memory) if sparse_memory else None
+        if self.sparse is not None:
+            # 稀疏 Q 表的行号即状态下标，q_table 直接引用其 Q 值数组
+            self.state_size = self.sparse.max_states
+            self.q_table = self.sparse.values
+        else:
+            self.q_table = np.zeros((self.state_size, self.action_size))
+        self._feature_cache = None  # (环境, (时间, 环境 generation, 待充电桶版本), 状态特征)
+
+        # 经验回放（可选）
+        self.replay = ReplayBuffer(replay_capacity) if replay_capacity else None
+        self.replay_batch_size = replay_batch_size
+        self.replay_interval = max(1, int(replay_interval))
+        self._replay_steps = 0
+
+    def load_q_table(self, path, mmap=True):
+        """
+        加载 Q 表文件并按环境与 state_size 校验形状，不匹配时抛出 ValueError
+        path: .qtab 文件以只读内存映射打开（mmap=False 时读入可写副本，用于继续训练）；.pkl 文件按旧格式读取
+        稀疏模式下读入 save_q_table 保存的状态键与各行 Q 值
+        """
+        if self.sparse is not None:
+            metadata = qtable_io.read_header(path)['metadata']
+            if 'state_keys' not in metadata:
+                raise ValueError(f"Q表 {path} 不是稀疏 Q 表文件（缺少 state_keys）")
+            rows = qtable_io.load_q_table(path, env=self.env, mmap=False)
+            self.sparse.load_rows(metadata['state_keys'], rows)
+            self.state_bins = tuple(metadata['state_bins'])
+            return self.q_table
+        self.q_table = qtable_io.load_q_table(path, env=self.env, state_size=self.state_size, mmap=mmap)
+        return self.q_table
+
+    def save_q_table(self, path, map_size=None, metadata=None):
+        """
+        把 Q 表保存为 .qtab 文件，训练超参数记入元数据
+        稀疏模式下只保存已使用的行，状态键与分桶宽度记入元数据
+        return: 写出的文件路径
+        """
+        info = {
+            'learning_rate': self.learning_rate,
+            'discount_factor': self.discount_factor,
+            'exploration_rate': self.exploration_rate,
+        }
+        info.update(metadata or {})
+        q_table = self.q_table
+        if self.sparse is not None:
+            q_table = self.q_table[:len(self.sparse)]
+            info['state_keys'] = self.sparse.state_keys().tolist()
+            info['state_bins'] = list(self.state_bins)
+        return qtable_io.save_q_table(path, q_table, map_size=map_size, env=self.env, metadata=info)
 
     def discretize_state(self, state):
-        # 机器人和车辆soc
-        robot_socs = [int(r.battery.soc) for r in self.env.robots]
-        car_socs = [int(c.battery.soc) for c in self.env.needcharge_vehicles]
-        avg_robot_soc = int(np.mean(robot_socs)) if robot_socs else 0
-        avg_car_soc = int(np.mean(car_socs)) if car_socs else 0
-
-        # 车辆所需电量gap和离开时间
-        car_gaps = [int(getattr(c, "battery_gap", 0)) for c in self.env.needcharge_vehicles]
-        car_departures = [int(getattr(c, "departure_time", 0)) for c in self.env.needcharge_vehicles]
-        avg_gap = int(np.mean(car_gaps)) if car_gaps else 0
-        avg_departure = int(np.mean(car_departures)) if car_departures else 0
+        """
+        把环境状态离散化为 Q 表的行号
+        state: 保留以兼容旧调用，特征直接取自 self.env
+        """
+        features = self.state_features()
+        if self.sparse is not None:
+            return self.sparse.row(pack_state(value // width for value, width in zip(features, self.state_bins)))
+        return self._dense_state_index(*features)
 
+    def _dense_state_index(self, avg_robot_soc, avg_car_soc, avg_gap, avg_departure):
+        """稠密 Q 表的状态下标，各特征可以是整数或按园区排列的整数数组"""
         # 分桶，组合为状态索引
         idx = (
             (avg_robot_soc // 10) * 1000 +
@@ -41,6 +102,42 @@ class QLearningAgent:
             (avg_departure // 1000)
         )
         return idx % self.state_size  # 保证不越界
+
+    def state_features(self):
+        """
+        状态特征：机器人平均电量、待充电车辆平均电量、平均电量缺口（kWh）、平均剩余时间（秒）
+        各项先逐个截断为整数再取平均并截断，与逐车构造整数列表的结果相同。
+        同一时刻、待充电车辆不变时直接返回缓存（一次训练步中 choose_action 与 update_q_table 多次离散化同一状态）；
+        env.restore 重建车辆登记表后版本号重新计数，因此键中带上环境的 generation
+        return: tuple[int, int, int, int]
+        """
+        env = self.env
+        bucket = env.needcharge_vehicles
+        version = getattr(bucket, 'version', None)
+        key = (env.time, getattr(env, 'generation', 0), version)
+        cached = self._feature_cache
+        if version is not None and cached is not None and cached[0] is env and cached[1] == key:
+            return cached[2]
+
+        robot_arrays = getattr(env, 'robot_arrays', None)
+        if robot_arrays is not None:
+            # 结构数组后端直接读取数组列
+            cars = env.car_arrays
+            waiting = cars.active & (cars.state == C_NEEDCHARGE)
+            robot_socs = robot_arrays.soc
+            car_socs, car_gaps, car_departures = cars.soc[waiting], cars.battery_gap[waiting], cars.departure_time[waiting]
+        else:
+            robots = env.robots
+            robot_socs = np.fromiter((r.battery.soc for r in robots), dtype=float, count=len(robots))
+            n = len(bucket)
+            car_socs = np.fromiter((c.battery.soc for c in bucket), dtype=float, count=n)
+            car_gaps = np.fromiter((getattr(c, "battery_gap", 0) for c in bucket), dtype=float, count=n)
+            car_departures = np.fromiter((getattr(c, "departure_time", 0) for c in bucket), dtype=float, count=n)
+
+        features = tuple(int(np.trunc(values).mean()) if len(values) else 0
+                         for values in (robot_socs, car_socs, car_gaps, car_departures))
+        self._feature_cache = (env, key, features)
+        return features
     
     def choose_action(self, state):
         state_idx = self.discretize_state(state)
@@ -64,9 +161,24 @@ class QLearningAgent:
 
     def update_q_table(self, state, action, reward, next_state, done):
         state_idx = self.discretize_state(state)
+        state_key = self.sparse.key_of(state_idx) if self.sparse is not None else None
         next_state_idx = self.discretize_state(next_state)
         if action >= self.action_size:
             action = self.action_size - 1  # 防止越界
+        if self.replay is not None:
+            resolve = None
+            if self.sparse is not None:
+                # 稀疏 Q 表的行会被淘汰后复用，缓冲区保存状态键，更新时再查当前行号
+                state_idx, next_state_idx = state_key, self.sparse.key_of(next_state_idx)
+                resolve = self.sparse.lookup
+            self.replay.add(state_idx, action, reward, next_state_idx, done)
+            self._replay_steps += 1
+            if self._replay_steps % self.replay_interval == 0:
+                self.replay.td_update(self.q_table, self.replay_batch_size, self.learning_rate, self.discount_factor,
+                                      resolve=resolve)
+            return
+        if state_key is not None and self.sparse.key_of(state_idx) != state_key:
+            return  # 为下一状态分配行时淘汰了当前状态，该行已属于下一状态
         best_next_action = np.argmax(self.q_table[next_state_idx])
         td_target = reward + self.discount_factor * self.q_table[next_state_idx, best_next_action] * (not done)
         td_error = td_target - self.q_table[state_idx, action]
@@ -86,8 +198,11 @@ class QLearningAgent:
             # 机器人状态会自动变为gocar，car状态会在robot.update中变为charging
 
     def train(self, choice, episodes=1000, max_steps=10000, log_interval=100, debug=False):
+        if not self.q_table.flags.writeable:
+            # 从 .qtab 映射加载的 Q 表是只读的，继续训练时复制一份
+            self.q_table = np.array(self.q_table)
         for ep in range(episodes):
-            self.env = copy.deepcopy(self.static_env)
+            self.env = self._reset_env()
             # 保证每次重置后车辆生成概率仍为1
             state = self.env.get_status()
             total_reward = 0
@@ -137,7 +252,7 @@ class QLearningAgent:
                         print(f"  id={robot.id}, state={getattr(robot, 'state', None)}, soc={getattr(robot.battery, 'soc', None)}")
 
             self.exploration_rate = max(self.exploration_min, self.exploration_rate * self.exploration_decay)
-            if (ep + 1) % log_interval == 0:
+            if log_interval and (ep + 1) % log_interval == 0:
                 completed_num = len(self.env.completed_vehicles)
                 failed_num = len(self.env.failed_vehicles)
                 total_generated = self.env.vehicles_index
@@ -147,6 +262,111 @@ class QLearningAgent:
 
                 print(f"Episode {ep+1} reward stats: mean={np.mean(reward_list):.2f}, std={np.std(reward_list):.2f}, min={np.min(reward_list):.2f}, max={np.max(reward_list):.2f}")
     
+    def train_vec(self, choice, episodes=1000, max_steps=10000, n_envs=16, seed=None, log_interval=1):
+        """
+        用 VecParkEnv 批量训练：每轮 n_envs 个园区锁步推进并共享同一张 Q 表，园区参数取自 self.env
+        每步每个园区按 ε-贪心选择一个动作（机器人下标 × max_vehicles + 待充电车辆下标，与 train 相同的编码），
+        推进一步后得到 n_envs 条转移 (分配前状态, 动作, 奖励, 推进后状态)，TD 目标全部由更新前的 Q 表计算，
+        增量用 np.add.at 累加（同 ReplayBuffer.td_update）；每步已有一批转移，不再使用经验回放
+        choice: 奖励函数，1 为 most，其余为 nearest（同 train）
+        episodes: 总回合数，一个园区的一次仿真计一回合；探索率每轮按本轮回合数衰减
+        seed: 车辆生成与动作选择的随机数种子，None 时随机
+        log_interval: 每隔多少轮打印一次进度，0 表示不打印
+        与 train 的区别：车辆生成使用 VecParkEnv 自带的随机数序列，与 ParkEnv 不逐一对应
+        return: 训练后的 Q 表
+        """
+        if not self.q_table.flags.writeable:
+            self.q_table = np.array(self.q_table)
+        env = self.env
+        n_robots, n_slots = len(env.robots), env.max_vehicles
+        max_distance = np.sqrt((env.park_size[0] / 2) ** 2 + (env.park_size[1] / 2) ** 2)
+        episode, rounds = 0, 0
+        while episode < episodes:
+            n = min(n_envs, episodes - episode)
+            env_seed, action_seed = np.random.SeedSequence(None if seed is None else [seed, episode]).spawn(2)
+            vec_env = VecParkEnv(n, env.park_size, n_robots, n_slots, env.n_batteries, env.time_step,
+                                 env.generate_vehicles_probability / env.time_step, seed=env_seed)
+            rng = np.random.default_rng(action_seed)
+            robots, cars = vec_env.robot_arrays, vec_env.car_arrays
+            rows = np.arange(n)
+            states, state_keys = self._vec_state_index(vec_env)
+            total_reward = np.zeros(n)
+            for _ in range(max_steps):
+                # ε-贪心选择动作：探索时在合法动作中均匀抽取，没有合法动作时随机取一个（不生效）
+                slots = vec_env.needcharge_slots()
+                valid = ((robots.state == R_AVAILABLE)[:, :, None] & (slots >= 0)[:, None, :]).reshape(n, -1)
+                q_values = np.where(valid, self.q_table[states], -np.inf)
+                explore = rng.random(n) < self.exploration_rate
+                q_values[explore] = np.where(valid[explore], rng.random((np.count_nonzero(explore), valid.shape[1])), -np.inf)
+                actions = q_values.argmax(axis=1)
+                has_valid = valid[rows, actions]
+                actions[~has_valid] = rng.integers(0, self.action_size, np.count_nonzero(~has_valid))
+
+                targets = np.full((n, n_robots), -1, dtype=np.int64)
+                robot_idx, car_idx = np.divmod(actions[has_valid], n_slots)
+                targets[rows[has_valid], robot_idx] = slots[rows[has_valid], car_idx]
+                vec_env.step(targets)
+
+                rewards = self._vec_reward(vec_env, choice, max_distance)
+                next_states, next_keys = self._vec_state_index(vec_env)
+                best_next = self.q_table[next_states].max(axis=1)
+                td_error = rewards + self.discount_factor * best_next - self.q_table[states, actions]
+                if state_keys is not None:
+                    # 稀疏 Q 表分配行时可能淘汰同一批中其他园区的状态，行已属于别的状态的转移不更新
+                    td_error[(self.sparse.key_of(states) != state_keys) | (self.sparse.key_of(next_states) != next_keys)] = 0
+                np.add.at(self.q_table, (states, actions), self.learning_rate * td_error)
+                states, state_keys = next_states, next_keys
+                total_reward += rewards
+
+            episode += n
+            rounds += 1
+            for _ in range(n):
+                self.exploration_rate = max(self.exploration_min, self.exploration_rate * self.exploration_decay)
+            if log_interval and rounds % log_interval == 0:
+                print(f"Round {rounds}, Episodes {episode}/{episodes}, Mean Reward: {total_reward.mean():.2f}, "
+                      f"Exploration Rate: {self.exploration_rate:.3f}, Completed: {vec_env.completed_num.sum()}, "
+                      f"Failed: {vec_env.failed_num.sum()}, Total Generated: {vec_env.vehicles_index.sum() - n}")
+        return self.q_table
+
+    def _vec_state_index(self, vec_env):
+        """
+        VecParkEnv 每个园区当前状态对应的 Q 表行号
+        return: ((N,) 行号数组, (N,) 状态键数组)；稠密 Q 表没有状态键，键为 None
+        """
+        features = vec_env.state_features()
+        if self.sparse is not None:
+            keys = [pack_state(value // width for value, width in zip(row, self.state_bins)) for row in features.tolist()]
+            return np.array([self.sparse.row(key) for key in keys], dtype=np.int64), np.array(keys, dtype=np.int64)
+        return self._dense_state_index(*features.T), None
+
+    def _vec_reward(self, vec_env, choice, max_distance):
+        """
+        VecParkEnv 每个园区上一步的奖励，口径与 _calc_reward_most / _calc_reward_nearest 相同：
+        离场车辆按完成或失败计奖惩（每辆车只在离场的那一步计入），每个非空闲机器人加 1
+        return: (N,) 奖励数组
+        """
+        cars, robots = vec_env.car_arrays, vec_env.robot_arrays
+        leaving = vec_env.last_leaving
+        completed = leaving & (cars.state == C_COMPLETED)  # 其余离场车辆均为失败
+        car_reward = np.zeros(leaving.shape)
+        if choice == 1:
+            urgency = np.minimum((cars.battery_gap[leaving] / 95) / ((cars.departure_time[leaving] + 1) / 2700), 2)
+            car_reward[leaving] = np.where(completed[leaving], 100 * urgency, -80 * urgency ** 1.2)
+        else:
+            env = np.nonzero(leaving)[0]
+            distance = np.abs(cars.x[leaving] - robots.home_x[env, 0]) + np.abs(cars.y[leaving] - robots.home_y[env, 0])
+            norm_dist = 1 - distance / (max_distance + 1e-6)
+            car_reward[leaving] = np.where(completed[leaving], 100 * norm_dist, -80 * norm_dist)
+        return car_reward.sum(axis=1) + np.count_nonzero(robots.state != R_AVAILABLE, axis=1)
+
+    def _reset_env(self):
+        """
+        由初始快照得到新一轮训练的环境；不恢复随机数状态，每轮的车辆生成序列不同
+        """
+        if isinstance(self.static_env, bytes):
+            return type(self.env).from_snapshot(self.static_env, restore_rng=False)
+        return copy.deepcopy(self.static_env)
+
     def _calc_reward_most(self, debug=False):
         reward = 0
         completed_reward = 100
@@ -154,13 +374,13 @@ class QLearningAgent:
         max_gap = 95
         min_departure = 2700
         for car in self.env.failed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 urgency = (car.battery_gap / max_gap) / ((car.departure_time + 1) / min_departure)
                 urgency = min(urgency, 2)
                 reward += failed_reward * (urgency ** 1.2)
                 car.counted = 1
         for car in self.env.completed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 urgency = (car.battery_gap / max_gap) / ((car.departure_time + 1) / min_departure)
                 urgency = min(urgency, 2)
                 reward += completed_reward * urgency
@@ -181,13 +401,13 @@ class QLearningAgent:
         # 计算最大可能距离用于归一化
         max_distance = np.sqrt((self.env.park_size[0]/2) ** 2 + (self.env.park_size[1]/2) ** 2)
         for car in self.env.failed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 distance = self._calc_distance_to_charge_station(car)
                 norm_dist = 1 - (distance / (max_distance + 1e-6))  # 距离越近，norm_dist越大
                 reward += failed_reward * norm_dist  # 距离越近失败惩罚越大
                 car.counted = 1
         for car in self.env.completed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 distance = self._calc_distance_to_charge_station(car)
                 norm_dist = 1 - (distance / (max_distance + 1e-6))  # 距离越近，norm_dist越大
                 reward += completed_reward * norm_dist  # 距离越近奖励越大
@@ -210,11 +430,11 @@ class QLearningAgent:
 
         # 完成/失败车辆奖励
         for car in self.env.completed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 reward += completed_reward
                 car.counted = 1
         for car in self.env.failed_vehicles:
-            if not hasattr(car, "counted") or car.counted == 0:
+            if car.counted == 0:
                 reward += failed_reward
                 car.counted = 1
 
@@ -228,7 +448,7 @@ class QLearningAgent:
 
         # 对等待时间长的车辆惩罚
         for car in self.env.needcharge_vehicles:
-            if hasattr(car, "waittime") and car.waittime > 10:
+            if car.waittime > 10:
                 reward += wait_penalty
 
         return reward
\ No newline at end of file
@@ -0,0 +1,217 @@
+import json
+import os
+import pickle
+import threading
+import numpy as np
+
+"""
+Q表文件模块 (Q-table File Module)
+=================================
+本模块定义 Q 表的二进制文件格式（.qtab），以只读内存映射方式打开，替代原先的 pickle 文件。
+
+主要功能：
+- save_q_table：写出带版本号与头信息（地图规模、state_size、action_size、dtype、机器人数、最大车辆数、训练元数据）的 Q 表文件
+- load_q_table：以 np.memmap 只读映射打开 Q 表，并按环境校验形状；同一文件在进程内只映射一次，多个评估线程共享同一份映射
+- read_header：只读取头信息
+- find_q_table：按"优先 .qtab、其次 .pkl"的顺序查找 Q 表文件
+- convert_pickle：把旧的 pickle Q 表转换为 .qtab 文件
+- 兼容旧文件：load_q_table 遇到 .pkl 时退回 pickle 读取（完整读入内存），同样校验形状
+
+设计说明：
+文件布局与 .npy 类似：8 字节魔数与格式版本、4 字节小端头长度、UTF-8 JSON 头（以空格补齐，使数据起始偏移为 64 字节的整数倍）、
+按 C 顺序排列的原始数据。打开文件只需读取头并建立映射，数据页按需由操作系统载入；多个进程映射同一文件时共享页缓存。
+映射是只读的，需要继续训练时以 mmap=False 读入可写副本。
+形状与环境不匹配（例如用大地图的 Q 表评估小地图）时在加载时抛出 ValueError，而不是在仿真中途越界。
+
+用法示例：
+    save_q_table('config/q_table/large_most_q_table.qtab', agent.q_table, map_size='large', env=env,
+                 metadata={'episodes': 100})
+    q_table = load_q_table('config/q_table/large_most_q_table.qtab', env=env)  # 只读 memmap
+    path = find_q_table('config/q_table/large_most_q_table')                  # 优先 .qtab
+    convert_pickle('q_table/large_most_q_table.pkl', map_size='large')
+    # 命令行批量转换
+    python -m modules.qtable_io config/q_table/*.pkl
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+QTABLE_MAGIC = b'\x93QTAB'
+QTABLE_VERSION = 1
+QTABLE_SUFFIX = '.qtab'
+_ALIGNMENT = 64
+
+# 绝对路径 -> ((修改时间, 文件大小), 只读映射)；同一文件在进程内只映射一次，文件被改写后替换旧映射
+_mapped = {}
+_mapped_lock = threading.Lock()
+
+
+def _expected_action_size(env):
+    return len(env.robots) * env.max_vehicles
+
+
+def save_q_table(path, q_table, map_size=None, env=None, metadata=None):
+    """
+    写出 .qtab 文件（先写临时文件再替换，读者不会看到写了一半的文件）
+    path: 目标路径，没有后缀时补上 .qtab
+    q_table: (state_size, action_size) 数组
+    map_size: 地图规模名称，如 'large'
+    env: 给出时记录机器人数与最大车辆数，并校验 action_size
+    metadata: 训练元数据（可 JSON 序列化的 dict），如回合数、学习率
+    return: 写出的文件路径
+    """
+    if not os.path.splitext(path)[1]:
+        path += QTABLE_SUFFIX
+    q_table = np.ascontiguousarray(q_table)
+    if q_table.ndim != 2:
+        raise ValueError(f"Q表应为二维数组，实际形状为 {q_table.shape}")
+    state_size, action_size = q_table.shape
+    header = {
+        'version': QTABLE_VERSION,
+        'map_size': map_size,
+        'state_size': state_size,
+        'action_size': action_size,
+        'dtype': q_table.dtype.newbyteorder('<').str,
+        'metadata': metadata or {},
+    }
+    if env is not None:
+        if _expected_action_size(env) != action_size:
+            raise ValueError(f"Q表的 action_size={action_size} 与环境的 机器人数×最大车辆数={_expected_action_size(env)} 不一致")
+        header['n_robots'] = len(env.robots)
+        header['max_vehicles'] = env.max_vehicles
+
+    text = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix = len(QTABLE_MAGIC) + 1 + 4
+    padding = -(prefix + len(text) + 1) % _ALIGNMENT
+    text += b' ' * padding + b'\n'
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(QTABLE_MAGIC + bytes([QTABLE_VERSION]) + len(text).to_bytes(4, 'little'))
+        f.write(text)
+        f.write(q_table.astype(header['dtype'], copy=False).tobytes(order='C'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _read_header(f, path):
+    prefix = f.read(len(QTABLE_MAGIC) + 5)
+    if len(prefix) < len(QTABLE_MAGIC) + 5 or not prefix.startswith(QTABLE_MAGIC):
+        raise ValueError(f"{path} 不是 Q表文件（.qtab）")
+    version = prefix[len(QTABLE_MAGIC)]
+    if version > QTABLE_VERSION:
+        raise ValueError(f"{path} 的格式版本 {version} 高于当前支持的版本 {QTABLE_VERSION}")
+    length = int.from_bytes(prefix[len(QTABLE_MAGIC) + 1:], 'little')
+    header = json.loads(f.read(length).decode('utf-8'))
+    header['offset'] = len(prefix) + length
+    return header
+
+
+def read_header(path):
+    """读取 .qtab 文件的头信息，附带数据起始偏移 offset"""
+    with open(path, 'rb') as f:
+        return _read_header(f, path)
+
+
+def _data_shape(path, header):
+    """头信息中的 Q 表形状；文件长度不足以容纳全部数据（如写入中断后被截断）时抛出 ValueError"""
+    shape = (header['state_size'], header['action_size'])
+    expected = header['offset'] + shape[0] * shape[1] * np.dtype(header['dtype']).itemsize
+    size = os.path.getsize(path)
+    if size < expected:
+        raise ValueError(f"{path} 不完整：应为 {expected} 字节，实际只有 {size} 字节")
+    return shape
+
+
+def validate_q_table(shape, env=None, state_size=None, path=''):
+    """
+    校验 Q 表形状，不匹配时抛出 ValueError
+    shape: Q 表形状
+    env: 给出时要求 action_size == 机器人数 × 最大车辆数
+    state_size: 给出时要求行数一致（如 QLearningAgent.state_size）
+    """
+    if len(shape) != 2:
+        raise ValueError(f"Q表 {path} 应为二维数组，实际形状为 {tuple(shape)}")
+    if state_size is not None and shape[0] != state_size:
+        raise ValueError(f"Q表 {path} 的 state_size={shape[0]} 与期望的 {state_size} 不一致")
+    if env is not None and shape[1] != _expected_action_size(env):
+        raise ValueError(f"Q表 {path} 的 action_size={shape[1]} 与环境的 机器人数×最大车辆数="
+                         f"{len(env.robots)}×{env.max_vehicles}={_expected_action_size(env)} 不一致，请检查地图规模")
+
+
+def load_q_table(path, env=None, state_size=None, mmap=True):
+    """
+    加载 Q 表
+    path: .qtab 文件；.pkl 文件按旧格式以 pickle 读取
+    env / state_size: 给出时校验形状，见 validate_q_table
+    mmap: True 时返回只读 np.memmap（同一文件在进程内共享一份映射）；False 时返回可写的内存副本
+    return: np.ndarray
+    """
+    if os.path.splitext(path)[1] == '.pkl':
+        with open(path, 'rb') as f:
+            q_table = np.asarray(pickle.load(f))
+        validate_q_table(q_table.shape, env, state_size, path)
+        return q_table
+
+    if not mmap:
+        header = read_header(path)
+        shape = _data_shape(path, header)
+        validate_q_table(shape, env, state_size, path)
+        with open(path, 'rb') as f:
+            f.seek(header['offset'])
+            data = np.fromfile(f, dtype=header['dtype'], count=shape[0] * shape[1])
+        return data.reshape(shape)
+
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _mapped_lock:
+        entry = _mapped.get(key)
+        if entry is not None and entry[0] == stamp:
+            q_table = entry[1]
+        else:
+            # 文件被改写：丢弃旧映射（仍在使用旧映射的调用方持有引用，释放后关闭）
+            header = read_header(path)
+            shape = _data_shape(path, header)
+            q_table = np.memmap(path, dtype=header['dtype'], mode='r', offset=header['offset'], shape=shape)
+            _mapped[key] = (stamp, q_table)
+    validate_q_table(q_table.shape, env, state_size, path)
+    return q_table
+
+
+def find_q_table(base):
+    """
+    查找 Q 表文件：base 没有后缀时依次尝试 base.qtab、base.pkl；有后缀时同名 .qtab 优先
+    return: 存在的文件路径，都不存在时返回 None
+    """
+    root, suffix = os.path.splitext(base)
+    if suffix not in ('', '.pkl', QTABLE_SUFFIX):
+        root = base
+    for candidate in (root + QTABLE_SUFFIX, root + '.pkl'):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def convert_pickle(path, map_size=None, metadata=None):
+    """
+    把 pickle Q 表转换为同名 .qtab 文件
+    map_size: 默认从文件名前缀（small/medium/large）推断
+    return: 写出的文件路径
+    """
+    q_table = load_q_table(path)
+    if map_size is None:
+        prefix = os.path.basename(path).split('_')[0]
+        map_size = prefix if prefix in ('small', 'medium', 'large') else None
+    metadata = dict(metadata or {}, converted_from=os.path.basename(path))
+    return save_q_table(os.path.splitext(path)[0] + QTABLE_SUFFIX, q_table, map_size=map_size, metadata=metadata)
+
+
+if __name__ == '__main__':
+    import sys
+    for pkl_path in sys.argv[1:]:
+        print(pkl_path, '->', convert_pickle(pkl_path))
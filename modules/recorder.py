@@ -0,0 +1,374 @@
+import json
+import os
+import numpy as np
+from modules.vehicle_registry import VehicleRegistry, VEHICLE_STATES
+from modules.array_env import ROBOT_STATES
+
+"""
+仿真记录与回放模块 (Simulation Recorder Module)
+===============================================
+本模块把一次仿真的逐步状态写入紧凑的分块列式二进制日志，并提供读取与回放接口，
+可视化与分析脚本无需重新仿真即可查看整个运行过程。
+
+主要功能：
+- SimulationRecorder：挂接到环境的 update / advance_to_next_event，每步记录时间、机器人位置、状态、电量，
+  电池站电池电量与各状态车辆数；通过车辆登记表的 listeners 记录车辆的到达与每次状态转移
+- 按 block_ticks 步为一块写出 .npz 文件，目录下的 index.json 记录环境参数与每块的步数、时间范围和事件数
+- SimulationLog：按块惰性读取日志，frame(tick) 返回与 get_status 相同格式的状态，frames() 逐块遍历
+- ReplayEnv：由日志重建机器人、车辆、电池站的轻量对象，属性与 ParkEnv 相同，ChargingVisualizer 可直接回放
+
+设计说明：
+每步数据写入预分配的定长缓冲区（机器人数 × block_ticks），写满一块即落盘并复用缓冲区，内存占用与仿真时长无关；
+位置与电量以 float32 保存，状态以 int8 保存。车辆事件只在到达和状态转移时产生，数量远小于步数 × 车辆数，
+回放时按事件重放即可恢复任意时刻的车辆桶。index.json 在每块写出后更新，中途中断的记录也能读取已落盘的部分。
+两种环境后端都可记录：ArrayParkEnv 直接拷贝结构数组，ParkEnv 逐个读取机器人对象。
+
+用法示例：
+    env.attach_recorder(SimulationRecorder('runs/large_nearest'))
+    for _ in range(28800):
+        strategy.update(strategy='nearest')  # 分配任务并推进环境一步
+    env.recorder.close()
+    # 回放
+    replay = ReplayEnv('runs/large_nearest')
+    visualizer = ChargingVisualizer(replay, cell_size=1.5)
+    while replay.update():
+        visualizer.render(strategy='nearest')
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+LOG_VERSION = 1
+INDEX_FILE = 'index.json'
+_ROBOT_STATE_CODES = {state: code for code, state in enumerate(ROBOT_STATES)}
+
+# 车辆事件：state 为 VEHICLE_STATES 的下标，tick 为事件生效的步号（该步的帧已包含此事件）
+VEHICLE_EVENT_DTYPE = np.dtype([
+    ('tick', 'i8'), ('time', 'f8'), ('id', 'i8'), ('state', 'i1'),
+    ('x', 'f4'), ('y', 'f4'), ('soc', 'f4'), ('required_soc', 'f4'), ('waittime', 'f4'),
+])
+
+
+class SimulationRecorder:
+    """
+    仿真记录器
+    path: 日志目录，不存在时自动创建
+    block_ticks: 每块包含的步数
+    compress: 是否以 np.savez_compressed 写块
+    """
+    def __init__(self, path, block_ticks=4096, compress=False):
+        self.path = path
+        self.block_ticks = block_ticks
+        self.compress = compress
+        self.ticks = 0  # 已记录的总步数
+        self.events = 0  # 已记录的车辆事件数
+        self.blocks = []
+        self.meta = None
+        self._env = None
+        self._registry = None
+        self._fill = 0  # 当前块已写入的步数
+        self._pending_events = []
+
+    def bind(self, env):
+        """
+        绑定环境：写入环境参数，订阅车辆登记表，并把已在场的车辆记为事件
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._env = env
+        n_robots, n_batteries = len(env.robots), env.n_batteries
+        self.meta = {
+            'version': LOG_VERSION,
+            'park_size': list(env.park_size),
+            'n_robots': n_robots,
+            'n_batteries': n_batteries,
+            'time_step': env.time_step,
+            'robot_ids': [int(robot.id) for robot in env.robots],
+            'station_location': [float(v) for v in env.battery_station.location],
+        }
+        shape = (self.block_ticks, n_robots)
+        self._buffers = {
+            'time': np.zeros(self.block_ticks),
+            'robot_x': np.zeros(shape, dtype=np.float32),
+            'robot_y': np.zeros(shape, dtype=np.float32),
+            'robot_state': np.zeros(shape, dtype=np.int8),
+            'robot_soc': np.zeros(shape, dtype=np.float32),
+            'station_soc': np.full((self.block_ticks, n_batteries), np.nan, dtype=np.float32),
+            'vehicle_counts': np.zeros((self.block_ticks, len(VEHICLE_STATES)), dtype=np.int32),
+            'vehicles_index': np.zeros(self.block_ticks, dtype=np.int64),
+        }
+        self.subscribe(env.vehicles)
+        for state in VEHICLE_STATES:
+            for car in env.vehicles.buckets[state]:
+                self.on_vehicle(car, None, state)
+        self._write_index()
+
+    def subscribe(self, registry):
+        """订阅车辆登记表的状态转移（环境重建登记表后需重新订阅）"""
+        if self._registry is not None and self.on_vehicle in self._registry.listeners:
+            self._registry.listeners.remove(self.on_vehicle)
+        self._registry = registry
+        registry.listeners.append(self.on_vehicle)
+
+    def on_vehicle(self, car, old_state, new_state):
+        """车辆登记表回调：记录到达与状态转移"""
+        x, y = car.parking_spot
+        self._pending_events.append((self.ticks, self._env.time, car.id, VEHICLE_STATES.index(new_state),
+                                     x, y, car.battery.soc, car.required_soc, car.waittime))
+
+    def record(self, env):
+        """记录当前时刻的一帧，写满一块时落盘"""
+        row, buffers = self._fill, self._buffers
+        buffers['time'][row] = env.time
+        arrays = getattr(env, 'robot_arrays', None)
+        if arrays is not None:
+            buffers['robot_x'][row] = arrays.x
+            buffers['robot_y'][row] = arrays.y
+            buffers['robot_state'][row] = arrays.state
+            buffers['robot_soc'][row] = arrays.soc
+        else:
+            codes = _ROBOT_STATE_CODES
+            columns = [(robot.x, robot.y, codes[robot.state], robot.battery.soc) for robot in env.robots]
+            buffers['robot_x'][row], buffers['robot_y'][row], buffers['robot_state'][row], buffers['robot_soc'][row] = zip(*columns)
+        station = env.battery_station.get_status()[:self.meta['n_batteries']]
+        if len(station) == self.meta['n_batteries']:
+            buffers['station_soc'][row] = station
+        else:
+            buffers['station_soc'][row] = np.nan
+            buffers['station_soc'][row, :len(station)] = station
+        buckets = self._registry.buckets
+        buffers['vehicle_counts'][row] = [len(buckets[state]) for state in VEHICLE_STATES]
+        buffers['vehicles_index'][row] = env.vehicles_index
+        self._fill += 1
+        self.ticks += 1
+        if self._fill == self.block_ticks:
+            self.flush()
+
+    def flush(self):
+        """把当前块（含车辆事件）写入磁盘并更新索引"""
+        if not self._fill and not self._pending_events:
+            return
+        events = np.array(self._pending_events, dtype=VEHICLE_EVENT_DTYPE)
+        name = f'block_{len(self.blocks):06d}.npz'
+        arrays = {key: value[:self._fill] for key, value in self._buffers.items()}
+        save = np.savez_compressed if self.compress else np.savez
+        save(os.path.join(self.path, name), events=events, **arrays)
+        times = self._buffers['time'][:self._fill]
+        self.blocks.append({
+            'file': name,
+            'start': self.ticks - self._fill,
+            'ticks': self._fill,
+            'time_start': float(times[0]) if self._fill else None,
+            'time_end': float(times[-1]) if self._fill else None,
+            'events': len(events),
+        })
+        self.events += len(events)
+        self._fill = 0
+        self._pending_events = []
+        self._write_index()
+
+    def _write_index(self):
+        index = dict(self.meta, ticks=self.ticks, events=self.events, blocks=self.blocks)
+        tmp = os.path.join(self.path, INDEX_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+
+    def close(self):
+        """写出剩余数据并取消订阅"""
+        self.flush()
+        if self._registry is not None and self.on_vehicle in self._registry.listeners:
+            self._registry.listeners.remove(self.on_vehicle)
+        self._registry = None
+        if self._env is not None and getattr(self._env, 'recorder', None) is self:
+            self._env.recorder = None
+        self._env = None
+
+
+class SimulationLog:
+    """
+    仿真日志读取器，按块惰性加载
+    path: SimulationRecorder 写出的目录
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index['version'] != LOG_VERSION:
+            raise ValueError(f"不支持的日志版本: {self.index['version']}")
+        self.blocks = self.index['blocks']
+        self._starts = np.array([block['start'] for block in self.blocks], dtype=np.int64)
+        self._cache = (None, None)  # (块序号, 块数据)
+
+    def __len__(self):
+        return sum(block['ticks'] for block in self.blocks)
+
+    def block(self, i):
+        """读取第 i 块的全部数组，最近一次读取的块会被缓存"""
+        if self._cache[0] != i:
+            with np.load(os.path.join(self.path, self.blocks[i]['file'])) as data:
+                self._cache = (i, {key: data[key] for key in data.files})
+        return self._cache[1]
+
+    def _locate(self, tick):
+        if not 0 <= tick < len(self):
+            raise IndexError(f"tick {tick} 超出范围 [0, {len(self)})")
+        i = int(np.searchsorted(self._starts, tick, side='right')) - 1
+        while self.blocks[i]['ticks'] == 0 or tick >= self.blocks[i]['start'] + self.blocks[i]['ticks']:
+            i += 1
+        return i, tick - self.blocks[i]['start']
+
+    def frame(self, tick):
+        """
+        第 tick 步的状态，格式与 ParkEnv.get_status 相同
+        """
+        i, row = self._locate(tick)
+        data = self.block(i)
+        station = data['station_soc'][row]
+        counts = data['vehicle_counts'][row]
+        return {
+            "time": float(data['time'][row]),
+            "robots": list(zip(data['robot_x'][row].tolist(), data['robot_y'][row].tolist(),
+                               [ROBOT_STATES[s] for s in data['robot_state'][row]], data['robot_soc'][row].tolist())),
+            "completed_vehicles_num": int(counts[VEHICLE_STATES.index('completed')]),
+            "failed_vehicles_num": int(counts[VEHICLE_STATES.index('failed')]),
+            "needcharge_vehicles_num": int(counts[VEHICLE_STATES.index('needcharge')]),
+            "charging_vehicles_num": int(counts[VEHICLE_STATES.index('charging')]),
+            "battery_station": station[~np.isnan(station)].tolist(),
+        }
+
+    def frames(self):
+        """按顺序遍历全部帧"""
+        for tick in range(len(self)):
+            yield self.frame(tick)
+
+    def column(self, name):
+        """拼接全部块中的一列（如 'time'、'robot_soc'），用于整体分析"""
+        return np.concatenate([self.block(i)[name] for i in range(len(self.blocks))])
+
+    def vehicle_events(self):
+        """全部车辆事件，VEHICLE_EVENT_DTYPE 结构数组，按发生顺序排列"""
+        return self.column('events')
+
+
+class _ReplayBattery:
+    __slots__ = ('soc',)
+
+    def __init__(self, soc=0.0):
+        self.soc = soc
+
+
+class _ReplayRobot:
+    def __init__(self, robot_id):
+        self.id = robot_id
+        self.x = self.y = 0.0
+        self.state = 'available'
+        self.battery = _ReplayBattery()
+
+
+class _ReplayCar:
+    def __init__(self, event):
+        self.id = int(event['id'])
+        self.parking_spot = (float(event['x']), float(event['y']))
+        self.required_soc = float(event['required_soc'])
+        self.battery = _ReplayBattery()
+        self.apply(event)
+
+    def apply(self, event):
+        self.state = VEHICLE_STATES[event['state']]
+        self.battery.soc = float(event['soc'])
+        self.waittime = float(event['waittime'])
+
+
+class _ReplayStation:
+    def __init__(self, location):
+        self.location = tuple(location)
+        self.soc = []
+
+    def get_status(self):
+        return list(self.soc)
+
+    def get_maxsoc(self):
+        return max(self.soc) if self.soc else None
+
+
+class ReplayEnv:
+    """
+    由仿真日志回放环境，属性与 ParkEnv 相同，供 ChargingVisualizer 与分析脚本使用
+    log: SimulationLog 或日志目录
+    车辆的电量与等待时间为其最近一次事件时的取值
+    """
+    def __init__(self, log):
+        self.log = log if isinstance(log, SimulationLog) else SimulationLog(log)
+        index = self.log.index
+        self.park_size = tuple(index['park_size'])
+        self.n_robots = index['n_robots']
+        self.n_batteries = index['n_batteries']
+        self.time_step = index['time_step']
+        self.robots = [_ReplayRobot(robot_id) for robot_id in index['robot_ids']]
+        self.battery_station = _ReplayStation(index['station_location'])
+        self._reset()
+
+    def _reset(self):
+        self.tick = -1
+        self.time = 0
+        self.vehicles_index = 1
+        self.vehicles = VehicleRegistry()
+        self.needcharge_vehicles = self.vehicles.needcharge
+        self.charging_vehicles = self.vehicles.charging
+        self.completed_vehicles = self.vehicles.completed
+        self.failed_vehicles = self.vehicles.failed
+        self._event_block = 0
+        self._event_row = 0
+
+    def _apply_events(self, tick):
+        """应用生效步号不晚于 tick 的车辆事件"""
+        blocks = self.log.blocks
+        while self._event_block < len(blocks):
+            events = self.log.block(self._event_block)['events']
+            while self._event_row < len(events) and events['tick'][self._event_row] <= tick:
+                event = events[self._event_row]
+                car = self.vehicles.get(int(event['id']))
+                if car is None:
+                    self.vehicles.add(_ReplayCar(event))
+                else:
+                    car.apply(event)
+                    self.vehicles.transition(car, car.state)
+                self._event_row += 1
+            if self._event_row < len(events):
+                return
+            self._event_block += 1
+            self._event_row = 0
+
+    def seek(self, tick):
+        """跳转到第 tick 步；向后跳转时从头重放车辆事件"""
+        if tick < self.tick:
+            self._reset()
+        i, row = self.log._locate(tick)
+        self._apply_events(tick)
+        data = self.log.block(i)
+        self.tick = tick
+        self.time = float(data['time'][row])
+        self.vehicles_index = int(data['vehicles_index'][row])
+        for robot, x, y, state, soc in zip(self.robots, data['robot_x'][row].tolist(), data['robot_y'][row].tolist(),
+                                           data['robot_state'][row].tolist(), data['robot_soc'][row].tolist()):
+            robot.x, robot.y, robot.state = x, y, ROBOT_STATES[state]
+            robot.battery.soc = soc
+        station = data['station_soc'][row]
+        self.battery_station.soc = station[~np.isnan(station)].tolist()
+
+    def update(self, time_step=None):
+        """
+        前进一帧，time_step 仅为兼容 ParkEnv 的接口
+        return: bool, 日志未结束时为 True
+        """
+        if self.tick + 1 >= len(self.log):
+            return False
+        self.seek(self.tick + 1)
+        return True
+
+    def get_status(self):
+        """
+        返回当前帧的环境状态
+        """
+        return self.log.frame(self.tick)
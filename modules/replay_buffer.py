@@ -0,0 +1,90 @@
+import numpy as np
+
+"""
+经验回放模块 (Experience Replay Module)
+=======================================
+本模块实现 Q 学习的经验回放缓冲区：转移 (state_idx, action, reward, next_state_idx, done) 存放在预分配的 NumPy 环形数组中，
+按小批量向量化地执行 TD 更新。
+
+主要功能：
+- ReplayBuffer：容量固定的环形缓冲区，写满后覆盖最旧的转移
+- add：写入一条转移，O(1)，不分配新对象
+- sample：有放回地均匀抽取一批转移的下标
+- td_update：对一批转移做向量化 TD 更新，同一 (状态, 动作) 在批内重复出现时增量用 np.add.at 累加；
+  配合稀疏 Q 表时缓冲区保存状态键，由 resolve 在更新时换成当前行号
+
+设计说明：
+仿真一步的开销远大于一次表格更新，回放让每条转移被多次使用，并把逐步的 Python 标量运算换成批量数组运算。
+批内所有 TD 目标都由更新前的 Q 表计算，重复的 (状态, 动作) 各自的增量全部累加（花式索引的 += 只会保留其中一个）。
+抽样使用全局 np.random，与训练中其他随机数一样可由种子复现。
+
+用法示例：
+    buffer = ReplayBuffer(capacity=100000)
+    buffer.add(state_idx, action, reward, next_state_idx, done)
+    buffer.td_update(q_table, batch_size=64, learning_rate=0.1, discount_factor=0.9)
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+
+class ReplayBuffer:
+    """
+    环形经验回放缓冲区
+    capacity: 最多保存的转移条数
+    """
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.states = np.zeros(self.capacity, dtype=np.int64)
+        self.actions = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards = np.zeros(self.capacity, dtype=np.float64)
+        self.next_states = np.zeros(self.capacity, dtype=np.int64)
+        self.dones = np.zeros(self.capacity, dtype=bool)
+        self.position = 0  # 下一条转移的写入位置
+        self.size = 0  # 已保存的转移条数
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state_idx, action, reward, next_state_idx, done):
+        """写入一条转移，写满后覆盖最旧的一条"""
+        i = self.position
+        self.states[i] = state_idx
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state_idx
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """有放回地均匀抽取 batch_size 条转移的下标；缓冲区为空时返回空数组"""
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.random.randint(0, self.size, size=batch_size)
+
+    def td_update(self, q_table, batch_size, learning_rate, discount_factor, resolve=None):
+        """
+        抽取一批转移，对 q_table 原地做 TD 更新
+        resolve: 缓冲区保存的是状态键时，把键数组换成当前行号的函数（如 SparseQTable.lookup），
+                 返回 -1 的状态已不在 Q 表中，相应的转移跳过；None 表示保存的就是行号
+        return: 批内 TD 误差的平均绝对值（缓冲区为空或整批被跳过时为 0.0）
+        """
+        batch = self.sample(batch_size)
+        if not batch.size:
+            return 0.0
+        states, next_states = self.states[batch], self.next_states[batch]
+        if resolve is not None:
+            states, next_states = resolve(states), resolve(next_states)
+            kept = (states >= 0) & (next_states >= 0)
+            if not kept.all():
+                batch, states, next_states = batch[kept], states[kept], next_states[kept]
+                if not batch.size:
+                    return 0.0
+        actions = self.actions[batch]
+        best_next = q_table[next_states].max(axis=1)
+        td_target = self.rewards[batch] + discount_factor * best_next * ~self.dones[batch]
+        td_error = td_target - q_table[states, actions]
+        np.add.at(q_table, (states, actions), learning_rate * td_error)
+        return float(np.abs(td_error).mean())
@@ -0,0 +1,194 @@
+import numpy as np
+
+"""
+稀疏 Q 表模块 (Sparse Q-table Module)
+=====================================
+本模块实现以完整离散状态为键的稀疏 Q 表：只为实际出现过的状态分配一行，行数受内存上限约束，
+达到上限后淘汰最久未访问的状态（LRU）。
+
+主要功能：
+- SparseQTable：键为离散状态元组打包成的 64 位整数，哈希索引使用开放寻址（线性探测）的 NumPy 数组
+- row：查找状态所在的行号，不存在时分配一行（行满时淘汰最久未访问的状态，该行清零后复用）
+- lookup / key_of：键与行号的批量查找、行号对应的键，供经验回放在行号复用后仍能找到正确的状态
+- values：(max_states, action_size) 的 Q 值数组，行号即 Q 表的“状态下标”，
+  QLearningAgent、经验回放与 q_table_task 中的 q_table[state_idx, action] 等索引无需改动
+- pack_state：把非负整数元组打包为键，前 3 个分量各占 16 位，第 4 个分量占 15 位（键不超过 int64 上限）
+- state_keys / load_rows：导出、载入 (键, 行) 数据，用于保存与加载
+
+设计说明：
+原实现用 idx % state_size 把状态折叠进 100 行，不相关的状态共用一行。稀疏表按完整状态区分行，
+因此可以使用更细的分桶；内存上限按 memory_limit 字节除以每行字节数换算为最大行数。
+values 一次性用 np.zeros 分配，操作系统按页延迟提交，实际占用随已使用的行数增长。
+哈希索引容量取不小于 2 × max_states 的 2 的幂，装载因子不超过 0.5；删除使用后移（backward shift），
+不留墓碑，探测长度不随淘汰次数退化。LRU 以访问计数器记录每行最后一次访问的时刻，淘汰时对已用行取 argmin。
+被淘汰的行在复用前清零。行号会被复用，因此经验回放缓冲区保存状态键而不是行号，
+TD 更新时用 lookup 换成当前行号，状态已被淘汰的转移直接跳过，不会作用到复用该行的新状态上。
+
+用法示例：
+    table = SparseQTable(action_size=4000, memory_limit=64 * 2 ** 20)
+    row = table.row(pack_state((5, 3, 4, 12)))
+    table.values[row, action] += 0.1
+    table.summary()   # {'states': ..., 'max_states': ..., 'evictions': ...}
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+_EMPTY = -1
+_FIELD_BITS = 16
+_FIELD_MAX = (1 << _FIELD_BITS) - 1
+_LAST_FIELD_MAX = (1 << (_FIELD_BITS - 1)) - 1  # 第 4 个分量少一位，键保持为非负 int64
+
+
+def pack_state(features):
+    """
+    把最多 4 个非负整数打包为键：前 3 个分量截断到 [0, 65535]，第 4 个截断到 [0, 32767]
+    return: int，位于 [0, 2 ** 63)
+    """
+    key = 0
+    for i, value in enumerate(features):
+        if i > 3:
+            raise ValueError("pack_state 最多打包 4 个分量")
+        limit = _LAST_FIELD_MAX if i == 3 else _FIELD_MAX
+        key |= min(max(int(value), 0), limit) << (_FIELD_BITS * i)
+    return key
+
+
+class SparseQTable:
+    """
+    稀疏 Q 表
+    action_size: 动作数
+    memory_limit: Q 值数组的内存上限（字节）；max_states 给出时忽略
+    max_states: 最多保存的状态数
+    """
+    def __init__(self, action_size, memory_limit=64 * 2 ** 20, max_states=None, dtype=np.float64):
+        self.action_size = action_size
+        row_bytes = action_size * np.dtype(dtype).itemsize
+        self.max_states = max(1, int(max_states if max_states is not None else memory_limit // row_bytes))
+        self.values = np.zeros((self.max_states, action_size), dtype=dtype)
+
+        capacity = 1
+        while capacity < 2 * self.max_states:
+            capacity *= 2
+        self._mask = capacity - 1
+        self._slot_keys = np.full(capacity, _EMPTY, dtype=np.int64)  # 哈希槽 -> 键
+        self._slot_rows = np.zeros(capacity, dtype=np.int64)  # 哈希槽 -> 行号
+        self._row_keys = np.full(self.max_states, _EMPTY, dtype=np.int64)  # 行号 -> 键
+        self._last_used = np.zeros(self.max_states, dtype=np.int64)  # 行号 -> 最后访问时刻
+        self._clock = 0
+        self.size = 0  # 已使用的行数
+        self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    def _home(self, key):
+        # 乘法哈希（Fibonacci hashing），打乱打包键的低位
+        return ((int(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32 & self._mask
+
+    def _find(self, key):
+        """return: 键所在的哈希槽，或第一个空槽（键不存在时）"""
+        slot = self._home(key)
+        keys = self._slot_keys
+        while True:
+            found = keys[slot]
+            if found == key or found == _EMPTY:
+                return slot
+            slot = (slot + 1) & self._mask
+
+    def get(self, key):
+        """键对应的行号，不存在时返回 None（不更新访问时刻）"""
+        slot = self._find(key)
+        if self._slot_keys[slot] == _EMPTY:
+            return None
+        return int(self._slot_rows[slot])
+
+    def lookup(self, keys):
+        """
+        批量查找键对应的行号（不更新访问时刻）
+        keys: 可迭代的键
+        return: np.ndarray，不存在（已被淘汰）的键为 -1
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        for i, key in enumerate(keys.tolist()):
+            slot = self._find(key)
+            if self._slot_keys[slot] != _EMPTY:
+                rows[i] = self._slot_rows[slot]
+        return rows
+
+    def key_of(self, row):
+        """行号当前对应的键，row 为整数时返回 int，为数组时返回同形状的键数组"""
+        keys = self._row_keys[row]
+        return int(keys) if np.ndim(keys) == 0 else keys.copy()
+
+    def row(self, key):
+        """
+        键对应的行号，不存在时分配一行；行满时淘汰最久未访问的状态
+        return: int
+        """
+        self._clock += 1
+        slot = self._find(key)
+        if self._slot_keys[slot] != _EMPTY:
+            row = int(self._slot_rows[slot])
+        else:
+            if self.size < self.max_states:
+                row = self.size
+                self.size += 1
+            else:
+                row = int(np.argmin(self._last_used))
+                self._delete(int(self._row_keys[row]))
+                self.values[row] = 0
+                self.evictions += 1
+                slot = self._find(key)  # 删除后移可能改变空槽位置
+            self._slot_keys[slot] = key
+            self._slot_rows[slot] = row
+            self._row_keys[row] = key
+        self._last_used[row] = self._clock
+        return row
+
+    def _delete(self, key):
+        """删除键，并把同一探测链上后面的键前移（线性探测的后移删除）"""
+        keys, rows, mask = self._slot_keys, self._slot_rows, self._mask
+        hole = self._find(key)
+        keys[hole] = _EMPTY
+        slot = (hole + 1) & mask
+        while keys[slot] != _EMPTY:
+            home = self._home(int(keys[slot]))
+            # 键的起始槽不在 (hole, slot] 区间内时，可以移到空洞处
+            if (slot - home) & mask >= (slot - hole) & mask:
+                keys[hole] = keys[slot]
+                rows[hole] = rows[slot]
+                keys[slot] = _EMPTY
+                hole = slot
+            slot = (slot + 1) & mask
+
+    def state_keys(self):
+        """已使用行的键，按行号排列，return: np.ndarray (size,)"""
+        return self._row_keys[:self.size].copy()
+
+    def load_rows(self, keys, values):
+        """
+        清空后按顺序载入 (键, Q 值行)，超过 max_states 时抛出 ValueError
+        keys: (n,) 键；values: (n, action_size)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) > self.max_states:
+            raise ValueError(f"稀疏 Q 表有 {len(keys)} 个状态，超过上限 max_states={self.max_states}")
+        self._slot_keys[:] = _EMPTY
+        self._row_keys[:] = _EMPTY
+        self._last_used[:] = 0
+        self.values[:] = 0
+        self.size = 0
+        for key, row_values in zip(keys.tolist(), values):
+            self.values[self.row(key)] = row_values
+
+    def summary(self):
+        """return: 使用情况 dict"""
+        return {
+            'states': self.size,
+            'max_states': self.max_states,
+            'evictions': self.evictions,
+            'memory_bytes': self.size * self.values.strides[0],
+        }
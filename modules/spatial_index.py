@@ -0,0 +1,228 @@
+import math
+from operator import itemgetter
+import numpy as np
+
+"""
+空间索引模块 (Spatial Index Module)
+===================================
+本模块为调度策略提供园区内待充电车辆与空闲机器人的网格空间索引，支持 k 近邻与半径查询。
+
+主要功能：
+- GridIndex：把点按坐标放入边长为 cell_size 的网格桶，支持插入、删除、移动、k 近邻和半径查询
+- SpatialIndex：环境持有的索引，vehicles 为待充电车辆（按停车位置），robots 为空闲机器人（按当前位置）
+- 车辆索引订阅车辆登记表，车辆进入/离开 needcharge 桶时增量更新
+- 机器人索引在调度前由 sync_robots 增量同步，只插入、删除状态或位置发生变化的机器人
+- vehicle_columns：按登记表顺序缓存待充电车辆的坐标与电量缺口数组，供调度策略用 NumPy 广播构造矩阵
+
+设计说明：
+近邻查询从查询点所在的网格开始逐圈向外扩展，已找到的第 k 个点比未搜索区域的最近边界更近时停止，
+点分布较均匀时每次查询只访问常数个网格，与总点数无关。距离相同的点按插入时给定的序号排序
+（机器人为其在 env.robots 中的下标，车辆为车辆编号），与原先按列表顺序线性扫描、取第一个最小值的结果一致。
+距离按 ((dx)**2 + (dy)**2)**0.5 计算，与策略中原有的距离公式逐位相同。
+机器人的状态在 Robot.update、换电站等多处改变，只有数十个，因此在每次调度前以 O(R) 的比较同步，
+不在机器人上加钩子，避免拖慢每个时间步的更新。
+
+用法示例：
+    index = GridIndex(cell_size=25)
+    index.insert(car, 10, 20, order=car.id)
+    index.nearest(0, 0, k=3)        # [(距离, car), ...]
+    index.within(0, 0, radius=50)
+    # 环境中的索引
+    env.spatial.sync_robots(env.robots)
+    env.spatial.robots.nearest(*car.parking_spot)
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+_BY_DISTANCE = itemgetter(0, 1)  # (距离, 序号)
+
+
+class GridIndex:
+    """
+    均匀网格空间索引
+    cell_size: 网格边长（米）
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = {}  # (cx, cy) -> {item: (x, y, order)}
+        self._items = {}  # item -> (cx, cy)
+        self._bounds = None  # 出现过的网格坐标范围 (min_cx, min_cy, max_cx, max_cy)
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, item, x, y, order=0):
+        """
+        插入点，已存在时移动到新位置
+        order: 距离相同时的排序序号，越小越靠前
+        """
+        if item in self._items:
+            self.remove(item)
+        cell = self._cell(x, y)
+        self._cells.setdefault(cell, {})[item] = (x, y, order)
+        self._items[item] = cell
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[1], cell[0], cell[1])
+        else:
+            min_cx, min_cy, max_cx, max_cy = self._bounds
+            self._bounds = (min(min_cx, cell[0]), min(min_cy, cell[1]), max(max_cx, cell[0]), max(max_cy, cell[1]))
+
+    def remove(self, item):
+        """删除点，不存在时抛出 KeyError"""
+        cell = self._items.pop(item)
+        bucket = self._cells[cell]
+        del bucket[item]
+        if not bucket:
+            del self._cells[cell]
+
+    def discard(self, item):
+        """删除点，不存在时忽略"""
+        if item in self._items:
+            self.remove(item)
+
+    def position(self, item):
+        """点的坐标 (x, y)，不存在时返回 None"""
+        cell = self._items.get(item)
+        if cell is None:
+            return None
+        x, y, _ = self._cells[cell][item]
+        return (x, y)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def _ring(self, cx, cy, r):
+        """与 (cx, cy) 切比雪夫距离恰为 r 的网格"""
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+    def nearest(self, x, y, k=1):
+        """
+        k 近邻查询
+        return: 最多 k 个 (距离, item)，按 (距离, 序号) 升序
+        """
+        if not self._items or k <= 0:
+            return []
+        size = self.cell_size
+        cx, cy = self._cell(x, y)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        max_ring = max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy)
+        found = []
+        r = 0
+        while r <= max_ring:
+            for cell in self._ring(cx, cy, r):
+                bucket = self._cells.get(cell)
+                if bucket:
+                    for item, (ix, iy, order) in bucket.items():
+                        found.append((((ix - x) ** 2 + (iy - y) ** 2) ** 0.5, order, item))
+            if len(found) >= k:
+                found.sort(key=_BY_DISTANCE)
+                del found[k:]
+                # 未搜索区域到查询点的最近距离
+                edge = min(x - (cx - r) * size, (cx + r + 1) * size - x, y - (cy - r) * size, (cy + r + 1) * size - y)
+                if found[-1][0] < edge:
+                    break
+            r += 1
+        found.sort(key=_BY_DISTANCE)
+        return [(distance, item) for distance, _, item in found[:k]]
+
+    def within(self, x, y, radius):
+        """
+        半径查询
+        return: 距离不超过 radius 的全部 (距离, item)，按 (距离, 序号) 升序
+        """
+        if not self._items:
+            return []
+        low_x, low_y = self._cell(x - radius, y - radius)
+        high_x, high_y = self._cell(x + radius, y + radius)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        found = []
+        for gx in range(max(low_x, min_cx), min(high_x, max_cx) + 1):
+            for gy in range(max(low_y, min_cy), min(high_y, max_cy) + 1):
+                bucket = self._cells.get((gx, gy))
+                if not bucket:
+                    continue
+                for item, (ix, iy, order) in bucket.items():
+                    distance = ((ix - x) ** 2 + (iy - y) ** 2) ** 0.5
+                    if distance <= radius:
+                        found.append((distance, order, item))
+        found.sort(key=_BY_DISTANCE)
+        return [(distance, item) for distance, _, item in found]
+
+
+class SpatialIndex:
+    """
+    环境的空间索引：待充电车辆与空闲机器人
+    park_size: 园区大小，用于确定网格边长（默认每边 16 格）
+    registry: 车辆登记表，给出时订阅其状态转移
+    """
+    def __init__(self, park_size, registry=None, cell_size=None):
+        if cell_size is None:
+            cell_size = max(park_size[0], park_size[1], 1) / 16
+        self.vehicles = GridIndex(cell_size)  # 待充电车辆，按停车位置
+        self.robots = GridIndex(cell_size)  # 空闲机器人，按当前位置
+        self._registry = None
+        self._columns = None  # 待充电车辆的 (车辆列表, 坐标, 电量缺口)，桶内容变化后按需重建
+        if registry is not None:
+            self.attach(registry)
+
+    def attach(self, registry):
+        """订阅车辆登记表，并载入其中已有的待充电车辆"""
+        self._registry = registry
+        self._columns = None
+        registry.listeners.append(self._on_vehicle)
+        for car in registry.needcharge:
+            self.vehicles.insert(car, *car.parking_spot, order=car.id)
+
+    def _on_vehicle(self, car, old_state, new_state):
+        if old_state == 'needcharge':
+            self.vehicles.discard(car)
+            self._columns = None
+        if new_state == 'needcharge':
+            self.vehicles.insert(car, *car.parking_spot, order=car.id)
+            self._columns = None
+
+    def vehicle_columns(self):
+        """
+        待充电车辆的列数组，顺序与 registry.needcharge 相同
+        停车位置和到达时的电量缺口在车辆待充电期间不变，桶内容不变时直接返回缓存
+        return: (车辆列表, 坐标数组 (n, 2), 电量缺口数组 (n,))
+        """
+        if self._columns is None:
+            vehicles = list(self._registry.needcharge)
+            coords = np.array([car.parking_spot for car in vehicles], dtype=float).reshape(-1, 2)
+            gaps = np.array([car.battery_gap for car in vehicles], dtype=float)
+            self._columns = (vehicles, coords, gaps)
+        return self._columns
+
+    def sync_robots(self, robots):
+        """
+        增量同步空闲机器人：状态变为 available 或位置变化的机器人插入，不再空闲的删除
+        robots: env.robots，下标作为距离相同时的排序序号
+        """
+        index = self.robots
+        for order, robot in enumerate(robots):
+            if robot.state == 'available':
+                point = (robot.x, robot.y)
+                if index.position(robot) != point:
+                    index.insert(robot, *point, order=order)
+            elif robot in index:
+                index.remove(robot)
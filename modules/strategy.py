@@ -1,6 +1,10 @@
 from modules.qlearning_agent import QLearningAgent
+from modules.array_env import R_AVAILABLE
+import time
 import numpy as np
 from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
 
 """
 调度策略模块 (Task Strategy Module)
@@ -14,105 +18,351 @@ from scipy.optimize import linear_sum_assignment
 - 遗传算法多目标优化：基于遗传算法优化权重的多目标分配
 - 强化学习分配：基于Q-learning的智能分配策略
 - 超启发式策略：根据环境状态动态选择最优底层调度策略
+- 事件触发：环境的调度脏标记未置位时跳过策略
+- 策略注册表：register_strategy(name) 按名称注册策略，新增策略无需修改分派代码
+- 运行统计：每个策略记录单次调用耗时直方图、分配次数与跳过次数，summary() 汇总
+- 时间预算：time_budget 限制每步调度耗时，策略超时后中断，剩余空闲机器人由贪心最近机器人分配补齐
 
 设计说明：
 该模块通过面向对象方式封装了多种调度算法，便于灵活切换和扩展。支持静态启发式、元启发式、强化学习等多种分配方法，适用于不同规模和复杂度的仿真场景。
+最近任务优先与遗传算法策略共用 _distance_matrix / _score_matrix：车辆坐标与电量缺口取自空间索引缓存的列数组，
+距离、紧急度和评分矩阵用 NumPy 广播一次算出；贪心分配每次对评分矩阵取 argmax 并屏蔽对应行列，不再对全部配对排序。
+超大园区中空闲机器人与待充电车辆的配对数超过 sparse_threshold 时，最近任务优先改用稀疏模式：
+较少一方的每个成员在空间索引中查询 sparse_k 个最近候选，只计算这些候选边的距离，内存与 (机器人数 + 车辆数) × k 成正比，
+用 min_weight_full_bipartite_matching 求解；候选图不存在完整匹配时
+把 k 加倍重试，k 覆盖全部候选后退回稠密的匈牙利算法。
+设定 time_budget 后，各策略在每次分配之间（最近任务优先在求解匹配之前）调用 out_of_budget() 检查时间，
+超时即返回；assign_tasks 随后按待充电桶顺序为每辆车分配最近的空闲机器人，直到一方为空。
+scipy 的匹配求解本身不可中断，单次求解超出预算时只能在其结束后改用贪心补齐。
 
 用法示例：
     strategy = TaskStrategy(env, time_step=1.0, map_size='medium')
+    strategy = TaskStrategy(env, 1.0, 'large', sparse_k=8, sparse_threshold=100000)  # 超大园区的稀疏匹配
     strategy.update(strategy='nearest')
     strategy.update(strategy='genetic')
     strategy.update(strategy='hyper_heuristic')
+    strategy = TaskStrategy(env, 1.0, 'large', time_budget=0.005)  # 每步最多 5 毫秒
+    result = strategy.assign_tasks('genetic')  # {'budget_hit': ..., 'fallback_assigned': ..., ...}
+    strategy.summary()  # {'nearest': {'calls': ..., 'skipped': ..., 'assignments': ..., 'p50_ms': ..., ...}, ...}
+    # 注册新策略：函数以 TaskStrategy 实例为参数
+    @register_strategy('random')
+    def random_task(strategy):
+        ...
+    # 事件驱动模式：只在事件发生的时刻调用调度策略
+    while env.time < 28800:
+        strategy.update_event(strategy='nearest', until=28800)
 
 创建/维护者: 姚炜博、肖翔云（强化学习部分）
 最后修改: 2025-05-23
 版本: 1.0.0
 """
 
+# 策略名称 -> (函数, 是否需要 agent)，函数以 TaskStrategy 实例为第一个参数
+STRATEGY_REGISTRY = {}
+
+
+def register_strategy(name, requires_agent=False):
+    """
+    注册调度策略的装饰器
+    name: 策略名称，即 TaskStrategy.update(strategy=name) 中的名称，重复注册时覆盖
+    requires_agent: 为 True 时以 func(strategy, strategy.agent) 调用
+    """
+    def decorator(func):
+        STRATEGY_REGISTRY[name] = (func, requires_agent)
+        return func
+    return decorator
+
+
+class StrategyStats:
+    """
+    单个策略的运行统计
+    耗时直方图按 2 的幂划分：第 0 格为不足 1 微秒，第 k 格为 [2^(k-1), 2^k) 微秒，最后一格收纳更长的调用
+    """
+    N_BINS = 24  # 最后一格从约 4.2 秒开始
+
+    def __init__(self):
+        self.calls = 0  # 实际运行次数
+        self.skipped = 0  # 因环境无变化而跳过的次数
+        self.assignments = 0  # 分配的机器人-车辆对数（含超时后的贪心补齐）
+        self.budget_hits = 0  # 超出时间预算的次数
+        self.fallback_assignments = 0  # 超时后由贪心补齐的分配数
+        self.total_time = 0.0  # 累计耗时（秒）
+        self.max_time = 0.0  # 单次最大耗时（秒）
+        self.histogram = [0] * self.N_BINS
+
+    def record(self, elapsed, assignments):
+        """记录一次调用：耗时 elapsed（秒）与分配数"""
+        self.calls += 1
+        self.assignments += assignments
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.histogram[min(int(elapsed * 1e6).bit_length(), self.N_BINS - 1)] += 1
+
+    def percentile(self, q):
+        """
+        由直方图估计耗时分位数（秒），取所在格的上界
+        q: 0~100
+        """
+        if not self.calls:
+            return 0.0
+        rank = q / 100 * self.calls
+        count = 0
+        for k, n in enumerate(self.histogram):
+            count += n
+            if count >= rank and n:
+                return min(2 ** k * 1e-6, self.max_time)
+        return self.max_time
+
+    def summary(self):
+        total = self.calls + self.skipped
+        return {
+            'calls': self.calls,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / total if total else 0.0,
+            'assignments': self.assignments,
+            'budget_hits': self.budget_hits,
+            'fallback_assignments': self.fallback_assignments,
+            'total_s': self.total_time,
+            'mean_ms': self.total_time / self.calls * 1e3 if self.calls else 0.0,
+            'p50_ms': self.percentile(50) * 1e3,
+            'p95_ms': self.percentile(95) * 1e3,
+            'p99_ms': self.percentile(99) * 1e3,
+            'max_ms': self.max_time * 1e3,
+            'histogram_us': {(2 ** k if k < self.N_BINS - 1 else float('inf')): n
+                             for k, n in enumerate(self.histogram) if n},  # 格的上界（微秒）-> 次数
+        }
+
+
 class TaskStrategy:
-    def __init__(self, env, time_step, map_size='small', agent=None):
+    def __init__(self, env, time_step, map_size='small', agent=None, sparse_k=10, sparse_threshold=250000, time_budget=None):
         self.env = env
         self.time_step = time_step
         self.map_size = map_size
         self.agent = agent 
+        self.sparse_k = sparse_k  # 稀疏匹配时每个机器人（或车辆）保留的最近候选数
+        self.sparse_threshold = sparse_threshold  # 机器人数 × 车辆数不小于该值时，最近任务优先改用稀疏匹配
+        self.stats = {}  # 策略名称 -> StrategyStats
+        self._assigned = 0  # 累计分配次数，用于统计每次调用的分配数
+        self.time_budget = time_budget  # 每步调度的时间预算（秒），None 表示不限制
+        self._deadline = None  # 本次调度的截止时刻（time.perf_counter）
+        self._budget_hit = False
+        self.last_result = None  # 最近一次 assign_tasks 的结果
+        self.weights = None  # genetic_task 的评分权重，None 时按 map_size 使用预先优化的权重（GeneticOptimizer 评估个体时设置）
 
     def update(self, strategy='nearest'):
         """
         按时间步长更新调度与状态
         param :
-        strategy: 调度策略， 可选值为 'nearest', 'max_demand', 'max_priority', 'genetic', 'RL', 'multi_objective'
+        strategy: 调度策略， 可选值为 STRATEGY_REGISTRY 中注册的名称：'nearest', 'max_demand', 'max_priority', 'genetic', 'RL', 'hyper_heuristic'
         agent: Q表策略需要传入agent参数
         """
         # 先分配任务
-        if strategy == 'nearest':
-            self.nearest_task()
-        elif strategy == 'max_demand':
-            self.max_demand_task()
-        elif strategy == 'max_priority':
-            self.max_priority_task()
-        elif strategy == 'genetic':
-            self.genetic_task()
-        elif strategy == 'RL':
-            if self.agent is None:
-                raise ValueError("Q表策略需要传入agent参数")
-            self.q_table_task(self.agent)
-        elif strategy == 'hyper_heuristic':
-            self.hyper_heuristic_task()
-        else:
-            raise ValueError("Invalid strategy. Choose from available strategies.")
+        self.assign_tasks(strategy)
         # 更新环境状态
         self.env.update(self.time_step)
 
+    def update_event(self, strategy='nearest', max_step=None, until=None):
+        """
+        事件驱动模式：在当前决策点分配任务，然后把环境推进到下一个事件
+        max_step / until: 见 ParkEnv.advance_to_next_event
+        return: float, 本次推进的时长（秒）
+        """
+        self.assign_tasks(strategy)
+        return self.env.advance_to_next_event(max_step=max_step, until=until)
+
+    def assign_tasks(self, strategy='nearest'):
+        """
+        按策略名称为空闲机器人分配任务，不推进环境
+        上次调度后没有车辆进入待充电桶、也没有机器人变为空闲时（env.dispatch_dirty 为 False）跳过，计入跳过次数
+        设定 time_budget 时，策略超时后中断，剩余空闲机器人由贪心最近机器人分配补齐
+        return: dict, {'strategy', 'skipped', 'assigned', 'fallback_assigned', 'budget_hit', 'elapsed'}
+        """
+        entry = STRATEGY_REGISTRY.get(strategy)
+        if entry is None:
+            raise ValueError("Invalid strategy. Choose from available strategies.")
+        func, requires_agent = entry
+        if requires_agent and self.agent is None:
+            raise ValueError("Q表策略需要传入agent参数")
+
+        stats = self.stats.get(strategy)
+        if stats is None:
+            stats = self.stats[strategy] = StrategyStats()
+        env = self.env
+        if not getattr(env, 'dispatch_dirty', True):
+            stats.skipped += 1
+            self.last_result = {'strategy': strategy, 'skipped': True, 'assigned': 0, 'fallback_assigned': 0,
+                                'budget_hit': False, 'elapsed': 0.0}
+            return self.last_result
+        assigned = self._assigned
+        start = time.perf_counter()
+        self._deadline = start + self.time_budget if self.time_budget is not None else None
+        self._budget_hit = False
+        try:
+            if requires_agent:
+                func(self, self.agent)
+            else:
+                func(self)
+        finally:
+            self._deadline = None
+        fallback = 0
+        if self.time_budget is not None and (self._budget_hit or time.perf_counter() - start > self.time_budget):
+            self._budget_hit = True
+            fallback = self._greedy_fallback()
+        elapsed = time.perf_counter() - start
+        stats.record(elapsed, self._assigned - assigned)
+        if self._budget_hit:
+            stats.budget_hits += 1
+            stats.fallback_assignments += fallback
+        # 空闲机器人和待充电车辆都还有剩余时（策略有意保留），下一步仍需调度
+        env.dispatch_dirty = bool(env.needcharge_vehicles) and self._any_available()
+        self.last_result = {
+            'strategy': strategy,
+            'skipped': False,
+            'assigned': self._assigned - assigned,
+            'fallback_assigned': fallback,
+            'budget_hit': self._budget_hit,
+            'elapsed': elapsed,
+        }
+        return self.last_result
+
+    def out_of_budget(self):
+        """
+        本次调度的时间预算是否已用完，供策略在分配之间检查，返回 True 时策略应立即返回
+        未设定 time_budget 或不在 assign_tasks 中时总是 False
+        """
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            self._budget_hit = True
+            return True
+        return False
+
+    def _greedy_fallback(self):
+        """
+        超时后的贪心补齐：按待充电桶顺序（等待最久的在前）为每辆车分配最近的空闲机器人
+        return: int, 分配数
+        """
+        idle_robots = self._idle_robots()
+        count = 0
+        for vehicle in self.env.needcharge_vehicles:
+            if not idle_robots:
+                break
+            self._assign_nearest_robot(idle_robots, vehicle)
+            count += 1
+        return count
+
+    def summary(self):
+        """
+        各策略的运行统计
+        return: {策略名称: StrategyStats.summary()}，包括运行/跳过次数、分配数与耗时分位数（毫秒）
+        """
+        return {strategy: stats.summary() for strategy, stats in sorted(self.stats.items())}
+
+    def reset_stats(self):
+        """清空运行统计"""
+        self.stats = {}
+
+    @register_strategy('nearest')
     def nearest_task(self):
         """
         最近任务优先策略：为所有空闲机器人分配未服务车辆，使得总距离最小
         使用匈牙利算法求解最优分配
         """
         # 获取可用的机器人和车辆
-        available_robots = [r for r in self.env.robots if r.state == 'available']
+        available_robots, robot_coords = self._available_robots()
         vehicles = self.env.needcharge_vehicles
         
         # 如果没有可用资源，直接返回
         if not available_robots or not vehicles:
             return
         
-        # 构建成本矩阵（距离矩阵）
-        cost_matrix = []
-        for robot in available_robots:
-            row = []
-            for vehicle in vehicles:
-                # 计算欧氏距离作为成本
-                dist = ((robot.x - vehicle.parking_spot[0])**2 + 
-                    (robot.y - vehicle.parking_spot[1])**2)**0.5
-                row.append(dist)
-            cost_matrix.append(row)
-        
-        # 使用匈牙利算法求解最优分配
-        # 转换为numpy数组
-        cost_matrix = np.array(cost_matrix)
+        # 超大规模时只在 k 近邻候选上求最优匹配
+        if (min(len(available_robots), len(vehicles)) > 1 and
+                len(available_robots) * len(vehicles) >= self.sparse_threshold):
+            matched = self._sparse_nearest_assignment(available_robots)
+            if matched is not None:
+                vehicles, row_ind, col_ind = matched
+                for robot_idx, vehicle_idx in zip(row_ind, col_ind):
+                    self._assign(available_robots[robot_idx], vehicles[vehicle_idx])
+                return
+            if self.out_of_budget():
+                return
+
+        # 用 NumPy 广播构建成本矩阵（距离矩阵）
+        vehicles, cost_matrix = self._distance_matrix(available_robots, robot_coords)
+        if self.out_of_budget():
+            return
         
-        # 求解最小成本分配问题
-        row_ind, col_ind = linear_sum_assignment(cost_matrix)
+        # 分配结果立即执行，上一次的解不会保留到下一步：每步只有新空闲的机器人或新到达的车辆需要匹配，
+        # 绝大多数情况下只有一个机器人或一辆车，此时最优解就是该行（列）的最小值，无需求解完整的分配问题
+        if cost_matrix.shape[0] == 1:
+            row_ind, col_ind = [0], [int(cost_matrix[0].argmin())]
+        elif cost_matrix.shape[1] == 1:
+            row_ind, col_ind = [int(cost_matrix[:, 0].argmin())], [0]
+        else:
+            # 使用匈牙利算法求解最小成本分配问题
+            row_ind, col_ind = linear_sum_assignment(cost_matrix)
         
         # 根据分配结果执行任务分配
-        for i, robot_idx in enumerate(row_ind):
-            if i < len(col_ind):  # 确保有匹配的车辆
-                vehicle_idx = col_ind[i]
-                
-                # 确保索引有效
-                if robot_idx < len(available_robots) and vehicle_idx < len(vehicles):
-                    robot = available_robots[robot_idx]
-                    vehicle = vehicles[vehicle_idx]
-                    
-                    # 分配任务
-                    vehicle.set_state('charging')
-                    robot.assign_task(vehicle)
-                    
-                    # 从待充电列表移动到充电列表 TODO
-                    if vehicle in self.env.needcharge_vehicles:
-                        self.env.needcharge_vehicles.remove(vehicle)
-                        self.env.charging_vehicles.append(vehicle)
+        for robot_idx, vehicle_idx in zip(row_ind, col_ind):
+            self._assign(available_robots[robot_idx], vehicles[vehicle_idx])
                     
+    def _sparse_nearest_assignment(self, robots):
+        """
+        稀疏最近任务优先：较少一方的每个成员只与距离最近的 k 个对象连边，求最小总距离的完整匹配
+        候选由空间索引的 k 近邻查询直接给出，只计算候选边的距离，不构造稠密距离矩阵；候选图不存在完整匹配时 k 加倍重试
+        robots: 可用机器人列表，对应匹配的行
+        return: (车辆列表, 机器人下标, 车辆下标)；k 已覆盖全部候选仍无法匹配时返回 None，由调用方退回稠密求解
+        """
+        spatial = self.env.spatial
+        spatial.sync_robots(self.env.robots)
+        vehicles = list(self.env.needcharge_vehicles)
+        # 让较少的一方发起查询，在另一方的索引中取 k 个最近候选
+        by_robot = len(robots) <= len(vehicles)
+        if by_robot:
+            queries = [(robot.x, robot.y) for robot in robots]
+            index, targets = spatial.vehicles, vehicles
+        else:
+            queries = [car.parking_spot for car in vehicles]
+            index, targets = spatial.robots, robots
+        # 位置相同的查询方共用一次查询（如都停在起点的机器人），候选数不少于该位置的成员数，否则必然无法完整匹配；
+        # 位置相同的候选一并连边，避免距离相同时总是截取序号最小的同一批对象
+        groups = {}
+        for i, point in enumerate(queries):
+            groups.setdefault(point, []).append(i)
+        lookup = {item: j for j, item in enumerate(targets)}
+        peers = {}
+        for j, item in enumerate(targets):
+            peers.setdefault(index.position(item), []).append(j)
+        n_cols = len(targets)
+        k = min(self.sparse_k, n_cols)
+        while True:
+            if self.out_of_budget():
+                return None
+            rows, cols, weights = [], [], []
+            for (x, y), members in groups.items():
+                edges = {}
+                for distance, item in index.nearest(x, y, max(k, len(members))):
+                    if item in lookup:
+                        for j in peers[index.position(item)]:
+                            # 稀疏矩阵中权重为 0 的边视为不存在，统一加 1；完整匹配的边数固定，不改变最优解
+                            edges[j] = distance + 1
+                for i in members:
+                    rows.extend([i] * len(edges))
+                    cols.extend(edges.keys())
+                    weights.extend(edges.values())
+            if not by_robot:
+                rows, cols = cols, rows
+            graph = csr_matrix((weights, (rows, cols)), shape=(len(robots), len(vehicles)))
+            try:
+                row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+                return vehicles, row_ind, col_ind
+            except ValueError:
+                # 候选图不存在完整匹配
+                if k >= n_cols:
+                    return None
+                k = min(2 * k, n_cols)
+
+    @register_strategy('max_demand')
     def max_demand_task(self):
         """
         最大任务优先策略：为电量缺口最大的未服务车辆分配最近的空闲机器人
@@ -129,41 +379,24 @@ class TaskStrategy:
         # 记录已分配的机器人和车辆
         assigned_robots = set()
         assigned_vehicles = set()
+        idle_robots = self._idle_robots()
         
         # 为每辆高需求车辆分配最近的机器人
         for vehicle in prioritized_vehicles:
-            # 找到距离该车辆最近的空闲机器人
-            min_dist = float('inf')
-            closest_robot = None
-            
-            for robot in self.env.robots:
-                if robot.state == 'available' and robot not in assigned_robots:
-                    # 计算距离
-                    dist = ((robot.x - vehicle.parking_spot[0])**2 + 
-                        (robot.y - vehicle.parking_spot[1])**2)**0.5
-                    
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_robot = robot
-            
-            # 如果找到适合的机器人，分配任务
+            if self.out_of_budget():
+                break
+            # 空间索引查询距离该车辆最近的空闲机器人
+            closest_robot = self._assign_nearest_robot(idle_robots, vehicle)
             if closest_robot:
-                vehicle.set_state('charging')
-                closest_robot.assign_task(vehicle)
-                
                 # 标记已分配
                 assigned_robots.add(closest_robot)
                 assigned_vehicles.add(vehicle)
-                
-                # 从待充电车辆列表移到充电车辆列表
-                if vehicle in self.env.needcharge_vehicles:
-                    self.env.needcharge_vehicles.remove(vehicle)
-                    self.env.charging_vehicles.append(vehicle)
             
             # 如果没有空闲机器人了，结束分配
-            if len(assigned_robots) >= len([r for r in self.env.robots if r.state == 'available']):
+            if len(assigned_robots) >= len(idle_robots):
                 break
 
+    @register_strategy('max_priority')
     def max_priority_task(self):
         """
         最大任务优先策略：为电量缺口/离开时间最大的未服务车辆分配最近的空闲机器人
@@ -180,44 +413,45 @@ class TaskStrategy:
         # 记录已分配的机器人和车辆
         assigned_robots = set()
         assigned_vehicles = set()
+        idle_robots = self._idle_robots()
         
         # 遍历高优先级的车辆
         for _, vehicle in prioritized_vehicles:
             if vehicle in assigned_vehicles:
                 continue
+            if self.out_of_budget():
+                break
                 
-            # 找到距离该车辆最近的空闲机器人
-            min_dist = float('inf')
-            closest_robot = None
-            
-            for robot in self.env.robots:
-                if robot.state == 'available' and robot not in assigned_robots:
-                    # 计算距离
-                    dist = ((robot.x - vehicle.parking_spot[0])**2 + 
-                            (robot.y - vehicle.parking_spot[1])**2)**0.5
-                    
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_robot = robot
-            
-            # 如果找到适合的机器人，分配任务
+            # 空间索引查询距离该车辆最近的空闲机器人
+            closest_robot = self._assign_nearest_robot(idle_robots, vehicle)
             if closest_robot:
-                vehicle.set_state('charging')
-                closest_robot.assign_task(vehicle)
-                
                 # 标记已分配
                 assigned_robots.add(closest_robot)
                 assigned_vehicles.add(vehicle)
-                
-                # 从待充电车辆列表移到充电车辆列表
-                if vehicle in self.env.needcharge_vehicles:
-                    self.env.needcharge_vehicles.remove(vehicle)
-                    self.env.charging_vehicles.append(vehicle)
             
             # 如果没有空闲机器人了，结束分配
-            if len(assigned_robots) >= len([r for r in self.env.robots if r.state == 'available']):
+            if len(assigned_robots) >= len(idle_robots):
                 break
 
+    def _idle_robots(self):
+        """同步并返回环境中空闲机器人的空间索引"""
+        self.env.spatial.sync_robots(self.env.robots)
+        return self.env.spatial.robots
+
+    def _assign_nearest_robot(self, idle_robots, vehicle):
+        """
+        把距离 vehicle 最近的空闲机器人分配给它，距离相同时取 env.robots 中靠前的机器人
+        return: 分配的机器人，没有空闲机器人时返回 None
+        """
+        nearest = idle_robots.nearest(*vehicle.parking_spot)
+        if not nearest:
+            return None
+        _, robot = nearest[0]
+        self._assign(robot, vehicle)
+        idle_robots.remove(robot)
+        return robot
+
+    @register_strategy('genetic')
     def genetic_task(self):
         """
         使用遗传算法优化过的参数进行多目标任务分配
@@ -242,132 +476,143 @@ class TaskStrategy:
             }
         }
         
-        # 根据当前地图大小确定使用的权重
+        # 根据当前地图大小确定使用的权重；显式设置了 self.weights 时优先使用
         map_size = self.map_size
-        weights = optimized_weights.get(map_size, optimized_weights['medium'])  # 默认使用中等地图权重
+        weights = self.weights or optimized_weights.get(map_size, optimized_weights['medium'])  # 默认使用中等地图权重
         
         # 获取可用机器人和需要服务的车辆
-        available_robots = [r for r in self.env.robots if r.state == 'available']
+        available_robots, robot_coords = self._available_robots()
         
         # 如果没有可用资源，直接返回
         if not available_robots or not self.env.needcharge_vehicles:
             return
         
-        # 计算每辆车的紧急度指标 (电量缺口/离开时间)
-        urgency_scores = {}
-        for vehicle in self.env.needcharge_vehicles:
-            urgency = vehicle.battery_gap / max(0.1, vehicle.departure_time)
-            urgency_scores[vehicle] = urgency
-        
-        # 最大和最小值，用于标准化
-        max_urgency = max(urgency_scores.values()) if urgency_scores else 1
-               
-        # 为每个机器人-车辆对计算综合分数
-        assignments = []
-        
-        for robot in available_robots:
-            for vehicle in self.env.needcharge_vehicles:
-                # 计算因素并标准化到0-1范围
-
-                # 2. 紧急程度 - 越紧急越优先
-                urgency_score = urgency_scores[vehicle] / max_urgency
-                
-                # 3. 距离 - 越近越好（转换为1-距离的比例）
-                distance = ((robot.x - vehicle.parking_spot[0])**2 + 
-                        (robot.y - vehicle.parking_spot[1])**2)**0.5
-                max_possible_dist = ((self.env.park_size[0])**2 + (self.env.park_size[1])**2)**0.5
-                distance_score = 1 - (distance / max_possible_dist)
-                
-                # 4. 机器人电量 - 越高越好
-                robot_energy_score = robot.battery.soc / 100
- 
-                # 综合评分，使用优化过的权重
-                final_score = (
-                    weights['urgency'] * urgency_score +
-                    weights['distance'] * distance_score +
-                    weights['robot_energy'] * robot_energy_score
-                )
-                
-                # 存储评分和对应的机器人-车辆对
-                assignments.append((final_score, robot, vehicle))
-        
-        # 按分数从高到低排序
-        assignments = sorted(assignments, key=lambda x: x[0], reverse=True)
-        
-        # 记录已分配的资源
-        assigned_robots = set()
-        assigned_vehicles = set()
+        # 评分矩阵：行为可用机器人，列为待充电车辆
+        vehicles, scores = self._score_matrix(available_robots, weights, robot_coords)
         
-        # 执行分配
-        for score, robot, vehicle in assignments:
-            # 如果机器人或车辆已被分配，跳过
-            if robot in assigned_robots or vehicle in assigned_vehicles:
-                continue
-                
-            # 执行分配
-            vehicle.set_state('charging')
-            robot.assign_task(vehicle)
-            
-            # 标记为已分配
-            assigned_robots.add(robot)
-            assigned_vehicles.add(vehicle)
-            
-            # 更新环境中的车辆列表
-            if vehicle in self.env.needcharge_vehicles:
-                self.env.needcharge_vehicles.remove(vehicle)
-                self.env.charging_vehicles.append(vehicle)
-            
-            # 如果所有机器人都已分配，结束
-            if len(assigned_robots) >= len(available_robots):
+        # 贪心分配：每次取全局最高分的一对，再屏蔽该机器人所在行和车辆所在列。
+        # argmax 在分数相同时返回按 (机器人, 车辆) 顺序最靠前的一对，与对全部配对稳定排序后贪心分配的结果相同
+        for _ in range(min(len(available_robots), len(vehicles))):
+            if self.out_of_budget():
                 break
+            robot_idx, vehicle_idx = np.unravel_index(scores.argmax(), scores.shape)
+            self._assign(available_robots[robot_idx], vehicles[vehicle_idx])
+            scores[robot_idx, :] = -np.inf
+            scores[:, vehicle_idx] = -np.inf
+
+    def _available_robots(self):
+        """
+        空闲机器人列表及其坐标数组 (n, 2)，顺序与 env.robots 相同
+        结构数组后端（env.robot_arrays）直接按状态列筛选并读取坐标列，不逐个访问代理属性
+        """
+        robots = self.env.robots
+        arrays = getattr(self.env, 'robot_arrays', None)
+        if arrays is not None:
+            index = np.flatnonzero(arrays.state == R_AVAILABLE)
+            return [robots[i] for i in index], np.column_stack((arrays.x[index], arrays.y[index]))
+        available = [robot for robot in robots if robot.state == 'available']
+        return available, np.array([(robot.x, robot.y) for robot in available], dtype=float).reshape(-1, 2)
+
+    def _any_available(self):
+        """是否有空闲机器人"""
+        arrays = getattr(self.env, 'robot_arrays', None)
+        if arrays is not None:
+            return bool(np.count_nonzero(arrays.state == R_AVAILABLE))
+        return any(robot.state == 'available' for robot in self.env.robots)
+
+    def _distance_matrix(self, robots, robot_coords=None):
+        """
+        用 NumPy 广播构造机器人到待充电车辆的距离矩阵，车辆坐标取自空间索引的缓存列
+        robots: 机器人列表，对应矩阵的行
+        robot_coords: 机器人坐标数组 (n, 2)，None 时从 robots 读取
+        return: (车辆列表, 距离矩阵 (机器人数, 车辆数))，车辆顺序与 env.needcharge_vehicles 相同
+        """
+        vehicles, coords, _ = self.env.spatial.vehicle_columns()
+        if robot_coords is None:
+            robot_coords = np.array([(robot.x, robot.y) for robot in robots], dtype=float).reshape(-1, 2)
+        dx = robot_coords[:, 0:1] - coords[:, 0]
+        dy = robot_coords[:, 1:2] - coords[:, 1]
+        return vehicles, (dx ** 2 + dy ** 2) ** 0.5
+
+    def _urgency(self, vehicles, gaps):
+        """紧急度向量：电量缺口 / 离开时间（离开时间下限 0.1 秒，防止除以0）"""
+        departure = np.fromiter((vehicle.departure_time for vehicle in vehicles), dtype=float, count=len(vehicles))
+        return gaps / np.maximum(0.1, departure)
+
+    def _score_matrix(self, robots, weights, robot_coords=None):
+        """
+        多目标评分矩阵：紧急度、距离和机器人电量的加权和
+        weights: {'urgency', 'distance', 'robot_energy'} 权重，缺少的项按 0 计
+        robot_coords: 见 _distance_matrix
+        return: (车辆列表, 评分矩阵 (机器人数, 车辆数))
+        """
+        vehicles, distance = self._distance_matrix(robots, robot_coords)
+        _, _, gaps = self.env.spatial.vehicle_columns()
+        urgency = self._urgency(vehicles, gaps)
+        max_possible_dist = ((self.env.park_size[0])**2 + (self.env.park_size[1])**2)**0.5
+        # 紧急程度 - 越紧急越优先
+        urgency_score = urgency / urgency.max()
+        # 距离 - 越近越好（转换为1-距离的比例）
+        distance_score = 1 - distance / max_possible_dist
+        # 机器人电量 - 越高越好
+        robot_energy_score = np.array([robot.battery.soc for robot in robots], dtype=float) / 100
+        return vehicles, (
+            weights.get('urgency', 0) * urgency_score +
+            weights.get('distance', 0) * distance_score +
+            (weights.get('robot_energy', 0) * robot_energy_score)[:, None]
+        )
+
+    def _assign(self, robot, vehicle):
+        """执行一次分配，并把车辆移入充电桶"""
+        self._assigned += 1
+        vehicle.set_state('charging')
+        robot.assign_task(vehicle)
+        self.env.vehicles.transition(vehicle, 'charging')
     
+    @register_strategy('RL', requires_agent=True)
     def q_table_task(self, agent):
 
         """
         基于Q表的推理分配策略：每步直接选择Q值最大的动作（机器人-车辆对）
+        动作 robot_idx * max_vehicles + car_idx 的Q值排成 (机器人数, max_vehicles) 的矩阵，
+        不可用的机器人整行屏蔽，超出待充电车辆数的列不参与选择，贪心选择与屏蔽都在 NumPy 中完成
         """
-        state = self.env.get_status()
-        state_idx = agent.discretize_state(state)
-        assigned_robots = set()
-        assigned_vehicles = set()
+        # 状态特征由 agent 直接从环境读取，无需构造 get_status() 字典
+        state_idx = agent.discretize_state(None)
+        robots = self.env.robots
+        max_vehicles = self.env.max_vehicles
 
-        # 动作空间大小 = 机器人数量 * 最大车辆数
-        for _ in range(len(self.env.robots)):
-            # 获取当前状态下所有动作的Q值
-            q_values = agent.q_table[state_idx].copy()
-
-            # 屏蔽已分配的机器人和车辆的动作
-            for action in range(len(q_values)):
-                robot_idx = action // self.env.max_vehicles
-                car_idx = action % self.env.max_vehicles
-                if (robot_idx >= len(self.env.robots) or
-                    car_idx >= len(self.env.needcharge_vehicles) or
-                    self.env.robots[robot_idx] in assigned_robots or
-                    self.env.needcharge_vehicles[car_idx] in assigned_vehicles or
-                    self.env.robots[robot_idx].state != "available" or
-                    self.env.needcharge_vehicles[car_idx].state != "needcharge"):
-                    q_values[action] = -float('inf')  # 使其不会被选中
-
-            # 选择Q值最大的动作
-            best_action = q_values.argmax()
-            if q_values[best_action] == -float('inf'):
-                break  # 没有可用动作
+        # 当前状态下所有动作的Q值，动作空间之外的位置视为不可选
+        q_values = np.full((len(robots), max_vehicles), -np.inf)
+        actions = agent.q_table[state_idx][:q_values.size]
+        q_values.flat[:len(actions)] = actions
+        # 屏蔽非空闲机器人的动作，结构数组后端直接比较状态列
+        arrays = getattr(self.env, 'robot_arrays', None)
+        if arrays is not None:
+            available = arrays.state == R_AVAILABLE
+        else:
+            available = np.fromiter((robot.state == "available" for robot in robots), dtype=bool, count=len(robots))
+        q_values[~available] = -np.inf
 
-            robot_idx = best_action // self.env.max_vehicles
-            car_idx = best_action % self.env.max_vehicles
-            robot = self.env.robots[robot_idx]
-            car = self.env.needcharge_vehicles[car_idx]
+        for _ in range(len(robots)):
+            if self.out_of_budget():
+                break
+            # 已分配的车辆移出待充电桶，动作中的车辆下标对应当前待充电车辆列表
+            n_waiting = min(len(self.env.needcharge_vehicles), max_vehicles)
+            if n_waiting == 0:
+                break
+            candidates = q_values[:, :n_waiting]
+            # 选择Q值最大的动作，Q值相同时取动作编号最小者
+            robot_idx, car_idx = divmod(int(candidates.argmax()), n_waiting)
+            if candidates[robot_idx, car_idx] == -np.inf:
+                break  # 没有可用动作
 
-            # 分配任务
-            car.set_state('charging')
-            robot.assign_task(car)
-            assigned_robots.add(robot)
-            assigned_vehicles.add(car)
-            if car in self.env.needcharge_vehicles:
-                self.env.needcharge_vehicles.remove(car)
-                self.env.charging_vehicles.append(car)
+            # 分配任务，并屏蔽该机器人
+            self._assign(robots[robot_idx], self.env.needcharge_vehicles[car_idx])
+            q_values[robot_idx] = -np.inf
 
     # TODO：未完善
+    @register_strategy('hyper_heuristic')
     def hyper_heuristic_task(self):
         """
         超启发式策略选择：根据环境状态动态选择最合适的底层调度策略
@@ -0,0 +1,306 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from modules.array_env import (RobotArrays, CarArrays, BatteryArrays, step_park, release_robots, swap_battery,
+                               refresh_charge_segment, R_AVAILABLE, R_GOCAR, R_NEEDSWAP, R_SWAPPING, C_NEEDCHARGE, C_CHARGING, C_COMPLETED, C_FAILED)
+
+"""
+批量园区环境模块 (VecParkEnv Module)
+====================================
+本模块把 N 个相互独立、参数相同的园区放进同一组结构数组，按锁步（lockstep）方式整体推进，
+用于强化学习训练、遗传算法适应度评估和多次重复评测等需要大量独立仿真的场景。
+
+主要功能：
+- VecParkEnv：机器人数组形状为 (N, R)，车辆槽位为 (N, V)，电池站电池为 (N, B)，复用 array_env 的向量化内核
+- 每个时间步接收一批任务分配（每个机器人一个目标车辆槽位），一次推进所有园区
+- 返回按园区堆叠的状态数组与评测指标（平均等待时间、成功率）
+- nearest_assignments：逐园区的匈牙利算法最近分配，便于批量评测 nearest 策略
+- weighted_assignments：逐园区的多目标贪心分配，每个园区可使用不同的权重，供 GeneticOptimizer 批量评估种群
+- needcharge_slots / state_features / last_leaving：QLearningAgent.train_vec 批量训练所需的动作下标、状态特征与离场车辆
+
+设计说明：
+车辆槽位在扁平数组中按园区连续排列，机器人通过 slot_base = 园区编号 × V 定位自己园区的车辆，
+因此融合内核 step_park 无需修改即可处理二维数组。换电队列用入队序号表示，
+每轮为每个园区处理一个最早入队的待换电机器人，轮数等于单个园区内同时待换电的机器人数。
+车辆生成使用环境自带的 np.random.Generator，分布与 Car 相同，但随机数序列与单环境 ParkEnv 不逐一对应。
+离场车辆不保留对象，只累计完成数、失败数与等待时间。
+
+用法示例：
+    vec_env = VecParkEnv(n_envs=64, park_size=(100, 100), n_robots=4, n_vehicles=10, n_batteries=3, time_step=10, generate_vehicles_probability=0.003056, seed=0)
+    for _ in range(2880):
+        vec_env.step(vec_env.nearest_assignments())
+    avg_wait, success_rate = vec_env.get_metrics()
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+
+class VecParkEnv:
+    """
+    N 个园区的批量环境
+    n_envs: 园区数量
+    其余参数与 ParkEnv 相同；seed: 车辆生成随机数种子
+    """
+    def __init__(self, n_envs, park_size, n_robots, n_vehicles, n_batteries, time_step, generate_vehicles_probability, seed=None):
+        self.n_envs = n_envs
+        self.park_size = park_size
+        self.n_robots = n_robots
+        self.n_batteries = n_batteries
+        self.max_vehicles = n_vehicles
+        self.generate_vehicles_probability = generate_vehicles_probability * time_step
+        self.time = 0
+        self.time_step = time_step
+        self.rng = np.random.default_rng(seed)
+
+        home_x, home_y = park_size[0] / 2, park_size[1] / 2
+        slot_base = (np.arange(n_envs) * n_vehicles)[:, None]
+        self.robot_arrays = RobotArrays((n_envs, n_robots), home_x=home_x, home_y=home_y, slot_base=slot_base)
+        self.car_arrays = CarArrays((n_envs, n_vehicles))
+        self.battery_arrays = BatteryArrays((n_envs, n_batteries), capacity=200, soc=100, voltage=800)
+        self._queue_seq = np.zeros((n_envs, n_robots), dtype=np.int64)  # 换电队列入队序号
+        self._queue_clock = 0
+
+        # 每个园区的统计量
+        self.vehicles_index = np.ones(n_envs, dtype=np.int64)
+        self.completed_num = np.zeros(n_envs, dtype=np.int64)
+        self.failed_num = np.zeros(n_envs, dtype=np.int64)
+        self.departed_waittime = np.zeros(n_envs)  # 已离场车辆的等待时间之和
+        self.last_leaving = np.zeros((n_envs, n_vehicles), dtype=bool)  # 上一步离场的槽位，数据保留到下一步生成车辆前
+
+    def random_generate_vehicles(self, probability):
+        """每个园区独立按概率生成一辆车，放入该园区第一个空槽位"""
+        cars = self.car_arrays
+        spawn = (self.rng.random(self.n_envs) < probability) & (cars.active.sum(axis=1) < self.max_vehicles)
+        envs = np.flatnonzero(spawn)
+        if not len(envs):
+            return
+        slots = (~cars.active[envs]).argmax(axis=1)
+        index = (envs, slots)
+        n, rng = len(envs), self.rng
+        cars.departure_time[index] = np.clip(rng.normal(60, 10, n), 40, 100).astype(int) * 60
+        cars.x[index] = rng.integers(0, self.park_size[0] + 1, n)
+        cars.y[index] = rng.integers(0, self.park_size[1] + 1, n)
+        cars.voltage[index] = rng.choice([400, 800], n)
+        cars.capacity[index] = np.clip(rng.normal(90, 10, n), 65, 115)
+        cars.soc[index] = np.clip(rng.normal(15, 10, n), 0, 64)
+        cars.required_soc[index] = np.clip(rng.normal(80, 10, n), 65, 100)
+        cars.battery_gap[index] = (cars.required_soc[index] - cars.soc[index]) * cars.capacity[index] / 100
+        cars.battery_full[index] = False
+        refresh_charge_segment(cars, index)
+        cars.time[index] = 0
+        cars.waittime[index] = 0
+        cars.state[index] = C_NEEDCHARGE
+        cars.listed[index] = C_NEEDCHARGE
+        cars.enter_bucket(envs * self.max_vehicles + slots)
+        cars.id[index] = self.vehicles_index[envs]
+        cars.active[index] = True
+        self.vehicles_index[envs] += 1
+
+    def assign(self, targets):
+        """
+        批量分配任务
+        targets: (N, R) 整数数组，每个机器人的目标车辆槽位，-1 表示不分配
+        只有空闲机器人与待充电车辆的组合会生效，同一车辆被多次分配时只保留第一个机器人
+        return: np.ndarray, 每个园区生效的分配数
+        """
+        robots, cars = self.robot_arrays, self.car_arrays
+        targets = np.asarray(targets)
+        slots = np.maximum(targets, 0)
+        env_index = np.broadcast_to(np.arange(self.n_envs)[:, None], targets.shape)
+        valid = (targets >= 0) & (robots.state == R_AVAILABLE)
+        valid &= cars.active[env_index, slots] & (cars.state[env_index, slots] == C_NEEDCHARGE)
+        if not valid.any():
+            return np.zeros(self.n_envs, dtype=np.int64)
+        # 同一园区内重复的目标只保留编号最小的机器人
+        flat = (env_index * self.max_vehicles + slots)[valid]
+        _, first = np.unique(flat, return_index=True)
+        keep = np.zeros(len(flat), dtype=bool)
+        keep[first] = True
+        valid[valid] = keep
+
+        robots.target[valid] = targets[valid]
+        robots.released[valid] = False
+        robots.state[valid] = R_GOCAR
+        cars.state[env_index[valid], slots[valid]] = C_CHARGING
+        cars.enter_bucket(env_index[valid] * self.max_vehicles + slots[valid])
+        return valid.sum(axis=1)
+
+    def step(self, targets=None):
+        """
+        先应用本步的批量分配，再推进所有园区一个时间步
+        targets: 见 assign，None 表示本步不分配
+        """
+        if targets is not None:
+            self.assign(targets)
+        self.update(self.time_step)
+
+    def update(self, time_step):
+        """与 ArrayParkEnv.update 相同的顺序推进所有园区"""
+        self.time += self.time_step
+        self.random_generate_vehicles(self.generate_vehicles_probability)
+
+        robots = self.robot_arrays
+        needswap = robots.state == R_NEEDSWAP
+        if needswap.any():
+            new = needswap & ~robots.queued
+            self._queue_seq = np.where(new, self._queue_clock + np.arange(self.n_robots), self._queue_seq)
+            self._queue_clock += self.n_robots
+            robots.queued |= needswap
+            robots.state[needswap] = R_SWAPPING
+
+        leaving = step_park(robots, self.car_arrays, self.battery_arrays, time_step, swap=self._swap_batteries)
+        if leaving.any():
+            self._release_vehicles(leaving)
+        self.last_leaving = leaving
+
+    def _release_vehicles(self, leaving):
+        """统计本步离场车辆并释放其槽位"""
+        cars = self.car_arrays
+        self.completed_num += (leaving & (cars.state == C_COMPLETED)).sum(axis=1)
+        self.failed_num += (leaving & (cars.state == C_FAILED)).sum(axis=1)
+        self.departed_waittime += np.where(leaving, cars.waittime, 0).sum(axis=1)
+        release_robots(self.robot_arrays, leaving)
+        cars.active[leaving] = False
+
+    def _swap_batteries(self):
+        """按入队顺序为各园区待换电的机器人换电，每轮每个园区处理一个机器人"""
+        robots, batteries = self.robot_arrays, self.battery_arrays
+        if not self.n_batteries:
+            return
+        pending = robots.queued & (robots.state == R_NEEDSWAP)
+        rows = np.arange(self.n_envs)
+        while pending.any():
+            order = np.where(pending, self._queue_seq, np.iinfo(np.int64).max)
+            robot = order.argmin(axis=1)
+            has = pending[rows, robot]
+            best = batteries.soc.argmax(axis=1)
+            best_soc = batteries.soc[rows, best]
+            ok = has & (best_soc > robots.soc[rows, robot]) & (best_soc > 50)
+            if ok.any():
+                swap_battery(robots, (rows[ok], robot[ok]), batteries, (rows[ok], best[ok]))
+            pending[rows[has], robot[has]] = False
+
+    def nearest_assignments(self):
+        """
+        逐园区用匈牙利算法求空闲机器人到待充电车辆的最小总距离分配（与 TaskStrategy.nearest_task 相同）
+        return: (N, R) 目标槽位数组，可直接传给 step / assign
+        """
+        robots, cars = self.robot_arrays, self.car_arrays
+        targets = np.full((self.n_envs, self.n_robots), -1, dtype=np.int64)
+        available = robots.state == R_AVAILABLE
+        waiting = cars.active & (cars.state == C_NEEDCHARGE)
+        busy = np.flatnonzero(available.any(axis=1) & waiting.any(axis=1))
+        if not len(busy):
+            return targets
+        distance = np.hypot(robots.x[busy, :, None] - cars.x[busy, None, :], robots.y[busy, :, None] - cars.y[busy, None, :])
+        for k, env in enumerate(busy):
+            robot_index = np.flatnonzero(available[env])
+            slot_index = np.flatnonzero(waiting[env])
+            rows, cols = linear_sum_assignment(distance[k][np.ix_(robot_index, slot_index)])
+            targets[env, robot_index[rows]] = slot_index[cols]
+        return targets
+
+    def weighted_assignments(self, weights):
+        """
+        逐园区的多目标贪心分配，评分与 TaskStrategy.genetic_task 相同（紧急度、距离、机器人电量的加权和），
+        每轮所有园区同时取本园区最高分的一对并屏蔽其所在行列；分数相同时取 (机器人, 槽位) 顺序最靠前的一对
+        weights: {'urgency', 'distance', 'robot_energy'}，每项为标量或 (N,) 数组（每个园区一组权重），缺少的项按 0 计
+        return: (N, R) 目标槽位数组，可直接传给 step / assign
+        """
+        robots, cars = self.robot_arrays, self.car_arrays
+        targets = np.full((self.n_envs, self.n_robots), -1, dtype=np.int64)
+        available = robots.state == R_AVAILABLE
+        waiting = cars.active & (cars.state == C_NEEDCHARGE)
+        # 只为同时有空闲机器人和待充电车辆的园区构造评分矩阵
+        busy = np.flatnonzero(available.any(axis=1) & waiting.any(axis=1))
+        if not len(busy):
+            return targets
+
+        def weight(key):
+            value = np.asarray(weights.get(key, 0), dtype=float)
+            return (value[busy] if value.ndim else value).reshape(-1, 1, 1)
+
+        waiting = waiting[busy]
+        urgency = np.where(waiting, cars.battery_gap[busy] / np.maximum(0.1, cars.departure_time[busy]), 0)
+        urgency_score = urgency / urgency.max(axis=1, keepdims=True)
+        x, y, soc = robots.x[busy], robots.y[busy], robots.soc[busy]
+        distance = np.hypot(x[:, :, None] - cars.x[busy, None, :], y[:, :, None] - cars.y[busy, None, :])
+        max_possible_dist = np.hypot(*self.park_size)
+        scores = (weight('urgency') * urgency_score[:, None, :] +
+                  weight('distance') * (1 - distance / max_possible_dist) +
+                  weight('robot_energy') * (soc / 100)[:, :, None])
+        scores[~(available[busy][:, :, None] & waiting[:, None, :])] = -np.inf
+
+        n_slots = self.max_vehicles
+        rows = np.arange(len(busy))
+        flat = scores.reshape(len(busy), -1)
+        rounds = np.minimum(available[busy].sum(axis=1), waiting.sum(axis=1)).max()
+        for _ in range(rounds):
+            best = flat.argmax(axis=1)
+            found = flat[rows, best] > -np.inf
+            k, (robot, slot) = rows[found], np.divmod(best[found], n_slots)
+            targets[busy[k], robot] = slot
+            scores[k, robot, :] = -np.inf
+            scores[k, :, slot] = -np.inf
+        return targets
+
+    def needcharge_slots(self):
+        """
+        每个园区待充电车辆的槽位，按进入待充电状态的先后排列（机器人中途回站的车辆排在末尾），
+        与 ParkEnv.needcharge_vehicles 中的车辆顺序相同，即 Q 表动作中车辆下标的含义
+        return: (N, V) 槽位数组，待充电车辆不足 V 辆的位置为 -1
+        """
+        cars = self.car_arrays
+        waiting = cars.active & (cars.state == C_NEEDCHARGE)
+        order = np.argsort(np.where(waiting, cars.bucket_seq, np.iinfo(np.int64).max), axis=1, kind='stable')
+        return np.where(np.take_along_axis(waiting, order, axis=1), order, -1)
+
+    def state_features(self):
+        """
+        每个园区的状态特征，口径与 QLearningAgent.state_features 相同：
+        机器人平均电量、待充电车辆平均电量、平均电量缺口（kWh）、平均剩余时间（秒），各项先截断为整数再取平均并截断
+        return: (N, 4) 整数数组，没有待充电车辆的园区车辆特征为 0
+        """
+        cars = self.car_arrays
+        waiting = cars.active & (cars.state == C_NEEDCHARGE)
+        count = waiting.sum(axis=1)
+        features = np.zeros((self.n_envs, 4), dtype=np.int64)
+        features[:, 0] = np.trunc(self.robot_arrays.soc).mean(axis=1)
+        for column, values in enumerate((cars.soc, cars.battery_gap, cars.departure_time), start=1):
+            total = np.where(waiting, np.trunc(values), 0).sum(axis=1)
+            features[:, column] = np.divide(total, count, out=np.zeros(self.n_envs), where=count > 0)
+        return features
+
+    def get_status(self):
+        """
+        返回按园区堆叠的状态数组
+        """
+        robots, cars = self.robot_arrays, self.car_arrays
+        return {
+            "time": self.time,
+            "robots_x": robots.x.copy(),
+            "robots_y": robots.y.copy(),
+            "robots_state": robots.state.copy(),
+            "robots_soc": robots.soc.copy(),
+            "completed_vehicles_num": self.completed_num.copy(),
+            "failed_vehicles_num": self.failed_num.copy(),
+            "needcharge_vehicles_num": (cars.active & (cars.state == C_NEEDCHARGE)).sum(axis=1),
+            "charging_vehicles_num": (cars.active & (cars.state == C_CHARGING)).sum(axis=1),
+            "battery_station": self.battery_arrays.soc.copy()
+        }
+
+    def get_metrics(self):
+        """
+        每个园区的平均等待时间与成功率，口径与 utils/val_multithread.single_run 相同：
+        等待时间统计充电中、已完成和失败的车辆，成功率 = 完成数 / (完成数 + 失败数)
+        return: (avg_wait, success_rate)，形状均为 (N,)
+        """
+        cars = self.car_arrays
+        charging = cars.active & (cars.state == C_CHARGING)
+        count = self.completed_num + self.failed_num + charging.sum(axis=1)
+        wait = self.departed_waittime + np.where(charging, cars.waittime, 0).sum(axis=1)
+        avg_wait = np.divide(wait, count, out=np.zeros(self.n_envs), where=count > 0)
+        total = self.completed_num + self.failed_num
+        success_rate = np.divide(self.completed_num, total, out=np.zeros(self.n_envs), where=total > 0)
+        return avg_wait, success_rate
@@ -0,0 +1,168 @@
+"""
+车辆登记模块 (Vehicle Registry Module)
+======================================
+本模块实现按车辆编号索引的车辆登记表，统一管理车辆在待充电、充电中、已完成、已失败四个状态桶之间的转移。
+
+主要功能：
+- VehicleBucket：按加入顺序保存同一状态的车辆，O(1) 加入/移除/成员判断/查询加入序号（position），
+  并兼容 list 的常用读接口（len、下标、切片、迭代、拼接）
+- VehicleRegistry：以车辆编号为键记录每辆车所在的桶，transition() 以 O(1) 完成状态转移
+- 迭代桶时遍历的是快照，遍历过程中发生的转移不会影响当前遍历
+- version：桶内容每次变化时加一，供按状态缓存计算结果的模块（如 Q-learning 的状态离散化）判断缓存是否失效
+- listeners：登记与状态转移时依次回调 listener(car, 原状态, 新状态)，供仿真记录器等订阅车辆生命周期
+
+设计说明：
+环境原先用四个 list 保存车辆，状态转移依赖 list.remove，每次 O(n)，且每个时间步都要用 [:] 复制列表再遍历。
+桶内部用 dict（保持插入顺序）保存车辆，顺序与原列表的 append/remove 语义一致，因此按下标访问（如 Q-learning 的动作解码）
+得到的车辆不变。下标访问与迭代共用一份按需重建的快照，只有桶内容变化后的第一次访问才需要 O(n) 重建。
+ParkEnv.needcharge_vehicles 等属性直接指向对应的桶，旧代码无需修改即可继续读取。
+
+用法示例：
+    registry = VehicleRegistry()
+    registry.add(car)                       # 按 car.state 加入对应的桶
+    registry.transition(car, 'charging')    # O(1) 状态转移
+    for car in registry.needcharge:         # 遍历快照，可在循环中转移
+        ...
+
+创建/维护者: 姚炜博
+最后修改: 2025-05-23
+版本: 1.0.0
+"""
+
+VEHICLE_STATES = ('needcharge', 'charging', 'completed', 'failed')
+
+
+class VehicleBucket:
+    """
+    同一状态车辆的有序集合，接口与 list 的常用读操作兼容
+    """
+    def __init__(self, state):
+        self.state = state
+        self._items = {}  # 车辆编号 -> (加入序号, 车辆)，保持加入顺序
+        self._seq = 0  # 下一辆加入车辆的序号
+        self._snapshot = None  # 按需重建的列表快照
+        self.version = 0  # 内容变化计数
+
+    def _list(self):
+        if self._snapshot is None:
+            self._snapshot = [car for _, car in self._items.values()]
+        return self._snapshot
+
+    def append(self, car):
+        """加入车辆（已在桶中时不重复加入）"""
+        if car.id not in self._items:
+            self._items[car.id] = (self._seq, car)
+            self._seq += 1
+            self._snapshot = None
+            self.version += 1
+
+    def remove(self, car):
+        """移除车辆，不在桶中时与 list.remove 一样抛出 ValueError"""
+        if car not in self:
+            raise ValueError(f"vehicle {car.id} not in {self.state} bucket")
+        del self._items[car.id]
+        self._snapshot = None
+        self.version += 1
+
+    def get(self, vehicle_id):
+        """按车辆编号查找，不存在时返回 None"""
+        item = self._items.get(vehicle_id)
+        return item[1] if item is not None else None
+
+    def position(self, car):
+        """车辆的加入序号，O(1)；同一桶内按序号排序即为桶内顺序（与 index 的先后一致），车辆不在桶中时抛出 KeyError"""
+        return self._items[car.id][0]
+
+    def index(self, car):
+        return self._list().index(car)
+
+    def copy(self):
+        return list(self._list())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, car):
+        return self.get(getattr(car, 'id', None)) is car
+
+    def __iter__(self):
+        return iter(self._list())
+
+    def __getitem__(self, index):
+        return self._list()[index]
+
+    def __add__(self, other):
+        return self._list() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self._list()
+
+    def __repr__(self):
+        return f"VehicleBucket({self.state!r}, {self._list()!r})"
+
+
+class VehicleRegistry:
+    """
+    按车辆编号索引的车辆登记表
+    """
+    def __init__(self):
+        self.buckets = {state: VehicleBucket(state) for state in VEHICLE_STATES}
+        self._states = {}  # 车辆编号 -> 所在桶的状态
+        self.listeners = []  # 回调 listener(car, 原状态, 新状态)，登记时原状态为 None
+
+    @property
+    def needcharge(self):
+        return self.buckets['needcharge']
+
+    @property
+    def charging(self):
+        return self.buckets['charging']
+
+    @property
+    def completed(self):
+        return self.buckets['completed']
+
+    @property
+    def failed(self):
+        return self.buckets['failed']
+
+    def add(self, car, state=None):
+        """
+        登记车辆
+        state: 所在桶，默认取 car.state
+        """
+        state = car.state if state is None else state
+        self.buckets[state].append(car)
+        self._states[car.id] = state
+        for listener in self.listeners:
+            listener(car, None, state)
+
+    def transition(self, car, state):
+        """
+        把车辆移动到 state 对应的桶末尾，O(1)
+        return: bool, 是否发生了移动
+        """
+        current = self._states[car.id]
+        if current == state:
+            return False
+        self.buckets[current].remove(car)
+        self.buckets[state].append(car)
+        self._states[car.id] = state
+        for listener in self.listeners:
+            listener(car, current, state)
+        return True
+
+    def state_of(self, car):
+        """车辆所在的桶，未登记时返回 None"""
+        return self._states.get(car.id)
+
+    def get(self, vehicle_id):
+        """按车辆编号查找车辆，未登记时返回 None"""
+        state = self._states.get(vehicle_id)
+        return self.buckets[state].get(vehicle_id) if state is not None else None
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,51 @@
+import math
+import pytest
+from models.battery import Battery, charging_time, soc_after_charging
+
+# (电压, 容量, 起始 SOC, 充电时长)：覆盖各个分段及其边界、800V 的 59% 截断点和充满
+CASES = [
+    (800, 100, 10, 900),
+    (800, 60, 55, 250),
+    (800, 100, 75, 300),
+    (400, 80, 40, 1200),
+    (400, 50, 78, 700),
+    (400, 100, 95, 400),
+    (800, 40, 90, 1200),
+]
+
+
+def _euler(battery, seconds, dt=0.01):
+    """按 get_charging_power 做前向欧拉积分，返回充电后的 SOC"""
+    for _ in range(round(seconds / dt)):
+        battery.charge_kwh(battery.get_charging_power() * dt)
+    return battery.soc
+
+
+@pytest.mark.parametrize('voltage, capacity, soc, seconds', CASES)
+def test_closed_form_matches_euler_integration(voltage, capacity, soc, seconds):
+    expected = _euler(Battery(capacity, soc, voltage), seconds)
+    assert soc_after_charging(soc, seconds, voltage, capacity) == pytest.approx(expected, abs=3e-4)
+    if expected < 100:
+        # 用欧拉积分的终点反求时间，误差按终点处的充电速率换算为 SOC
+        rate = Battery(capacity, expected, voltage).get_charging_power() / capacity * 100
+        assert charging_time(soc, expected, voltage, capacity) * rate == pytest.approx(seconds * rate, abs=3e-4)
+
+
+@pytest.mark.parametrize('voltage, capacity, soc, seconds', CASES)
+def test_charging_time_round_trip(voltage, capacity, soc, seconds):
+    battery = Battery(capacity, soc, voltage)
+    target = battery.get_soc_after(seconds)
+    if target < 100:
+        assert battery.get_charging_time(target) == pytest.approx(seconds, rel=1e-9)
+    kwh = battery.charge_seconds(seconds)
+    assert battery.soc == target
+    assert kwh == pytest.approx((target - soc) * capacity / 100)
+
+    battery = Battery(capacity, soc, voltage)
+    for goal in (soc + 5, 80, 99.5):
+        if goal <= battery.soc:
+            continue
+        battery.charge_seconds(battery.get_charging_time(goal))
+        assert battery.soc == pytest.approx(goal, abs=1e-9)
+    assert battery.get_charging_time(100.5) == math.inf
+    assert battery.get_charging_time(battery.soc) == 0.0
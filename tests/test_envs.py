@@ -0,0 +1,74 @@
+import random
+import numpy as np
+import pytest
+from modules.envs import ParkEnv
+from modules.strategy import TaskStrategy
+
+
+def test_restore_keeps_global_random_state():
+    env = ParkEnv((100, 100), 4, 10, 3, 10, 0.01, seed=0)
+    for _ in range(100):
+        env.update(10)
+    snapshot = env.snapshot()
+    random.random()
+    np.random.random()
+
+    random.seed(123)
+    np.random.seed(123)
+    expected = (random.random(), np.random.random())
+    random.seed(123)
+    np.random.seed(123)
+    env.restore(snapshot)
+    ParkEnv.from_snapshot(snapshot)
+    assert (random.random(), np.random.random()) == expected
+
+
+def test_restore_rng_replays_arrivals():
+    env = ParkEnv((100, 100), 4, 10, 3, 10, 0.01, seed=0)
+    for _ in range(100):
+        env.update(10)
+    snapshot = env.snapshot()
+    for _ in range(200):
+        env.update(10)
+    arrivals = env.vehicles_index
+    env.restore(snapshot)
+    for _ in range(200):
+        env.update(10)
+    assert env.vehicles_index == arrivals
+
+
+def _run(seed, event_driven, until=28800):
+    # 园区容量足够大，到达的车辆都不会因园区已满被丢弃
+    env = ParkEnv((200, 200), 8, 1000, 6, 10, 0.011667, seed=seed)
+    strategy = TaskStrategy(env, 10, 'small')
+    if event_driven:
+        while env.time < until:
+            strategy.update_event('nearest', until=until)
+    else:
+        for _ in range(until // 10):
+            strategy.update('nearest')
+    assert env.time == until
+    cars = sorted((car for bucket in env.vehicles.buckets.values() for car in bucket), key=lambda car: car.id)
+    return env, cars
+
+
+def test_event_driven_matches_fixed_tick():
+    tick_env, tick_cars = _run(0, event_driven=False)
+    event_env, event_cars = _run(0, event_driven=True)
+
+    assert event_env.vehicles_index == tick_env.vehicles_index
+    assert [(car.parking_spot, car.required_soc, car.arrival_soc) for car in event_cars] == \
+           [(car.parking_spot, car.required_soc, car.arrival_soc) for car in tick_cars]
+    # 固定步长把到达、完成时刻对齐到步长边界，调度时机略有不同，结果只应相差几辆车
+    tolerance = max(3, 0.03 * tick_env.vehicles_index)
+    for state in ('completed', 'failed'):
+        assert abs(len(event_env.vehicles.buckets[state]) - len(tick_env.vehicles.buckets[state])) <= tolerance
+
+
+def test_advance_without_events_needs_a_bound():
+    env = ParkEnv((100, 100), 4, 10, 3, 10, 0.0, seed=0)
+    with pytest.raises(RuntimeError):
+        env.advance_to_next_event()
+    assert env.advance_to_next_event(until=50) == 50
+    assert env.advance_to_next_event(max_step=20) == 20
+    assert env.time == 70
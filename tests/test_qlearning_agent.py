@@ -0,0 +1,34 @@
+import numpy as np
+from modules.envs import ParkEnv
+from modules.qlearning_agent import QLearningAgent
+
+
+def _fresh_features(agent):
+    agent._feature_cache = None
+    return agent.state_features()
+
+
+def test_state_features_after_in_place_restore():
+    env = ParkEnv((200, 200), 16, 40, 10, 1.0, 0.05, seed=0)
+    for _ in range(200):
+        env.update(1.0)
+    snapshot = env.snapshot()
+    agent = QLearningAgent(env)
+    np.random.seed(0)
+    for _ in range(20):
+        # restore 后登记表版本号从 0 重新计数，走到相同的时刻和版本号时不能命中旧缓存
+        env.restore(snapshot, restore_rng=False)
+        for _ in range(50):
+            env.update(1.0)
+        cached = agent.state_features()
+        assert cached == _fresh_features(agent)
+
+
+def test_train_vec_is_reproducible_with_seed():
+    tables = []
+    for _ in range(2):
+        agent = QLearningAgent(ParkEnv((100, 100), 4, 10, 3, 10, 0.003056, seed=0))
+        agent.train_vec(1, episodes=8, max_steps=200, n_envs=4, seed=3, log_interval=0)
+        tables.append(agent.q_table)
+    assert np.count_nonzero(tables[0])
+    assert np.array_equal(tables[0], tables[1])
@@ -0,0 +1,141 @@
+import glob
+import os
+import pickle
+import subprocess
+import numpy as np
+import pytest
+from modules import qtable_io
+from modules.envs import ParkEnv
+from modules.qlearning_agent import QLearningAgent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(n_robots=4, n_vehicles=10):
+    return ParkEnv((100, 100), n_robots, n_vehicles, 3, 10, 0.01, seed=0)
+
+
+def test_dense_round_trip(tmp_path):
+    env = _env()
+    q_table = np.random.default_rng(0).normal(size=(100, 40))
+    path = qtable_io.save_q_table(str(tmp_path / 'small_most'), q_table, map_size='small', env=env,
+                                  metadata={'episodes': 3})
+    assert path.endswith('.qtab') and not os.path.exists(path + '.tmp')
+
+    header = qtable_io.read_header(path)
+    assert header['offset'] % 64 == 0
+    assert (header['map_size'], header['state_size'], header['action_size']) == ('small', 100, 40)
+    assert (header['n_robots'], header['max_vehicles'], header['metadata']) == (4, 10, {'episodes': 3})
+
+    mapped = qtable_io.load_q_table(path, env=env, state_size=100)
+    assert isinstance(mapped, np.memmap) and not mapped.flags.writeable
+    assert np.array_equal(mapped, q_table)
+    copy = qtable_io.load_q_table(path, env=env, mmap=False)
+    assert copy.flags.writeable and np.array_equal(copy, q_table)
+
+    # 改写文件后重新映射，读到新内容
+    qtable_io.save_q_table(path, q_table + 1, env=env)
+    assert np.array_equal(qtable_io.load_q_table(path, env=env), q_table + 1)
+
+
+def test_sparse_round_trip(tmp_path):
+    agent = QLearningAgent(_env(), sparse_memory=2 ** 20, state_bins=(5, 5, 5, 100))
+    np.random.seed(0)
+    agent.train(1, episodes=1, max_steps=300, log_interval=0)
+    assert len(agent.sparse) > 1
+    path = agent.save_q_table(str(tmp_path / 'sparse.qtab'), map_size='small')
+
+    loaded = QLearningAgent(_env(), sparse_memory=2 ** 20)
+    loaded.load_q_table(path)
+    assert loaded.state_bins == agent.state_bins
+    assert np.array_equal(loaded.sparse.state_keys(), agent.sparse.state_keys())
+    assert np.array_equal(loaded.q_table[:len(loaded.sparse)], agent.q_table[:len(agent.sparse)])
+    for key in agent.sparse.state_keys().tolist():
+        assert np.array_equal(loaded.q_table[loaded.sparse.get(key)], agent.q_table[agent.sparse.get(key)])
+
+
+def _saved(tmp_path):
+    return qtable_io.save_q_table(str(tmp_path / 'table.qtab'), np.ones((100, 40)), env=_env())
+
+
+def test_rejects_bad_magic(tmp_path):
+    path = _saved(tmp_path)
+    with open(path, 'r+b') as f:
+        f.write(b'PK\x03\x04')
+    with pytest.raises(ValueError, match='不是 Q表文件'):
+        qtable_io.load_q_table(path)
+
+
+def test_rejects_newer_version(tmp_path):
+    path = _saved(tmp_path)
+    with open(path, 'r+b') as f:
+        f.seek(len(qtable_io.QTABLE_MAGIC))
+        f.write(bytes([qtable_io.QTABLE_VERSION + 1]))
+    with pytest.raises(ValueError, match='格式版本'):
+        qtable_io.load_q_table(path, mmap=False)
+
+
+def test_rejects_shape_mismatch_with_agent(tmp_path):
+    path = _saved(tmp_path)
+    with pytest.raises(ValueError, match='action_size'):
+        QLearningAgent(_env(n_robots=8)).load_q_table(path)
+    agent = QLearningAgent(_env())
+    agent.state_size = 50
+    with pytest.raises(ValueError, match='state_size'):
+        agent.load_q_table(path)
+    with pytest.raises(ValueError):
+        qtable_io.save_q_table(str(tmp_path / 'bad.qtab'), np.ones((100, 41)), env=_env())
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_rejects_truncated_file(tmp_path, mmap):
+    path = _saved(tmp_path)
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        f.truncate(size - 8)
+    with pytest.raises(ValueError, match='不完整'):
+        qtable_io.load_q_table(path, mmap=mmap)
+    with open(path, 'r+b') as f:
+        f.truncate(20)  # 头信息也不完整
+    with pytest.raises(ValueError):
+        qtable_io.load_q_table(path, mmap=mmap)
+
+
+def test_convert_pickle_round_trip(tmp_path):
+    q_table = np.arange(100 * 40, dtype=float).reshape(100, 40)
+    pkl_path = tmp_path / 'medium_most_q_table.pkl'
+    with open(pkl_path, 'wb') as f:
+        pickle.dump(q_table, f)
+    path = qtable_io.convert_pickle(str(pkl_path))
+    header = qtable_io.read_header(path)
+    assert header['map_size'] == 'medium'
+    assert header['metadata']['converted_from'] == 'medium_most_q_table.pkl'
+    assert np.array_equal(qtable_io.load_q_table(path), qtable_io.load_q_table(str(pkl_path)))
+    assert qtable_io.find_q_table(str(tmp_path / 'medium_most_q_table')) == path
+
+
+def _git_show(revision, path):
+    try:
+        result = subprocess.run(['git', 'show', f'{revision}:{path}'], cwd=ROOT, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+def test_shipped_tables_match_original_pickles():
+    try:
+        root = subprocess.run(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=ROOT, capture_output=True,
+                              check=True, text=True).stdout.split()[-1]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        pytest.skip('需要 git 历史中的原始 pickle Q 表')
+    paths = sorted(glob.glob(os.path.join(ROOT, 'config', 'q_table', '*.qtab')))
+    assert paths
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        original = _git_show(root, f'config/q_table/{name}.pkl')
+        if original is None:
+            pytest.skip(f'git 历史中没有 {name}.pkl')
+        expected = np.asarray(pickle.loads(original))
+        header = qtable_io.read_header(path)
+        assert header['map_size'] == name.split('_')[0]
+        assert np.array_equal(qtable_io.load_q_table(path), expected)
@@ -0,0 +1,84 @@
+import random
+import numpy as np
+import pytest
+from modules.envs import ParkEnv
+from modules.qlearning_agent import QLearningAgent
+from modules.replay_buffer import ReplayBuffer
+from modules.sparse_qtable import SparseQTable, pack_state
+
+
+def test_pack_state_largest_values_fit_int64():
+    key = pack_state((65535, 65535, 65535, 32767))
+    assert key == 2 ** 63 - 1
+    # 超出范围的分量被截断，不会溢出
+    assert pack_state((70000, 70000, 70000, 40000)) == key
+    assert pack_state((-5, 0, 0, 0)) == 0
+
+
+def test_pack_state_rejects_extra_fields():
+    with pytest.raises(ValueError):
+        pack_state((1, 2, 3, 4, 5))
+
+
+def test_row_accepts_largest_key():
+    table = SparseQTable(action_size=2, max_states=4)
+    largest = pack_state((65535, 65535, 65535, 40000))
+    row = table.row(largest)
+    assert table.get(largest) == row
+    assert table.state_keys().tolist() == [largest]
+
+
+def test_lru_eviction_reuses_oldest_row():
+    table = SparseQTable(action_size=2, max_states=2)
+    a, b, c = (pack_state((i, 0, 0, 0)) for i in range(3))
+    row_a, row_b = table.row(a), table.row(b)
+    table.values[row_a] = 1.0
+    table.row(b)
+    table.row(a)  # a 最近访问过，淘汰 b
+    row_c = table.row(c)
+    assert row_c == row_b
+    assert table.get(b) is None and table.get(a) == row_a
+    assert np.all(table.values[row_c] == 0) and np.all(table.values[row_a] == 1.0)
+    assert table.summary()['evictions'] == 1
+
+
+def test_replay_skips_transitions_of_evicted_states():
+    table = SparseQTable(action_size=2, max_states=2)
+    a, b, c = (pack_state((i, 0, 0, 0)) for i in range(3))
+    table.row(a)
+    table.row(b)
+    buffer = ReplayBuffer(capacity=4)
+    buffer.add(a, 0, 1.0, b, False)
+    row_c = table.row(c)  # 淘汰 a，c 复用 a 的行
+    np.random.seed(0)
+    assert buffer.td_update(table.values, 8, 1.0, 0.9, resolve=table.lookup) == 0.0
+    assert np.all(table.values[row_c] == 0)
+
+    buffer.add(c, 1, 2.0, b, False)
+    np.random.seed(0)
+    buffer.td_update(table.values, 8, 1.0, 0.9, resolve=table.lookup)
+    # 只有 c 自己的转移写入 c 的行（有放回抽样，重复抽到的增量会累加）
+    assert table.values[row_c, 1] > 0 and table.values[row_c, 0] == 0
+
+
+def test_lookup_and_key_of():
+    table = SparseQTable(action_size=2, max_states=4)
+    keys = [pack_state((i, 1, 2, 3)) for i in range(3)]
+    rows = [table.row(key) for key in keys]
+    assert table.lookup(keys + [pack_state((9, 9, 9, 9))]).tolist() == rows + [-1]
+    assert table.key_of(rows[1]) == keys[1]
+    assert table.key_of(np.array(rows)).tolist() == keys
+
+
+def test_agent_replay_with_small_sparse_table():
+    env = ParkEnv((100, 100), 4, 10, 3, 10, 0.01, seed=0)
+    row_bytes = 4 * 10 * 8
+    agent = QLearningAgent(env, sparse_memory=3 * row_bytes, replay_capacity=64, replay_batch_size=16,
+                           state_bins=(5, 5, 5, 100))
+    np.random.seed(0)
+    random.seed(0)
+    agent.train(1, episodes=2, max_steps=300, log_interval=0)
+    assert agent.sparse.evictions > 0
+    # 缓冲区保存的是状态键而不是行号
+    stored = agent.replay.states[:len(agent.replay)]
+    assert stored.max() >= agent.sparse.max_states
@@ -0,0 +1,89 @@
+import random
+from types import SimpleNamespace
+import pytest
+from modules.spatial_index import GridIndex, SpatialIndex
+from modules.vehicle_registry import VehicleRegistry
+
+
+def _brute(points, x, y):
+    """按 (距离, 序号) 排序的全部点，距离公式与 GridIndex 相同"""
+    found = [(((px - x) ** 2 + (py - y) ** 2) ** 0.5, order, item) for item, (px, py, order) in points.items()]
+    found.sort(key=lambda entry: entry[:2])
+    return [(distance, item) for distance, _, item in found]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_grid_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    index = GridIndex(cell_size=rng.choice([7, 12.5, 25]))
+    points = {}
+    for step in range(600):
+        action = rng.random()
+        if action < 0.45 or not points:
+            item = rng.randrange(80)
+            # 整数坐标使大量点距离相同，检验按序号排序
+            x, y = rng.randrange(0, 100, 5), rng.randrange(0, 100, 5)
+            order = rng.randrange(1000)
+            index.insert(item, x, y, order=order)
+            points[item] = (x, y, order)
+        elif action < 0.65:
+            item = rng.choice(list(points))
+            index.remove(item)
+            del points[item]
+        else:
+            # 查询点可能落在所有点所在网格范围之外
+            x, y = rng.uniform(-150, 250), rng.uniform(-150, 250)
+            k = rng.randrange(0, 12)
+            radius = rng.choice([0, 5, 17.5, 40, 500])
+            expected = _brute(points, x, y)
+            assert index.nearest(x, y, k=k) == expected[:k]
+            assert index.within(x, y, radius) == [entry for entry in expected if entry[0] <= radius]
+        assert len(index) == len(points)
+        assert all(index.position(item) == (px, py) for item, (px, py, _) in points.items())
+
+
+def test_grid_index_ties_follow_order():
+    index = GridIndex(cell_size=10)
+    for item, (x, y, order) in {'a': (10, 0, 3), 'b': (0, 10, 1), 'c': (-10, 0, 2), 'd': (0, -10, 0)}.items():
+        index.insert(item, x, y, order=order)
+    assert [item for _, item in index.nearest(0, 0, k=4)] == ['d', 'b', 'c', 'a']
+    assert [item for _, item in index.nearest(0, 0, k=2)] == ['d', 'b']
+    assert [item for _, item in index.within(0, 0, 10)] == ['d', 'b', 'c', 'a']
+    # 范围外的查询点到 a、d 距离相同，按序号取 d
+    assert index.nearest(1000, -1000, k=1) == [((990 ** 2 + 1000 ** 2) ** 0.5, 'd')]
+    assert index.within(1000, 1000, 10) == []
+    with pytest.raises(KeyError):
+        index.remove('missing')
+
+
+class _Car(SimpleNamespace):
+    __hash__ = object.__hash__  # 与 Vehicle 一样按对象身份作为索引键
+
+
+def test_vehicle_index_follows_registry_transitions():
+    registry = VehicleRegistry()
+    spatial = SpatialIndex((100, 100), registry)
+    cars = [_Car(id=i, state='needcharge', parking_spot=(i * 10, 50), battery_gap=i) for i in range(6)]
+
+    def check():
+        assert set(spatial.vehicles) == set(registry.needcharge)
+        vehicles, coords, gaps = spatial.vehicle_columns()
+        assert vehicles == list(registry.needcharge)
+        assert coords.tolist() == [list(car.parking_spot) for car in vehicles]
+        assert gaps.tolist() == [car.battery_gap for car in vehicles]
+
+    for car in cars:
+        registry.add(car)
+    check()
+    registry.transition(cars[2], 'charging')
+    check()
+    registry.transition(cars[0], 'failed')
+    registry.transition(cars[2], 'needcharge')
+    check()
+    registry.transition(cars[2], 'completed')
+    assert [car.id for _, car in spatial.vehicles.nearest(0, 50, k=2)] == [1, 3]
+    check()
+
+    # 后订阅的索引载入已在桶中的车辆
+    late = SpatialIndex((100, 100), registry)
+    assert set(late.vehicles) == set(registry.needcharge)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from modules.array_env import ArrayParkEnv, R_AVAILABLE, R_GOCAR, R_DISCHARGING
+from modules.qlearning_agent import QLearningAgent
+from modules.strategy import TaskStrategy
+from modules.vec_env import VecParkEnv
+
+CONFIG = dict(park_size=(200, 200), n_robots=16, n_vehicles=40, n_batteries=10, time_step=10,
+              generate_vehicles_probability=0.011667)
+
+
+def _busy_env(seed):
+    """运行一段时间后停止调度，让车辆积压、机器人分散在各处空闲"""
+    env = ArrayParkEnv(seed=seed, **CONFIG)
+    strategy = TaskStrategy(env, time_step=10, map_size='medium')
+    for _ in range(300):
+        strategy.update('nearest')
+    for _ in range(60):
+        env.update(10)
+    return env
+
+
+def _copy_to_vec(env):
+    """把 ArrayParkEnv 的结构数组拷贝到只有一个园区的 VecParkEnv"""
+    vec_env = VecParkEnv(1, **CONFIG)
+    pairs = ((env.robot_arrays, vec_env.robot_arrays), (env.car_arrays, vec_env.car_arrays),
+             (env.battery_station.battery_arrays, vec_env.battery_arrays))
+    for source, target in pairs:
+        for name, value in vars(source).items():
+            field = getattr(target, name)
+            if isinstance(value, np.ndarray) and field.flags.writeable:
+                field[...] = value.reshape(field.shape)
+    return vec_env
+
+
+@pytest.mark.parametrize('weights', [
+    {'urgency': 0.48, 'distance': 0.52, 'robot_energy': 0},
+    {'urgency': 0.2, 'distance': 0.3, 'robot_energy': 0.5},
+    {'distance': 1.0},
+])
+def test_weighted_assignments_match_genetic_task(weights):
+    for seed in range(3):
+        env = _busy_env(seed)
+        robots = env.robot_arrays
+        available = robots.state == R_AVAILABLE
+        assert np.count_nonzero(available) > 1 and len(env.needcharge_vehicles) > 1
+        targets = _copy_to_vec(env).weighted_assignments(weights)[0]
+
+        strategy = TaskStrategy(env, time_step=10, map_size='medium')
+        strategy.weights = weights
+        strategy.genetic_task()
+        assigned = available & (robots.state == R_GOCAR)
+        assert np.count_nonzero(assigned) > 1
+        expected = np.where(assigned, robots.target, -1)
+        assert np.array_equal(targets, expected)
+
+
+def test_needcharge_slots_follow_bucket_order():
+    vec_env = VecParkEnv(2, seed=0, **dict(CONFIG, generate_vehicles_probability=0.05))
+    for _ in range(200):
+        vec_env.step(vec_env.nearest_assignments())
+    robots, cars = vec_env.robot_arrays, vec_env.car_arrays
+    discharging = (robots.state == R_DISCHARGING) & ~robots.released  # 目标车辆本步已离场的机器人不计
+    assert discharging.sum(axis=1).min() > 1
+
+    # 放电中的机器人电量耗尽，车辆重新等待，按原充电桶内（被分配）的顺序追加到待充电车辆末尾
+    before = [list(row[row >= 0]) for row in vec_env.needcharge_slots()]
+    requeued = [sorted(robots.target[env][discharging[env]], key=lambda slot: cars.bucket_seq[env, slot])
+                for env in range(2)]
+    ids = cars.id.copy()
+    robots.soc[discharging] = 0
+    vec_env.step()
+
+    for env, row in enumerate(vec_env.needcharge_slots()):
+        waiting = [slot for slot in row if slot >= 0]
+        arrived = sorted((slot for slot in waiting if cars.id[env, slot] != ids[env, slot]), key=lambda slot: cars.id[env, slot])
+        assert waiting == before[env] + arrived + requeued[env]
+        # 重新等待的车辆比仍在等待的车辆先到达，按车辆编号排序会把它们排在前面
+        assert min(cars.id[env, requeued[env]]) < max(cars.id[env, before[env]])
+
+
+def test_state_features_match_agent():
+    for seed in range(3):
+        env = _busy_env(seed)
+        agent = QLearningAgent(env)
+        vec_env = _copy_to_vec(env)
+        assert tuple(vec_env.state_features()[0]) == agent.state_features()
+        assert agent._vec_state_index(vec_env)[0][0] == agent.discretize_state(None)
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+from modules.vehicle_registry import VehicleRegistry
+
+
+def test_position_follows_bucket_order():
+    registry = VehicleRegistry()
+    cars = [SimpleNamespace(id=i, state='needcharge') for i in range(6)]
+    for car in cars:
+        registry.add(car)
+    registry.transition(cars[1], 'charging')
+    registry.transition(cars[4], 'charging')
+    registry.transition(cars[1], 'needcharge')  # 回到待充电桶末尾
+    for bucket in registry.buckets.values():
+        assert sorted(bucket, key=bucket.position) == list(bucket)
+        assert [bucket.index(car) for car in bucket] == list(range(len(bucket)))
+    assert list(registry.needcharge) == [cars[0], cars[2], cars[3], cars[5], cars[1]]
+    assert registry.needcharge.position(cars[1]) > registry.needcharge.position(cars[5])
+    assert registry.get(4) is cars[4] and cars[4] in registry.charging and cars[4] not in registry.needcharge
@@ -18,13 +18,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # 现在可以正常导入了
 from modules.envs import ParkEnv
 from modules.strategy import TaskStrategy
+from modules.vec_env import VecParkEnv
 
 class GeneticOptimizer:
     """遗传算法优化器，用于寻找多目标任务调度的最优权重参数"""
     
     def __init__(self, population_size=300, generations=100, 
                  mutation_rate=0.2, crossover_rate=0.7,
-                 elite_size=5, tournament_size=3):
+                 elite_size=5, tournament_size=3, vectorized=True):
         """
         初始化遗传算法优化器
         
@@ -35,6 +36,8 @@ class GeneticOptimizer:
             crossover_rate: 交叉率
             elite_size: 精英个体数量
             tournament_size: 锦标赛选择的参赛者数量
+            vectorized: 是否用 VecParkEnv 批量评估适应度（整个种群的所有仿真锁步推进），
+                        False 时逐个体用 ParkEnv 仿真并使用多进程
         """
         self.population_size = population_size
         self.generations = generations
@@ -42,6 +45,7 @@ class GeneticOptimizer:
         self.crossover_rate = crossover_rate
         self.elite_size = elite_size
         self.tournament_size = tournament_size
+        self.vectorized = vectorized
         
         # 权重键和范围定义
         self.weight_keys = [
@@ -95,6 +99,10 @@ class GeneticOptimizer:
         返回:
             fitness_score: 适应度评分 (越高越好)
         """
+        if self.vectorized:
+            # num_runs 次仿真放入同一个 VecParkEnv 锁步推进
+            return self.evaluate_population_vec([weights], env_config, num_steps, num_runs)[0][1]
+
         total_fitness = 0
         
         for run in range(num_runs):
@@ -156,8 +164,39 @@ class GeneticOptimizer:
         """
         return individual, self.evaluate_fitness(individual, env_config, num_steps, num_runs)
     
+    def evaluate_population_vec(self, population, env_config, num_steps=2000, num_runs=3, seed=None):
+        """
+        批量评估种群的适应度：每个个体的 num_runs 次仿真都放入同一个 VecParkEnv，
+        每个园区按所属个体的权重用 weighted_assignments 分配任务，所有园区锁步推进 num_steps 步
+        
+        参数:
+            population: 个体（权重字典）列表
+            env_config: 环境配置
+            num_steps: 每次仿真的步数
+            num_runs: 每个个体的仿真次数 (取平均结果)
+            seed: 车辆生成随机数种子
+        
+        返回:
+            按适应度从高到低排序的 (个体, 适应度) 列表，适应度口径与 evaluate_fitness 相同 (100 × 完成率)
+        """
+        vec_env = VecParkEnv(len(population) * num_runs, seed=seed, **env_config)
+        weights = {key: np.repeat([individual.get(key, 0) for individual in population], num_runs)
+                   for key in ('urgency', 'distance', 'robot_energy')}
+        for step in range(num_steps):
+            vec_env.step(vec_env.weighted_assignments(weights))
+        _, success_rate = vec_env.get_metrics()
+        fitness = 100 * success_rate.reshape(len(population), num_runs).mean(axis=1)
+
+        results = list(zip(population, fitness.tolist()))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results
+
     def evaluate_population(self, population, env_config):
-        """评估整个种群的适应度 (使用多核并行)"""
+        """评估整个种群的适应度 (vectorized 时批量仿真，否则使用多核并行)"""
+        if self.vectorized:
+            print(f"批量评估种群适应度 ({len(population)} 个体)...")
+            return self.evaluate_population_vec(population, env_config)
+
         fitness_scores = []
         
         print(f"评估种群适应度 ({len(population)} 个体)...")
@@ -5,20 +5,24 @@ from modules.envs import ParkEnv
 from modules.strategy import TaskStrategy
 from tqdm import tqdm
 from modules.qlearning_agent import QLearningAgent
-import pickle
+from modules.qtable_io import find_q_table
+from modules.parallel_trainer import ParallelQTrainer
 print("当前工作目录:", os.getcwd())
-def train_model(env, choice, scale, episodes=1000, max_steps=100, log_interval=10):
-    """训练模型并保存"""
+def train_model(env, choice, scale, episodes=1000, max_steps=100, log_interval=10, n_workers=1):
+    """训练模型并保存；n_workers > 1 时用多进程并行训练，log_interval 按合并轮数计"""
     agent = QLearningAgent(env)
     print("开始训练模型...")
-    agent.train(choice, episodes=episodes, max_steps=max_steps, log_interval=log_interval, debug=False)
+    if n_workers > 1:
+        ParallelQTrainer(agent, n_workers=n_workers).train(choice, episodes=episodes, max_steps=max_steps,
+                                                           log_interval=log_interval)
+    else:
+        agent.train(choice, episodes=episodes, max_steps=max_steps, log_interval=log_interval, debug=False)
     
     # 保存训练好的模型
     os.makedirs('q_table', exist_ok=True)
     strategy_name = 'nearest' if choice == 0 else 'most'
-    model_name = f'q_table/{scale}_{strategy_name}_q_table.pkl'
-    with open(model_name, 'wb') as f:
-        pickle.dump(agent.q_table, f)
+    model_name = agent.save_q_table(f'q_table/{scale}_{strategy_name}_q_table.qtab', map_size=scale,
+                                    metadata={'episodes': episodes, 'max_steps': max_steps, 'reward': strategy_name})
     print(f"模型训练完成并保存为 {model_name}")
     return agent
 
@@ -68,14 +72,6 @@ def evaluate_model(env, agent, n_episodes=100):
     else:
         print(f"平均完成率: {(avg_completed/(avg_completed+avg_failed))*100:.2f}%")
 
-def train_single_episode(args):
-    env_params, strategy_choice, max_steps = args
-    # 重新创建环境和 agent，避免进程间冲突
-    env = ParkEnv(**env_params)
-    agent = QLearningAgent(env)
-    agent.train(strategy_choice, episodes=1, max_steps=max_steps, log_interval=0, debug=False)
-    return agent.q_table
-
 def main():
     print("请选择场景规模：small, medium, large")
     scale = input().strip().lower()
@@ -122,20 +118,22 @@ def main():
     choice = input().strip()
 
     strategy_name = 'nearest' if strategy_choice == 0 else 'most'
-    model_name = f'q_table/{scale}_{strategy_name}_q_table.pkl'
+    n_workers = max(1, os.cpu_count() - 1)  # 预留一个核心给系统
+    model_name = find_q_table(f'q_table/{scale}_{strategy_name}_q_table')
 
     if choice == '1':
-        agent = train_model(env, strategy_choice, scale, episodes=100, max_steps=100000, log_interval=10)
+        agent = train_model(env, strategy_choice, scale, episodes=100, max_steps=100000, log_interval=10,
+                            n_workers=n_workers)
         evaluate_model(env, agent)
     elif choice == '2':
-        if os.path.exists(model_name):
+        if model_name is not None:
             agent = QLearningAgent(env)
-            with open(model_name, 'rb') as f:
-                agent.q_table = pickle.load(f)
+            agent.load_q_table(model_name)
             evaluate_model(env, agent)
         else:
-            print(f"未找到已训练的模型{model_name}，将训练新模型")
-            agent = train_model(env, strategy_choice, scale, episodes=100, max_steps=100000, log_interval=10)
+            print(f"未找到已训练的模型q_table/{scale}_{strategy_name}_q_table.qtab，将训练新模型")
+            agent = train_model(env, strategy_choice, scale, episodes=100, max_steps=100000, log_interval=10,
+                                n_workers=n_workers)
             evaluate_model(env, agent)
 if __name__ == "__main__":
     main()
\ No newline at end of file
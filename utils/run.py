@@ -3,7 +3,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from modules.envs import ParkEnv
 from modules.qlearning_agent import QLearningAgent
-import pickle
+from modules.qtable_io import find_q_table
 
 def run_q_table_model(scale='small', strategy_choice=0, episodes=10):
     # 场景参数
@@ -32,14 +32,13 @@ def run_q_table_model(scale='small', strategy_choice=0, episodes=10):
                   time_step=0.1)
 
     strategy_name = 'nearest' if strategy_choice == 0 else 'most'
-    model_name = f'q_table/{scale}_{strategy_name}_q_table.pkl'
+    model_name = find_q_table(f'q_table/{scale}_{strategy_name}_q_table')
 
-    if not os.path.exists(model_name):
-        raise FileNotFoundError(f"Q表文件不存在: {model_name}")
+    if model_name is None:
+        raise FileNotFoundError(f"Q表文件不存在: q_table/{scale}_{strategy_name}_q_table.qtab")
 
     agent = QLearningAgent(env)
-    with open(model_name, 'rb') as f:
-        agent.q_table = pickle.load(f)
+    agent.load_q_table(model_name)
 
     print(f"加载模型: {model_name}")
 
@@ -1,7 +1,6 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import pickle
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
@@ -10,40 +9,45 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 matplotlib.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS', "hiraginosansgb", "songti", "stheitimedium", "simhei"]
 matplotlib.rcParams['axes.unicode_minus'] = False
 from modules.envs import ParkEnv
+from modules.vec_env import VecParkEnv
 from modules.strategy import TaskStrategy
 from modules.qlearning_agent import QLearningAgent
+from modules.qtable_io import find_q_table
 
 STRATEGIES = ['nearest', 'max_demand', 'max_priority', 'genetic', 'hyper_heuristic', 'RL']
 N_TESTS = 100
 MAP_SIZE = 'small'
 MAX_WORKERS = 8
 
-def create_environment(map_size, time_step=10):
-    config = {
-        'small': {'park_size': (100, 100), 'n_robots': 4, 'n_vehicles': 10, 'n_batteries': 3, 'generate_vehicles_probability': 0.003056, 'cell_size': 7.4},
-        'medium': {'park_size': (200, 200), 'n_robots': 16, 'n_vehicles': 40, 'n_batteries': 10, 'generate_vehicles_probability': 0.011667, 'cell_size': 3.7},
-        'large': {'park_size': (500, 500), 'n_robots': 40, 'n_vehicles': 100, 'n_batteries': 24, 'generate_vehicles_probability': 0.029167, 'cell_size': 1.5}
-    }
-    settings = config.get(map_size, config['small'])
+ENV_CONFIG = {
+    'small': {'park_size': (100, 100), 'n_robots': 4, 'n_vehicles': 10, 'n_batteries': 3, 'generate_vehicles_probability': 0.003056, 'cell_size': 7.4},
+    'medium': {'park_size': (200, 200), 'n_robots': 16, 'n_vehicles': 40, 'n_batteries': 10, 'generate_vehicles_probability': 0.011667, 'cell_size': 3.7},
+    'large': {'park_size': (500, 500), 'n_robots': 40, 'n_vehicles': 100, 'n_batteries': 24, 'generate_vehicles_probability': 0.029167, 'cell_size': 1.5}
+}
+
+def create_environment(map_size, time_step=10, seed=None):
+    settings = ENV_CONFIG.get(map_size, ENV_CONFIG['small'])
     env = ParkEnv(
         park_size=settings['park_size'],
         n_robots=settings['n_robots'],
         n_vehicles=settings['n_vehicles'],
         n_batteries=settings['n_batteries'],
         time_step=10,
-        generate_vehicles_probability=settings['generate_vehicles_probability']
+        generate_vehicles_probability=settings['generate_vehicles_probability'],
+        seed=seed
     )
     return env
 
-def single_run(strategy_name, map_size='medium'):
-    env = create_environment(map_size)
+def single_run(strategy_name, map_size='medium', seed=None):
+    # 相同 seed 下各策略面对相同的车辆到达序列（公共随机数）
+    env = create_environment(map_size, seed=seed)
     agent = QLearningAgent(env)
     # 加载Q表（仅RL策略需要）
     if strategy_name == 'RL':
-        q_table_path = f"config/q_table/{map_size}_most_q_table.pkl"
-        if os.path.exists(q_table_path):
-            with open(q_table_path, "rb") as f:
-                agent.q_table = pickle.load(f)
+        # .qtab 以只读内存映射打开，所有评估线程共享同一份映射
+        q_table_path = find_q_table(f"config/q_table/{map_size}_most_q_table")
+        if q_table_path is not None:
+            agent.load_q_table(q_table_path)
         else:
             agent.q_table = None
     strategy = TaskStrategy(env, time_step=10, map_size=map_size, agent=agent)
@@ -65,7 +69,7 @@ def evaluate_strategy_multithread(strategy_name, n_tests=10, map_size='medium'):
     avg_wait_list = []
     success_rate_list = []
     with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, n_tests)) as executor:
-        futures = [executor.submit(single_run, strategy_name, map_size) for _ in range(n_tests)]
+        futures = [executor.submit(single_run, strategy_name, map_size, seed) for seed in range(n_tests)]
         for i, future in enumerate(as_completed(futures)):
             avg_wait, success_rate = future.result()
             avg_wait_list.append(avg_wait)
@@ -73,6 +77,27 @@ def evaluate_strategy_multithread(strategy_name, n_tests=10, map_size='medium'):
             print(f"{strategy_name} 第{i+1}次: 平均等待时间={avg_wait:.2f}, 成功率={success_rate:.2%}")
     return np.mean(avg_wait_list), np.mean(success_rate_list)
 
+def evaluate_nearest_vectorized(n_tests=10, map_size='medium', seed=None):
+    """
+    nearest 策略的批量评测：n_tests 个园区放入同一个 VecParkEnv 锁步推进，指标口径与 single_run 相同
+    """
+    settings = ENV_CONFIG.get(map_size, ENV_CONFIG['small'])
+    vec_env = VecParkEnv(
+        n_envs=n_tests,
+        park_size=settings['park_size'],
+        n_robots=settings['n_robots'],
+        n_vehicles=settings['n_vehicles'],
+        n_batteries=settings['n_batteries'],
+        time_step=10,
+        generate_vehicles_probability=settings['generate_vehicles_probability'],
+        seed=seed
+    )
+    max_steps = 2880  # 8小时
+    for step in range(max_steps):
+        vec_env.step(vec_env.nearest_assignments())
+    avg_wait, success_rate = vec_env.get_metrics()
+    return np.mean(avg_wait), np.mean(success_rate)
+
 def main():
     avg_waits = []
     success_rates = []